@@ -0,0 +1,234 @@
+import argparse
+import csv
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from kline_buffer import INTERVAL_MS
+from kline_store import KlineStore
+from rolling_boll import BOLL_STD_DEV, BOLL_WINDOW
+from screener import BODY, WICK, boll_screen_mask, bollinger_position, price_change
+
+DAY_MS = 86_400_000
+FORWARD_BARS = (1, 3, 6, 12, 48, 288)  # 命中后第N根K线的收益（5分钟线即5分钟~1天）
+
+# 与实时扫描一致的规则：(幅度计算方式, 阈值%)
+RULES = {
+    'binance': (WICK, 7),  # scan_binance / Binance适配器
+    'bybit': (BODY, 8),
+    'gateio': (BODY, 8),
+}
+BOLL_THRESHOLDS = {'5m': 5, '15m': 9}  # test-boll.py 的 screen_klines
+
+
+# region 向量化指标
+def rolling_bands(close: np.ndarray, window: int = BOLL_WINDOW,
+                  std_dev: float = BOLL_STD_DEV) -> Tuple[np.ndarray, np.ndarray]:
+    """每根K线（含当根）的布林上下轨，前window-1根为NaN；总体标准差，与BollingerEngine一致"""
+    upper = np.full(len(close), np.nan)
+    lower = np.full(len(close), np.nan)
+    if len(close) >= window:
+        # 前缀和求滑动均值/方差，O(n)；先减去均值降低大数相消带来的误差
+        x = close - close.mean()
+        s1 = np.concatenate(([0.0], np.cumsum(x)))
+        s2 = np.concatenate(([0.0], np.cumsum(x * x)))
+        mean = (s1[window:] - s1[:-window]) / window
+        std = np.sqrt(np.maximum((s2[window:] - s2[:-window]) / window - mean * mean, 0))
+        mean += close.mean()
+        upper[window - 1:] = mean + std_dev * std
+        lower[window - 1:] = mean - std_dev * std
+    return lower, upper
+
+
+def intraday_low(open_time: np.ndarray, low: np.ndarray) -> np.ndarray:
+    """截至每根K线的当日（UTC）最低价，即扫描时日线K线的最低价"""
+    day = open_time // DAY_MS
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(day)) + 1, [len(day)]))
+    result = np.empty(len(low))
+    for start, end in zip(bounds[:-1], bounds[1:]):  # 每天一次累计最小值，循环次数只等于天数
+        result[start:end] = np.minimum.accumulate(low[start:end])
+    return result
+
+
+def prior_daily_close_low(open_time: np.ndarray, close: np.ndarray, days: int = 7) -> np.ndarray:
+    """每根K线所在日之前days天日线收盘价的最低值（与get_7d_high_low一致），缺任一天为NaN"""
+    day = open_time // DAY_MS
+    first = day[0]
+    daily_close = np.full(day[-1] - first + 1, np.nan)
+    daily_close[day - first] = close  # 同一天多根K线时后写入的覆盖，最终为当日最后一根收盘价
+    prior = np.full(len(daily_close), np.nan)
+    if len(daily_close) > days:
+        prior[days:] = sliding_window_view(daily_close, days)[:-1].min(axis=1)
+    return prior[day - first]
+
+
+def forward_returns(open_time: np.ndarray, close: np.ndarray, idx: np.ndarray, interval_ms: int,
+                    horizons: Sequence[int] = FORWARD_BARS) -> np.ndarray:
+    """命中后第h根K线相对命中收盘价的收益（%），按时间精确匹配，缺数据为NaN；形状 (命中数, 周期数)"""
+    result = np.full((len(idx), len(horizons)), np.nan)
+    for j, h in enumerate(horizons):
+        target = open_time[idx] + h * interval_ms
+        pos = np.searchsorted(open_time, target)
+        ok = pos < len(open_time)
+        ok[ok] &= open_time[pos[ok]] == target[ok]
+        result[ok, j] = (close[pos[ok]] / close[idx[ok]] - 1) * 100
+    return result
+
+
+# endregion
+
+# region 规则
+def change_hits(cols: Dict[str, np.ndarray], threshold: float, mode: str,
+                boll_filter: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """实时扫描的幅度规则（可叠加布林突破），返回 (命中掩码, 幅度%)"""
+    change = price_change(cols['open'], cols['high'], cols['low'], cols['close'], mode)
+    mask = np.abs(change) >= threshold
+    if boll_filter:
+        lower, upper = rolling_bands(cols['close'])
+        pos = bollinger_position(cols['close'], lower, upper)
+        mask &= np.where(cols['close'] < cols['open'], pos < 0, pos > 1)
+    return mask, change
+
+
+def boll_hits(cols: Dict[str, np.ndarray], threshold: float, boll_filter: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """test-boll.py 规则：上涨超阈值 / 下跌超阈值且当日最低价低于前7日收盘最低，返回 (命中掩码, 幅度%)"""
+    change = price_change(cols['open'], cols['high'], cols['low'], cols['close'], BODY)
+    band_pos = None
+    if boll_filter:
+        lower, upper = rolling_bands(cols['close'])
+        band_pos = bollinger_position(cols['close'], lower, upper)
+    with np.errstate(invalid='ignore'):
+        mask = boll_screen_mask(change, threshold,
+                                today_low=intraday_low(cols['open_time'], cols['low']),
+                                low_7d=prior_daily_close_low(cols['open_time'], cols['close']),
+                                band_pos=band_pos)
+    return mask, change
+
+
+# endregion
+
+# region 回测
+class BacktestResult:
+    """全部命中记录（结构化数组，每行一次命中）及按持有周期的汇总"""
+
+    def __init__(self, hits: np.ndarray, horizons: Sequence[int], interval: str, symbols: int, bars: int):
+        self.hits = hits
+        self.horizons = tuple(horizons)
+        self.interval = interval
+        self.symbols = symbols
+        self.bars = bars
+
+    def __len__(self) -> int:
+        return len(self.hits)
+
+    def summary(self) -> str:
+        lines = [f"{self.symbols}个交易对 {self.bars}根K线 命中{len(self.hits)}次"]
+        if not len(self.hits):
+            return lines[0]
+        direction = self.hits['direction']
+        for h in self.horizons:
+            fwd = self.hits[f'fwd_{h}']
+            valid = ~np.isnan(fwd)
+            if not valid.any():
+                continue
+            # 顺势率：命中后继续沿命中方向运行的比例
+            follow = (fwd[valid] * direction[valid] > 0).mean() * 100
+            lines.append(f"  +{h}根: 平均{np.mean(fwd[valid]):+.2f}% 中位{np.median(fwd[valid]):+.2f}% "
+                         f"顺势率{follow:.1f}% (样本{valid.sum()})")
+        return '\n'.join(lines)
+
+    def to_csv(self, path: str) -> None:
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['time'] + list(self.hits.dtype.names))
+            for row in self.hits.tolist():
+                utc = datetime.fromtimestamp(row[1] / 1000, tz=timezone.utc).strftime('%Y-%m-%d %H:%M')
+                writer.writerow([utc, *row])
+
+
+def run_backtest(store: KlineStore, exchange: str, interval: str = '5m', rule: Optional[str] = None,
+                 threshold: Optional[float] = None, boll_filter: bool = False,
+                 start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+                 symbols: Optional[Iterable[str]] = None,
+                 horizons: Sequence[int] = FORWARD_BARS) -> BacktestResult:
+    """在本地K线库上按实时扫描规则回放；rule为 'boll' 时用布林扫描规则，否则用交易所对应的幅度规则"""
+    interval_ms = INTERVAL_MS[interval]
+    rule = rule or exchange
+    if rule == 'boll':
+        threshold = BOLL_THRESHOLDS.get(interval, 9) if threshold is None else threshold
+    else:
+        mode, default = RULES[rule]
+        threshold = default if threshold is None else threshold
+
+    # 向后收益需要区间之后的数据，读取时放宽结束时间
+    read_end = end_ms + max(horizons) * interval_ms if end_ms is not None else None
+    dtype = [('symbol', 'U32'), ('open_time', 'i8'), ('close', 'f8'), ('change', 'f8'), ('direction', 'i1')]
+    dtype += [(f'fwd_{h}', 'f8') for h in horizons]
+    parts: List[np.ndarray] = []
+    names = list(symbols) if symbols is not None else store.symbols(exchange, interval)
+    total_bars = 0
+    for symbol in names:
+        cols = store.read(exchange, symbol, interval, start_ms, read_end)
+        n = len(cols['open_time'])
+        if n == 0:
+            continue
+        cols = {k: np.asarray(v) for k, v in cols.items()}
+        if rule == 'boll':
+            mask, change = boll_hits(cols, threshold, boll_filter)
+        else:
+            mask, change = change_hits(cols, threshold, mode, boll_filter)
+        if end_ms is not None:
+            mask &= cols['open_time'] < end_ms
+        total_bars += int(np.count_nonzero(cols['open_time'] < end_ms)) if end_ms is not None else n
+        idx = np.flatnonzero(mask)
+        if not len(idx):
+            continue
+        part = np.empty(len(idx), dtype=dtype)
+        part['symbol'] = symbol
+        part['open_time'] = cols['open_time'][idx]
+        part['close'] = cols['close'][idx]
+        part['change'] = change[idx]
+        part['direction'] = np.where(cols['close'][idx] < cols['open'][idx], -1, 1)
+        fwd = forward_returns(cols['open_time'], cols['close'], idx, interval_ms, horizons)
+        for j, h in enumerate(horizons):
+            part[f'fwd_{h}'] = fwd[:, j]
+        parts.append(part)
+
+    hits = np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+    hits = hits[np.argsort(hits['open_time'], kind='stable')]
+    return BacktestResult(hits, horizons, interval, len(names), total_bars)
+
+
+# endregion
+
+
+def _parse_date(text: Optional[str]) -> Optional[int]:
+    if not text:
+        return None
+    return int(datetime.strptime(text, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+if __name__ == "__main__":
+    # 用法: python backtest.py binance --interval 5m --threshold 7 --start 2024-01-01 --csv hits.csv
+    parser = argparse.ArgumentParser(description="在本地K线库上回放扫描规则")
+    parser.add_argument('exchange', choices=sorted(RULES))
+    parser.add_argument('--rule', choices=sorted(RULES) + ['boll'], help="缺省为交易所对应的幅度规则")
+    parser.add_argument('--interval', default='5m')
+    parser.add_argument('--threshold', type=float)
+    parser.add_argument('--boll-filter', action='store_true', help="叠加布林突破条件")
+    parser.add_argument('--start', help="YYYY-MM-DD (UTC)")
+    parser.add_argument('--end', help="YYYY-MM-DD (UTC)，不含")
+    parser.add_argument('--root', default=None, help="K线库目录")
+    parser.add_argument('--csv', help="命中明细输出文件")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    result = run_backtest(KlineStore(args.root) if args.root else KlineStore(), args.exchange, args.interval,
+                          args.rule, args.threshold, args.boll_filter, _parse_date(args.start), _parse_date(args.end))
+    print(result.summary())
+    print(f"耗时 {time.perf_counter() - started:.2f}秒")
+    if args.csv:
+        result.to_csv(args.csv)
@@ -0,0 +1,57 @@
+from typing import Optional, Tuple
+
+
+# region K线记录
+class Bar:
+    """单根K线：时间为毫秒整数，价格为float；用__slots__代替每根K线一个字典/Timestamp"""
+
+    __slots__ = ('open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time')
+
+    def __init__(self, open_time: int, open: float, high: float, low: float, close: float,
+                 volume: float = 0.0, close_time: Optional[int] = None, interval_ms: int = 300_000):
+        self.open_time = open_time
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.close_time = close_time if close_time is not None else open_time + interval_ms - 1
+
+    @property
+    def is_bearish(self) -> bool:
+        return self.close < self.open
+
+    @property
+    def body_change(self) -> float:
+        """实体涨跌幅（百分比）"""
+        return (self.close - self.open) / self.open * 100 if self.open else 0.0
+
+    def as_tuple(self) -> Tuple[int, float, float, float, float, float, int]:
+        return self.open_time, self.open, self.high, self.low, self.close, self.volume, self.close_time
+
+    def __repr__(self) -> str:
+        fields = [name for cls in type(self).__mro__ for name in getattr(cls, '__slots__', ())]
+        return f"{type(self).__name__}({', '.join(f'{name}={getattr(self, name)}' for name in fields)})"
+
+
+# endregion
+
+# region 各交易所原始K线转换
+def bar_from_binance(kline: list) -> Bar:
+    """[open_time, o, h, l, c, v, close_time, ...]（REST与组合流转换后的格式相同）"""
+    return Bar(int(kline[0]), float(kline[1]), float(kline[2]), float(kline[3]), float(kline[4]),
+               float(kline[5]), int(kline[6]))
+
+
+def bar_from_bybit(kline: list, interval_ms: int = 300_000) -> Bar:
+    """[start, o, h, l, c, v, turnover]，无收盘时间"""
+    return Bar(int(kline[0]), float(kline[1]), float(kline[2]), float(kline[3]), float(kline[4]),
+               float(kline[5]), interval_ms=interval_ms)
+
+
+def bar_from_gateio(kline: dict, interval_ms: int = 300_000) -> Bar:
+    """{'t': 秒, 'o', 'h', 'l', 'c', 'v'}"""
+    return Bar(int(kline['t']) * 1000, float(kline['o']), float(kline['h']), float(kline['l']), float(kline['c']),
+               float(kline.get('v', 0)), interval_ms=interval_ms)
+
+# endregion
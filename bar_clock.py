@@ -0,0 +1,165 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Sequence
+
+from bar import Bar
+from http_pool import get_session, sleep_with_warm_up
+
+CLOSE_EPSILON_MS = 150  # 收盘后多少毫秒开始请求
+RESYNC_INTERVAL = 1800  # 服务器时间重新同步周期（秒）
+SYNC_SAMPLES = 5  # 每次同步采样次数，取往返时间最短的一次
+REPOLL_DELAYS = (0.2, 0.4, 0.8, 1.6, 3.2)  # 未收盘交易对的重新请求间隔（秒）
+
+# 各交易所服务器时间接口与解析（返回毫秒）
+SERVER_TIME_ENDPOINTS = {
+    'binance': ("https://fapi.binance.com/fapi/v1/time", lambda d: int(d['serverTime'])),
+    'bybit': ("https://api.bybit.com/v5/market/time", lambda d: int(d['time'])),
+    'gateio': ("https://api.gateio.ws/api/v4/spot/time", lambda d: int(d['server_time'])),
+}
+
+# 单个交易对的收盘K线请求: (symbol, close_ms) -> (symbol, Bar)，Bar为None表示尚未收盘或失败
+ClosedFetcher = Callable[[str, int], Awaitable[tuple]]
+
+
+def floor_ms(ts_ms: int, interval_ms: int) -> int:
+    return ts_ms // interval_ms * interval_ms
+
+
+def pick_closed(bars: Sequence[Bar], close_ms: int, interval_ms: int) -> Optional[Bar]:
+    """取出在close_ms收盘的K线；交易所尚未开出下一根时视为未定稿，返回None"""
+    target = close_ms - interval_ms
+    if not any(bar.open_time >= close_ms for bar in bars):
+        return None
+    for bar in bars:
+        if bar.open_time == target:
+            return bar
+    return None
+
+
+# region 服务器时钟
+class ServerClock:
+    """按交易所服务器时间校准的本地时钟：offset = 服务器时间 - 本地时间（按往返中点估算）"""
+
+    def __init__(self, name: str, resync_interval: float = RESYNC_INTERVAL, samples: int = SYNC_SAMPLES):
+        self.name = name
+        self.url, self.parser = SERVER_TIME_ENDPOINTS[name]
+        self.resync_interval = resync_interval
+        self.samples = samples
+        self.offset_ms = 0.0
+        self.rtt_ms: Optional[float] = None
+        self.synced_at = 0.0  # 上次同步的本地monotonic时间，0表示从未同步
+
+    async def sync(self) -> float:
+        """多次采样，以往返时间最短的一次估算偏移，失败时保留上次结果"""
+        session = get_session(self.name)
+        best = None
+        for _ in range(self.samples):
+            try:
+                start = time.time() * 1000
+                async with session.get(self.url) as resp:
+                    resp.raise_for_status()
+                    data = await resp.json()
+                end = time.time() * 1000
+            except Exception as e:
+                print(f"[{self.name}] 服务器时间同步失败: {str(e)}")
+                continue
+            rtt = end - start
+            if best is None or rtt < best[0]:
+                best = (rtt, self.parser(data) - (start + end) / 2)
+        if best is not None:
+            self.rtt_ms, self.offset_ms = best
+            self.synced_at = time.monotonic()
+            print(f"[{self.name}] 服务器时间偏移 {self.offset_ms:+.0f}ms (往返{self.rtt_ms:.0f}ms)")
+        return self.offset_ms
+
+    async def ensure_synced(self) -> None:
+        if not self.synced_at or time.monotonic() - self.synced_at >= self.resync_interval:
+            await self.sync()
+
+    def now_ms(self) -> int:
+        """服务器视角的当前毫秒时间"""
+        return int(time.time() * 1000 + self.offset_ms)
+
+    def last_close_ms(self, interval_ms: int = 300_000) -> int:
+        """最近一次已经到达的收盘时刻（即当前K线的开盘时刻）"""
+        return floor_ms(self.now_ms(), interval_ms)
+
+
+# endregion
+
+# region 收盘调度
+class BarCloseScheduler:
+    """在服务器时间的收盘时刻 + epsilon 触发扫描，等待期间预热连接"""
+
+    def __init__(self, clock: ServerClock, interval_ms: int = 300_000,
+                 epsilon_ms: int = CLOSE_EPSILON_MS, warm_up: Iterable[str] = ()):
+        self.clock = clock
+        self.interval_ms = interval_ms
+        self.epsilon_ms = epsilon_ms
+        self.warm_up = list(warm_up)
+
+    def next_close_ms(self) -> int:
+        return self.clock.last_close_ms(self.interval_ms) + self.interval_ms
+
+    async def wait_next_close(self) -> int:
+        """等待到下一次收盘 + epsilon，返回收盘时刻（毫秒）"""
+        await self.clock.ensure_synced()
+        close_ms = self.next_close_ms()
+        delay = (close_ms + self.epsilon_ms - self.clock.now_ms()) / 1000
+        if delay > 0:
+            await sleep_with_warm_up(delay, self.warm_up)
+        return close_ms
+
+
+async def collect_closed(fetch: ClosedFetcher, symbols: Iterable[str], close_ms: int,
+                         delays: Sequence[float] = REPOLL_DELAYS, timeout: Optional[float] = None) -> List[tuple]:
+    """并发请求全部交易对，只对尚未定稿（或请求失败）的交易对按退避间隔重新请求；
+    超过timeout秒时取消未完成的请求，只返回已拿到的结果"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout if timeout is not None else None
+    results: Dict[str, tuple] = {}
+    pending = list(symbols)
+
+    async def _fetch(symbol):
+        try:
+            return await fetch(symbol, close_ms)
+        except Exception as e:
+            print(f"请求{symbol}时发生错误: {str(e)}")
+            return symbol, None
+
+    def _remaining():
+        return None if deadline is None else max(deadline - loop.time(), 0)
+
+    for attempt in range(len(delays) + 1):
+        if attempt:
+            delay = delays[attempt - 1]
+            if deadline is not None and delay >= _remaining():
+                break
+            await asyncio.sleep(delay)
+        tasks = {asyncio.create_task(_fetch(s)): s for s in pending}
+        done, unfinished = await asyncio.wait(tasks, timeout=_remaining()) if tasks else (set(), set())
+        for task in unfinished:
+            task.cancel()
+        retry = [tasks[task] for task in unfinished]
+        for task in done:
+            key, bar = task.result()
+            if bar is None:
+                retry.append(tasks[task])
+            else:
+                results[tasks[task]] = (key, bar)
+        pending = retry
+        if not pending or unfinished:
+            break
+    if pending:
+        print(f"{len(pending)}个交易对在截止前仍未定稿，本轮跳过: {','.join(pending[:10])}")
+    return list(results.values())
+
+
+# endregion
+
+# 各交易所共享时钟
+CLOCKS: Dict[str, ServerClock] = {name: ServerClock(name) for name in SERVER_TIME_ENDPOINTS}
+
+
+def get_clock(exchange: str) -> ServerClock:
+    return CLOCKS[exchange]
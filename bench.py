@@ -0,0 +1,278 @@
+import argparse
+import asyncio
+import importlib.util
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from functools import partial
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from mock_exchange import MOCK_HOST, run_server
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPORT_PATH = "bench_report.json"
+REGRESSION_TOLERANCE = 0.10  # 与上次报告相比中位耗时变慢超过该比例时标记为回归
+
+# 被测扫描：名称 -> (脚本文件, 说明)
+TARGETS = {
+    'scan_binance': ('scan_high_change.py', "Binance 5分钟波动扫描"),
+    'scan_high_change_contracts': ('test-boll.py', "布林/7日极值扫描（多周期本地合成）"),
+    'coordinated_scan': ('test-boll-new-pair_5月8日11点.py', "多交易所协同扫描"),
+    'sharded_scan': ('test-boll-new-pair_5月8日11点.py', "多交易所协同扫描（多进程分片，内存只统计父进程）"),
+}
+SHARD_PROCESSES = None  # 分片进程数，缺省为CPU核数
+
+
+def _load_script(filename: str):
+    """按文件路径导入扫描脚本（文件名含连字符/中文，不能直接import）"""
+    spec = importlib.util.spec_from_file_location(f"bench_{abs(hash(filename))}", os.path.join(HERE, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# region 被测扫描的准备与单轮执行
+def _shard_setup(base_url: str, store_root: str) -> None:
+    """分片进程启动时执行：请求改写到模拟交易所，K线写入临时目录"""
+    from http_pool import POOL
+
+    POOL.redirect(base_url)
+    os.chdir(store_root)
+
+
+async def _prepare(target: str, module, store_root: str, base_url: str):
+    """拉取模拟交易对列表（不写本地快照），K线写入临时目录，不发送推送；返回执行一轮扫描的协程函数"""
+    from kline_store import KlineStore
+    from notify import Notifier
+
+    if target == 'scan_binance':
+        universes = [module.binance_universe]
+        module.binance_adapter.store = KlineStore(store_root)
+        module.notifier = Notifier([])
+        return universes, module.scan_binance
+    if target == 'scan_high_change_contracts':
+        universes = [module.symbols_universe]
+        return universes, module.scan_high_change_contracts
+    universes = [module.universes[ex] for ex in module.ENABLED_EXCHANGES]
+    for adapter in module.adapters.values():
+        adapter.store = KlineStore(store_root)
+    module.notifier = Notifier([])
+    if target == 'sharded_scan':
+        from scan_cluster import ShardPool
+        module.shard_pool = ShardPool(os.path.join(HERE, TARGETS[target][0]), 'scan_shard', SHARD_PROCESSES,
+                                      local_scan=module.scan_shard, setup=partial(_shard_setup, base_url, store_root))
+        module.shard_pool.start()
+    return universes, module.scan_cycle
+
+
+async def _run_cycles(target: str, base_url: str, cycles: int) -> dict:
+    from http_pool import POOL
+    from metrics import METRICS
+
+    POOL.redirect(base_url)
+    module = _load_script(TARGETS[target][0])
+    with tempfile.TemporaryDirectory() as store_root:
+        universes, scan = await _prepare(target, module, store_root, base_url)
+        for universe in universes:
+            universe.cache_path = None
+            await universe.refresh_once()
+
+        def _requests() -> int:
+            # 分片模式下请求在子进程发出，计数随每轮结果回传
+            return sum(s.get('requests', 0) for s in POOL.stats().values()) + METRICS.merged_requests
+
+        def _errors() -> int:
+            return sum(METRICS.errors_by_exchange.values())  # 请求异常、超时与HTTP错误状态
+
+        cycle_ms: List[float] = []
+        requests: List[int] = []
+        errors_before = _errors()
+        for i in range(cycles + 1):  # 最后一轮只用于统计内存（tracemalloc会拖慢执行）
+            traced = i == cycles
+            if traced:
+                tracemalloc.start()
+            before = _requests()
+            close_ms = int(time.time() * 1000) // 300_000 * 300_000
+            start = time.perf_counter()
+            await scan(close_ms)
+            elapsed = (time.perf_counter() - start) * 1000
+            if traced:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            else:
+                cycle_ms.append(round(elapsed, 1))
+                requests.append(_requests() - before)
+        errors = _errors() - errors_before
+        if getattr(module, 'shard_pool', None) is not None:
+            await module.shard_pool.stop()
+        await POOL.close()
+
+    # 第一轮需初始化缓冲区/布林带，单独列出，稳态统计不含第一轮
+    steady = cycle_ms[1:] or cycle_ms
+    rates = [n / (ms / 1000) for n, ms in zip(requests, cycle_ms) if ms > 0]
+    result = {
+        'symbols': sum(len(u.symbols) for u in universes),
+        'cycles_ms': cycle_ms,
+        'requests': requests,
+        'cold_ms': cycle_ms[0],
+        'median_ms': round(statistics.median(steady), 1),
+        'min_ms': min(steady),
+        'max_ms': max(steady),
+        'requests_per_sec': round(statistics.median(rates), 1) if rates else 0.0,
+        'client_errors': errors,
+        'traced_peak_kb': round(peak / 1024, 1),
+        'max_rss_kb': None,
+    }
+    try:
+        import resource
+        result['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # Linux单位为KB
+    except ImportError:  # Windows没有resource模块
+        pass
+    return result
+
+
+def _target_process(target: str, base_url: str, cycles: int, queue: multiprocessing.Queue) -> None:
+    """每个被测扫描在独立进程中运行，连接池、限频器和内存统计互不影响"""
+    try:
+        queue.put(asyncio.run(_run_cycles(target, base_url, cycles)))
+    except Exception as e:
+        queue.put({'error': f"{type(e).__name__}: {str(e)}"})
+
+
+# endregion
+
+# region 基准测试流程
+async def _get_json(url: str) -> Optional[dict]:
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url) as resp:
+                return await resp.json()
+    except (aiohttp.ClientError, OSError):
+        return None
+
+
+def _server_stats(base_url: str) -> Dict[str, Dict[str, int]]:
+    return asyncio.run(_get_json(base_url + "/mock/stats")) or {}
+
+
+def _wait_server(base_url: str, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if asyncio.run(_get_json(base_url + "/mock/stats")) is not None:
+            return
+        time.sleep(0.1)
+    raise RuntimeError(f"模拟交易所未能在{timeout}秒内启动: {base_url}")
+
+
+def _diff_stats(before: dict, after: dict) -> dict:
+    return {exchange: {k: v - before.get(exchange, {}).get(k, 0) for k, v in counters.items()}
+            for exchange, counters in after.items()}
+
+
+def _version() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(targets: List[str], cycles: int = 5, symbols: int = 300, latency: str = 'lognormal',
+                  mean_ms: float = 30.0, spread_ms: float = 10.0, error_rate: float = 0.0,
+                  rate_limit: int = 0, port: int = 18080) -> dict:
+    """启动模拟交易所进程，依次在独立进程中运行各被测扫描，返回报告"""
+    config = {'cycles': cycles, 'symbols': symbols, 'latency': latency, 'mean_ms': mean_ms,
+              'spread_ms': spread_ms, 'error_rate': error_rate, 'rate_limit': rate_limit}
+    base_url = f"http://{MOCK_HOST}:{port}"
+    server = multiprocessing.Process(target=run_server, daemon=True, kwargs=dict(
+        symbols=symbols, dist=latency, mean_ms=mean_ms, spread_ms=spread_ms, error_rate=error_rate,
+        rate_limit=rate_limit, port=port))
+    server.start()
+    results = {}
+    try:
+        _wait_server(base_url)
+        for target in targets:
+            print(f"\n---- {target}: {TARGETS[target][1]} ----")
+            before = _server_stats(base_url)
+            queue = multiprocessing.Queue()
+            worker = multiprocessing.Process(target=_target_process, args=(target, base_url, cycles, queue))
+            worker.start()
+            result = queue.get()
+            worker.join()
+            result['server'] = _diff_stats(before, _server_stats(base_url))
+            results[target] = result
+    finally:
+        server.terminate()
+        server.join()
+    return {
+        'version': _version(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'config': config,
+        'targets': results,
+    }
+
+
+def compare(report: dict, previous: dict, tolerance: float = REGRESSION_TOLERANCE) -> List[str]:
+    """与上一份报告逐项比较稳态中位耗时，返回说明文字（变慢超过容差的标记为回归）"""
+    lines = []
+    if previous.get('config') != report.get('config'):
+        lines.append("注意: 两次报告的配置不同，对比仅供参考")
+    for target, result in report['targets'].items():
+        old = previous.get('targets', {}).get(target)
+        if not old or 'median_ms' not in old or 'median_ms' not in result:
+            continue
+        change = (result['median_ms'] - old['median_ms']) / old['median_ms'] if old['median_ms'] else 0.0
+        flag = " <-- 回归" if change > tolerance else ""
+        lines.append(f"{target}: {old['median_ms']}ms ({previous.get('version')}) -> "
+                     f"{result['median_ms']}ms ({report.get('version')}) {change:+.1%}{flag}")
+    return lines
+
+
+# endregion
+
+
+if __name__ == "__main__":
+    # 用法: python bench.py --symbols 300 --cycles 5 --mean-ms 30 --error-rate 0.01 --compare bench_report.json
+    parser = argparse.ArgumentParser(description="用本地模拟交易所测量扫描吞吐")
+    parser.add_argument('--targets', nargs='+', choices=list(TARGETS), default=list(TARGETS))
+    parser.add_argument('--cycles', type=int, default=5)
+    parser.add_argument('--symbols', type=int, default=300, help="每个交易所的模拟交易对数量")
+    parser.add_argument('--latency', default='lognormal', choices=['fixed', 'uniform', 'normal', 'lognormal'])
+    parser.add_argument('--mean-ms', type=float, default=30.0, help="平均响应延迟")
+    parser.add_argument('--spread-ms', type=float, default=10.0, help="延迟标准差（uniform为半宽）")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="返回500的比例")
+    parser.add_argument('--rate-limit', type=int, default=0, help="每个交易所每秒请求上限，超过返回429，0为不限")
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--report', default=REPORT_PATH, help="JSON报告输出文件")
+    parser.add_argument('--compare', help="与之前的报告对比")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.targets, args.cycles, args.symbols, args.latency, args.mean_ms, args.spread_ms,
+                           args.error_rate, args.rate_limit, args.port)
+    print("\n==== 结果 ====")
+    for name, res in report['targets'].items():
+        if 'error' in res:
+            print(f"{name}: 失败 {res['error']}")
+            continue
+        print(f"{name}: {res['symbols']}个交易对 首轮{res['cold_ms']}ms 稳态中位{res['median_ms']}ms "
+              f"({res['min_ms']}~{res['max_ms']}) {res['requests_per_sec']}请求/秒 "
+              f"内存峰值{res['traced_peak_kb']}KB")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+        print('\n'.join(compare(report, previous)))
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"报告已写入 {args.report}")
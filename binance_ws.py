@@ -0,0 +1,256 @@
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+WS_BASE_URL = "wss://fstream.binance.com"
+REST_KLINES_URL = "https://fapi.binance.com/fapi/v1/klines"
+STREAMS_PER_CONNECTION = 200  # 单连接订阅数（官方上限1024，留余量）
+
+# 收盘回调: (close_time毫秒, {symbol: kline}) ，kline与REST格式一致
+BarCloseCallback = Callable[[int, Dict[str, list]], Awaitable[None]]
+
+
+# region 工具函数
+def stream_name(symbol: str, interval: str) -> str:
+    """组合流名称，如 btcusdt@kline_5m"""
+    return f"{symbol.lower()}@kline_{interval}"
+
+
+def ws_kline_to_rest(k: dict) -> list:
+    """将WS推送的k字段转为REST /klines 的数组格式（前7列）"""
+    return [k['t'], k['o'], k['h'], k['l'], k['c'], k['v'], k['T']]
+
+
+def shard_symbols(symbols: List[str], size: int) -> List[List[str]]:
+    """按连接容量切分交易对"""
+    ordered = sorted(symbols)
+    return [ordered[i:i + size] for i in range(0, len(ordered), size)]
+
+
+# endregion
+
+# region 组合流订阅
+class KlineStreamManager:
+    """多连接分片订阅K线组合流，内存中维护每个交易对最新一根已收盘K线"""
+
+    def __init__(self, symbols: List[str], interval: str = '5m',
+                 on_bar_close: Optional[BarCloseCallback] = None,
+                 ws_base_url: str = WS_BASE_URL, rest_url: str = REST_KLINES_URL,
+                 streams_per_connection: int = STREAMS_PER_CONNECTION,
+                 collect_window: float = 1.0, max_backoff: float = 30.0):
+        self.interval = interval
+        self.on_bar_close = on_bar_close
+        self.ws_base_url = ws_base_url.rstrip('/')
+        self.rest_url = rest_url
+        self.streams_per_connection = streams_per_connection
+        self.collect_window = collect_window  # 同一收盘时间的K线归并等待时长（秒）
+        self.max_backoff = max_backoff
+        self.symbols = set(symbols)
+        self.latest: Dict[str, list] = {}  # symbol -> 最新已收盘K线
+        self.reconnects = 0
+        self._pending: Dict[int, Dict[str, list]] = {}
+        self._flush_tasks: Dict[int, asyncio.Task] = {}
+        self._shard_tasks: List[asyncio.Task] = []
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self) -> None:
+        """启动所有分片连接"""
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        for shard in shard_symbols(list(self.symbols), self.streams_per_connection):
+            self._shard_tasks.append(asyncio.create_task(self._run_shard(shard)))
+
+    async def stop(self) -> None:
+        """关闭所有连接和待发送的归并任务"""
+        for task in self._shard_tasks + list(self._flush_tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._shard_tasks, *self._flush_tasks.values(), return_exceptions=True)
+        self._shard_tasks.clear()
+        self._flush_tasks.clear()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def update_symbols(self, symbols: List[str]) -> None:
+        """交易对列表变化时重建分片（新增合约/下架合约）"""
+        if set(symbols) == self.symbols:
+            return
+        for task in self._shard_tasks:
+            task.cancel()
+        await asyncio.gather(*self._shard_tasks, return_exceptions=True)
+        self._shard_tasks.clear()
+        self.symbols = set(symbols)
+        for symbol in list(self.latest):
+            if symbol not in self.symbols:
+                del self.latest[symbol]
+        await self.start()
+
+    async def _run_shard(self, shard: List[str]) -> None:
+        """单个连接的收发循环，断线后指数退避重连并用REST补齐缺口"""
+        streams = '/'.join(stream_name(s, self.interval) for s in shard)
+        url = f"{self.ws_base_url}/stream?streams={streams}"
+        backoff = 1.0
+        connected_before = False
+        while True:
+            try:
+                async with self._session.ws_connect(url, heartbeat=60) as ws:
+                    if connected_before:
+                        self.reconnects += 1
+                        await self._backfill(shard)
+                    connected_before = True
+                    backoff = 1.0
+                    async for msg in ws:
+                        if msg.type == aiohttp.WSMsgType.TEXT:
+                            await self._handle_message(msg.data)
+                        elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                            break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"K线流连接异常({len(shard)}个交易对): {str(e)}")
+            connected_before = True
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def _handle_message(self, raw: str) -> None:
+        """解析组合流消息，仅处理已收盘K线（x=true）"""
+        data = json.loads(raw).get('data', {})
+        k = data.get('k')
+        if not k or not k.get('x'):
+            return
+        self._on_closed_bar(k['s'], ws_kline_to_rest(k))
+
+    def _on_closed_bar(self, symbol: str, kline: list) -> None:
+        """记录收盘K线，并按收盘时间归并成一轮事件"""
+        prev = self.latest.get(symbol)
+        if prev is not None and prev[6] >= kline[6]:
+            return  # 重复或过期的推送
+        self.latest[symbol] = kline
+        close_time = kline[6]
+        bucket = self._pending.setdefault(close_time, {})
+        bucket[symbol] = kline
+        if len(bucket) >= len(self.symbols):
+            # 全部到齐立即触发，取消等待中的归并任务
+            task = self._flush_tasks.pop(close_time, None)
+            if task is not None:
+                task.cancel()
+            self._flush_tasks[close_time] = asyncio.create_task(self._flush(close_time, 0))
+        elif close_time not in self._flush_tasks:
+            self._flush_tasks[close_time] = asyncio.create_task(self._flush(close_time, self.collect_window))
+
+    async def _flush(self, close_time: int, delay: float) -> None:
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._flush_tasks.pop(close_time, None)
+        bucket = self._pending.pop(close_time, None)
+        if bucket and self.on_bar_close is not None:
+            try:
+                await self.on_bar_close(close_time, bucket)
+            except Exception as e:
+                print(f"收盘回调执行错误: {str(e)}")
+
+    async def _backfill(self, shard: List[str]) -> None:
+        """重连后通过REST补齐断线期间错过的收盘K线"""
+        now_ms = int(time.time() * 1000)
+
+        async def _fetch(symbol: str) -> None:
+            # 只关心缺口内最新一根已收盘K线，取最近2根即可（最新一根可能未收盘）
+            params = {'symbol': symbol, 'interval': self.interval, 'limit': 2}
+            try:
+                async with self._session.get(self.rest_url, params=params) as resp:
+                    data = await resp.json()
+            except Exception as e:
+                print(f"补齐{symbol}时发生错误: {str(e)}")
+                return
+            closed = [k for k in data if k[6] < now_ms]
+            if closed:
+                self._on_closed_bar(symbol, closed[-1][:7])
+
+        await asyncio.gather(*(_fetch(s) for s in shard))
+
+
+# endregion
+
+# region 本地模拟服务（离线测试用）
+class MockKlineStreamServer:
+    """本地组合流+REST K线模拟服务，用于离线验证订阅、重连与补齐逻辑"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.host = host
+        self.port = port
+        self.klines: Dict[str, List[list]] = {}  # symbol -> 已收盘K线（REST格式）
+        self._clients: List[tuple] = []  # (ws, 订阅的交易对集合)
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def ws_base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def rest_url(self) -> str:
+        return f"http://{self.host}:{self.port}/fapi/v1/klines"
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get('/stream', self._handle_ws)
+        app.router.add_get('/fapi/v1/klines', self._handle_klines)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        await self.drop_connections()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _handle_ws(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        streams = request.query.get('streams', '')
+        symbols = {s.split('@')[0].upper() for s in streams.split('/') if s}
+        client = (ws, symbols)
+        self._clients.append(client)
+        try:
+            async for _ in ws:
+                pass
+        finally:
+            if client in self._clients:
+                self._clients.remove(client)
+        return ws
+
+    async def _handle_klines(self, request: web.Request) -> web.Response:
+        symbol = request.query['symbol']
+        limit = int(request.query.get('limit', 500))
+        start = int(request.query.get('startTime', 0))
+        data = [k for k in self.klines.get(symbol, []) if k[0] >= start]
+        return web.json_response(data[-limit:] if start == 0 else data[:limit])
+
+    async def close_bar(self, symbol: str, kline: list, broadcast: bool = True) -> None:
+        """写入一根收盘K线；broadcast=False 模拟断线期间错过的推送"""
+        self.klines.setdefault(symbol, []).append(kline)
+        if not broadcast:
+            return
+        payload = json.dumps({
+            'stream': stream_name(symbol, '5m'),
+            'data': {'e': 'kline', 'E': kline[6], 's': symbol, 'k': {
+                't': kline[0], 'T': kline[6], 's': symbol, 'i': '5m',
+                'o': kline[1], 'h': kline[2], 'l': kline[3], 'c': kline[4], 'v': kline[5], 'x': True,
+            }},
+        })
+        for ws, symbols in list(self._clients):
+            if symbol in symbols and not ws.closed:
+                await ws.send_str(payload)
+
+    async def drop_connections(self) -> None:
+        """主动断开所有客户端，模拟网络中断"""
+        for ws, _ in list(self._clients):
+            await ws.close()
+        self._clients.clear()
+
+# endregion
@@ -0,0 +1,201 @@
+import asyncio
+from abc import ABC, abstractmethod
+from functools import partial
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+import aiohttp
+
+from bar import Bar, bar_from_binance, bar_from_bybit, bar_from_gateio
+from bar_clock import collect_closed, get_clock, pick_closed
+from http_pool import get_session
+from kline_store import KlineStore
+from rate_limit import get_limiter, kline_weight_binance
+from rolling_boll import BOLL_WINDOW, BollingerEngine
+from screener import BODY, WICK, screen_pairs
+from symbol_universe import ChangeCallback, SymbolUniverse, binance_universe, bybit_universe, gateio_universe
+
+SCAN_DEADLINE = 60  # 所有交易所共用的单轮扫描截止时间（秒）
+
+# 单个交易所扫描完成的回调: (adapter, 命中结果)
+ResultCallback = Callable[['ExchangeAdapter', List[dict]], Awaitable[None]]
+
+
+# region 适配器
+class ExchangeAdapter(ABC):
+    """交易所适配器：负责交易对列表与单根K线请求，统一返回 Bar 记录"""
+
+    name = ''
+    title = ''
+    mode = BODY  # 幅度计算方式，见 screener
+    interval = '5m'
+    interval_ms = 300_000
+
+    def __init__(self, threshold: float, store: Optional[KlineStore] = None):
+        self.threshold = threshold
+        self.store = store  # 传入时把请求到的已收盘K线顺带写入本地库
+
+    @abstractmethod
+    def universe(self, on_change: Optional[ChangeCallback] = None) -> SymbolUniverse:
+        """交易对列表（后台刷新）"""
+
+    @abstractmethod
+    async def fetch_bars(self, session: aiohttp.ClientSession, symbol: str) -> List[Bar]:
+        """最近几根K线（顺序不限）"""
+
+    def symbol_key(self, symbol: str) -> str:
+        """结果中展示的交易对名称"""
+        return symbol
+
+    async def fetch_closed(self, session: aiohttp.ClientSession, symbol: str, close_ms: int) -> tuple:
+        """(展示名称, 在close_ms收盘的Bar)，尚未定稿时为None"""
+        bars = await self.fetch_bars(session, symbol)
+        res_bar = pick_closed(bars, close_ms, self.interval_ms)
+        if res_bar is not None:
+            self.record(symbol, bars, close_ms)
+        return self.symbol_key(symbol), res_bar
+
+    def record(self, symbol: str, bars: List[Bar], close_ms: int) -> None:
+        """把close_ms之前已收盘的K线放入本地库写缓冲"""
+        if self.store is not None:
+            self.store.append(self.name, symbol, self.interval, [bar for bar in bars if bar.open_time < close_ms])
+
+    def flush_store(self) -> None:
+        """在线程池中把本轮缓冲的K线写入本地库，不阻塞扫描与推送"""
+        if self.store is not None:
+            asyncio.get_running_loop().run_in_executor(None, self.store.flush_quietly)
+
+    def screen(self, pairs: List[tuple]) -> List[dict]:
+        return screen_pairs(pairs, self.threshold, self.mode)
+
+    async def scan(self, symbols: Iterable[str], close_ms: int, timeout: Optional[float] = None) -> List[dict]:
+        """请求全部交易对在close_ms收盘的K线并筛选，结果附带交易所标记"""
+        fetch = partial(self.fetch_closed, get_session(self.name))
+        pairs = await collect_closed(fetch, symbols, close_ms, timeout=timeout)
+        self.flush_store()
+        return [{**kline, 'exchange': self.name} for kline in self.screen(pairs)]
+
+
+class BinanceAdapter(ExchangeAdapter):
+    """Binance U本位合约；传入boll_engine时顺带维护5分钟滚动布林带，可叠加布林突破条件"""
+
+    name = 'binance'
+    title = 'Binance'
+    mode = WICK
+    url = "https://fapi.binance.com/fapi/v1/klines"
+
+    def __init__(self, threshold: float, boll_engine: Optional[BollingerEngine] = None, boll_filter: bool = False,
+                 store: Optional[KlineStore] = None):
+        super().__init__(threshold, store)
+        self.boll_engine = boll_engine
+        self.boll_filter = boll_filter and boll_engine is not None
+
+    def universe(self, on_change: Optional[ChangeCallback] = None) -> SymbolUniverse:
+        return binance_universe(on_change)
+
+    def _contiguous(self, symbol: str, close_ms: int) -> bool:
+        """布林带已初始化且已含close_ms前一根K线，本轮只需补最近一根"""
+        if self.boll_engine is None:
+            return True
+        return (self.boll_engine.ready(symbol, '5m')
+                and self.boll_engine.last_close_time(symbol, '5m') >= close_ms - self.interval_ms - 1)
+
+    async def fetch_bars(self, session: aiohttp.ClientSession, symbol: str, limit: int = 2) -> List[Bar]:
+        params = {'symbol': symbol, 'interval': '5m', 'limit': limit}
+        data = await get_limiter('binance').get_json(session, self.url, params,
+                                                     weight=kline_weight_binance(params['limit']))
+        return [bar_from_binance(k) for k in data]
+
+    async def fetch_closed(self, session: aiohttp.ClientSession, symbol: str, close_ms: int) -> tuple:
+        # 布林带连续时只取最近2根；未初始化或中间缺K线（跳过/失败的轮次）时取完整窗口重建
+        contiguous = self._contiguous(symbol, close_ms)
+        bars = await self.fetch_bars(session, symbol, 2 if contiguous else BOLL_WINDOW + 1)
+        res_bar = pick_closed(bars, close_ms, self.interval_ms)
+        if res_bar is None:
+            return symbol, None
+        if self.boll_engine is not None:
+            if not contiguous:
+                self.boll_engine.discard(symbol, '5m')
+            self.boll_engine.update_many(symbol, '5m', ((bar.close_time, bar.close) for bar in bars
+                                                        if bar.open_time < close_ms))
+        self.record(symbol, bars, close_ms)
+        return symbol, res_bar
+
+    def breakout(self, kline: dict) -> bool:
+        """阳线收于上轨之上 / 阴线收于下轨之下"""
+        pos = self.boll_engine.position(kline['symbol'], '5m', kline['close'])
+        if pos is None:
+            return False
+        return pos < 0 if kline['is_bearish'] else pos > 1
+
+    def screen(self, pairs: List[tuple]) -> List[dict]:
+        results = super().screen(pairs)
+        if self.boll_filter:
+            results = [k for k in results if self.breakout(k)]
+        return results
+
+
+class BybitAdapter(ExchangeAdapter):
+    name = 'bybit'
+    title = 'Bybit'
+    url = "https://api.bybit.com/v5/market/kline"
+
+    def universe(self, on_change: Optional[ChangeCallback] = None) -> SymbolUniverse:
+        return bybit_universe(on_change)
+
+    async def fetch_bars(self, session: aiohttp.ClientSession, symbol: str) -> List[Bar]:
+        params = {"category": "linear", "symbol": symbol, "interval": 5, "limit": 2}  # Bybit的间隔格式为"5"
+        data = await get_limiter('bybit').get_json(session, self.url, params)
+        return [bar_from_bybit(k) for k in data["result"]["list"]]  # 按时间倒序
+
+
+class GateioAdapter(ExchangeAdapter):
+    name = 'gateio'
+    title = 'Gate.io'
+    url = "https://api.gateio.ws/api/v4/futures/usdt/candlesticks"
+
+    def universe(self, on_change: Optional[ChangeCallback] = None) -> SymbolUniverse:
+        return gateio_universe(on_change)
+
+    async def fetch_bars(self, session: aiohttp.ClientSession, symbol: str) -> List[Bar]:
+        params = {"contract": symbol, "interval": "5m", "limit": 2}
+        data = await get_limiter('gateio').get_json(session, self.url, params)
+        return [bar_from_gateio(k) for k in data]
+
+    def symbol_key(self, symbol: str) -> str:
+        return symbol.replace('_', '')
+
+
+ADAPTERS = {adapter.name: adapter for adapter in (BinanceAdapter, BybitAdapter, GateioAdapter)}
+
+
+# endregion
+
+# region 多交易所并发扫描
+async def scan_exchanges(adapters: Iterable[ExchangeAdapter], symbols: Dict[str, Iterable[str]],
+                         on_results: Optional[ResultCallback] = None,
+                         timeout: float = SCAN_DEADLINE, report_empty: bool = True) -> Dict[str, List[dict]]:
+    """所有启用的交易所同时扫描、共用同一个截止时间；每个交易所完成后立即回调，不等待较慢的交易所；
+    只扫描一部分交易对（多进程分片）时report_empty=False，由合并结果的一方输出无命中提示"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+
+    async def _scan(adapter: ExchangeAdapter):
+        try:
+            clock = get_clock(adapter.name)
+            await clock.ensure_synced()
+            close_ms = clock.last_close_ms(adapter.interval_ms)
+            results = await adapter.scan(symbols[adapter.name], close_ms,
+                                         timeout=max(deadline - loop.time(), 0))
+        except Exception as e:
+            print(f"[{adapter.title}] 扫描错误: {str(e)}")
+            results = []
+        if not results:
+            if report_empty:
+                print(f"[{adapter.title}] 未找到符合条件的合约")
+        elif on_results is not None:
+            await on_results(adapter, results)
+        return adapter.name, results
+
+    return dict(await asyncio.gather(*(_scan(adapter) for adapter in adapters)))
+
+# endregion
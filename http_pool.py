@@ -0,0 +1,160 @@
+import asyncio
+from typing import Dict, Iterable, Optional
+
+import aiohttp
+from yarl import URL
+
+from rate_limit import get_limiter
+
+# 各交易所/推送服务的主机，每个主机一个长连接池
+HOSTS = {
+    'binance': "https://fapi.binance.com",
+    'bybit': "https://api.bybit.com",
+    'gateio': "https://api.gateio.ws",
+    'pushplus': "https://www.pushplus.plus",
+}
+
+# 预热用的轻量接口（不带参数、权重最低）
+PING_PATHS = {
+    'binance': "/fapi/v1/ping",
+    'bybit': "/v5/market/time",
+    'gateio': "/api/v4/futures/usdt/contracts/BTC_USDT",
+}
+
+LIMIT_PER_HOST = 100  # 单主机最大连接数
+KEEPALIVE_TIMEOUT = 330  # 空闲连接保留时长，覆盖5分钟扫描间隔
+DNS_TTL = 600  # DNS缓存秒数
+TIMEOUT = aiohttp.ClientTimeout(total=10, connect=3, sock_read=5)
+WARMUP_LEAD = 5  # 收盘前多少秒预热连接
+
+
+# region 连接池
+def _redirect_request_class(base_url: str, hosts: Iterable[str]) -> type:
+    """把发往指定主机的请求改写到base_url（保留路径与参数），供本地模拟交易所的基准测试使用"""
+    target = URL(base_url)
+    hosts = frozenset(URL(host).host for host in hosts)
+
+    class RedirectedRequest(aiohttp.ClientRequest):
+        def __init__(self, method: str, url: URL, *args, **kwargs):
+            if url.host in hosts:
+                url = url.with_scheme(target.scheme).with_host(target.host).with_port(target.port)
+            super().__init__(method, url, *args, **kwargs)
+
+    return RedirectedRequest
+
+
+class HttpPool:
+    """按主机复用的长连接会话，带DNS缓存、连接上限、超时和复用统计"""
+
+    def __init__(self, limit_per_host: int = LIMIT_PER_HOST, keepalive_timeout: float = KEEPALIVE_TIMEOUT,
+                 dns_ttl: int = DNS_TTL, timeout: aiohttp.ClientTimeout = TIMEOUT):
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_ttl = dns_ttl
+        self.timeout = timeout
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._request_class = aiohttp.ClientRequest
+
+    def _trace_config(self, name: str) -> aiohttp.TraceConfig:
+        stats = self._stats.setdefault(name, {
+            'requests': 0, 'new_connections': 0, 'reused_connections': 0,
+            'dns_cache_hits': 0, 'dns_cache_misses': 0, 'errors': 0,
+        })
+
+        def _counter(key: str):
+            async def _inc(session, ctx, params):
+                stats[key] += 1
+            return _inc
+
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(_counter('requests'))
+        trace.on_connection_create_end.append(_counter('new_connections'))
+        trace.on_connection_reuseconn.append(_counter('reused_connections'))
+        trace.on_dns_cache_hit.append(_counter('dns_cache_hits'))
+        trace.on_dns_cache_miss.append(_counter('dns_cache_misses'))
+        trace.on_request_exception.append(_counter('errors'))
+        return trace
+
+    def session(self, name: str) -> aiohttp.ClientSession:
+        """获取（首次调用时创建）指定主机的共享会话，必须在事件循环内调用"""
+        session = self._sessions.get(name)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit_per_host,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            session = aiohttp.ClientSession(
+                connector=connector, timeout=self.timeout,
+                trace_configs=[self._trace_config(name)],
+                request_class=self._request_class,
+            )
+            self._sessions[name] = session
+        return session
+
+    def redirect(self, base_url: str, names: Iterable[str] = ('binance', 'bybit', 'gateio')) -> None:
+        """之后创建的会话把指定交易所的请求发往base_url（如本地模拟服务器），须在首次请求前调用"""
+        self._request_class = _redirect_request_class(base_url, (HOSTS[name] for name in names))
+
+    async def warm_up(self, name: str, connections: Optional[int] = None) -> None:
+        """在K线收盘前预先建立连接（TCP+TLS+DNS），收盘时直接复用；
+        预热请求同样经过该交易所的限频器计入额度，连接数缺省取限频器当前的并发上限"""
+        path = PING_PATHS.get(name)
+        if path is None:
+            return
+        session = self.session(name)
+        limiter = get_limiter(name)
+        if connections is None:
+            connections = min(limiter.concurrency, self.limit_per_host)
+
+        async def _ping():
+            await limiter.acquire()
+            try:
+                async with session.get(HOSTS[name] + path) as resp:
+                    limiter.observe(resp)
+                    await resp.read()
+            except Exception as e:
+                print(f"[{name}] 连接预热失败: {str(e)}")
+            finally:
+                await limiter.release()
+
+        await asyncio.gather(*(_ping() for _ in range(connections)))
+
+    def stats(self, name: Optional[str] = None) -> dict:
+        """连接复用统计；reuse_rate = 复用连接 / (新建 + 复用)"""
+        names = [name] if name else list(self._stats)
+        result = {}
+        for n in names:
+            s = dict(self._stats.get(n, {}))
+            total = s.get('new_connections', 0) + s.get('reused_connections', 0)
+            s['reuse_rate'] = s.get('reused_connections', 0) / total if total else 0.0
+            result[n] = s
+        return result[name] if name else result
+
+    async def close(self) -> None:
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions.clear()
+
+
+# endregion
+
+POOL = HttpPool()
+
+
+def get_session(name: str) -> aiohttp.ClientSession:
+    return POOL.session(name)
+
+
+async def sleep_with_warm_up(delay: float, names, lead: float = WARMUP_LEAD) -> None:
+    """等待delay秒，并在到点前lead秒预热指定主机的连接"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + delay
+    if delay > lead:
+        await asyncio.sleep(delay - lead)
+        await asyncio.gather(*(POOL.warm_up(name) for name in names))
+    remaining = deadline - loop.time()
+    if remaining > 0:
+        await asyncio.sleep(remaining)
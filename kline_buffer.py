@@ -0,0 +1,152 @@
+import time
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+import numpy as np
+
+from bar import Bar
+from rate_limit import RateLimiter, kline_weight_binance
+
+BINANCE_KLINES_URL = "https://fapi.binance.com/fapi/v1/klines"
+
+INTERVAL_MS = {
+    '1m': 60_000,
+    '3m': 180_000,
+    '5m': 300_000,
+    '15m': 900_000,
+    '30m': 1_800_000,
+    '1h': 3_600_000,
+    '4h': 14_400_000,
+    '1d': 86_400_000,
+}
+
+# 列顺序与REST /klines 前6列一致（open_time单独存int64）
+OPEN, HIGH, LOW, CLOSE, VOLUME = range(5)
+
+
+# region 环形缓冲区
+class KlineRingBuffer:
+    """单个(交易对, 周期)的定长K线环形缓冲区，底层为NumPy数组"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.open_time = np.zeros(capacity, dtype=np.int64)
+        self.close_time = np.zeros(capacity, dtype=np.int64)
+        self.values = np.zeros((capacity, 5), dtype=np.float64)  # open/high/low/close/volume
+        self._head = 0  # 最旧一根的位置
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def last_open_time(self) -> Optional[int]:
+        if self._size == 0:
+            return None
+        return int(self.open_time[(self._head + self._size - 1) % self.capacity])
+
+    def append(self, kline: list) -> None:
+        """写入一根REST格式K线；与最后一根开盘时间相同则覆盖（未收盘K线的更新）"""
+        open_time = int(kline[0])
+        last = self.last_open_time
+        if last is not None and open_time < last:
+            return  # 已存在的旧K线，闭合后不会再变
+        if last is not None and open_time == last:
+            pos = (self._head + self._size - 1) % self.capacity
+        elif self._size < self.capacity:
+            pos = (self._head + self._size) % self.capacity
+            self._size += 1
+        else:
+            pos = self._head
+            self._head = (self._head + 1) % self.capacity
+        self.open_time[pos] = open_time
+        self.close_time[pos] = int(kline[6])
+        self.values[pos] = [float(v) for v in kline[1:6]]
+
+    def _order(self, n: Optional[int] = None) -> np.ndarray:
+        n = self._size if n is None else min(n, self._size)
+        start = self._head + self._size - n
+        return (start + np.arange(n)) % self.capacity
+
+    def column(self, col: int, n: Optional[int] = None) -> np.ndarray:
+        """按时间顺序（旧→新）返回最近n根K线的某一列"""
+        return self.values[self._order(n), col]
+
+    def close_times(self, n: Optional[int] = None) -> np.ndarray:
+        """按时间顺序返回最近n根K线的收盘时间"""
+        return self.close_time[self._order(n)]
+
+    def closed_count(self, now_ms: int) -> int:
+        """已收盘K线数量（最后一根可能尚未收盘）"""
+        if self._size and self.close_time[(self._head + self._size - 1) % self.capacity] >= now_ms:
+            return self._size - 1
+        return self._size
+
+    def row(self, index: int) -> Tuple[int, int, np.ndarray]:
+        """按时间顺序取第index根（支持负数），返回(open_time, close_time, ohlcv)"""
+        pos = self._order()[index]
+        return int(self.open_time[pos]), int(self.close_time[pos]), self.values[pos]
+
+    def bar(self, index: int) -> Bar:
+        """按时间顺序取第index根，返回Bar记录"""
+        pos = self._order()[index]
+        o, h, l, c, v = self.values[pos].tolist()
+        return Bar(int(self.open_time[pos]), o, h, l, c, v, int(self.close_time[pos]))
+
+
+# endregion
+
+# region 缓冲区池
+class KlineBufferPool:
+    """按(交易对, 周期)管理环形缓冲区：首次全量初始化，之后用startTime只拉取最新1~2根"""
+
+    def __init__(self, url: str = BINANCE_KLINES_URL, proxy: Optional[str] = None,
+                 limiter: Optional[RateLimiter] = None):
+        self.url = url
+        self.proxy = proxy
+        self.limiter = limiter
+        self.buffers: Dict[Tuple[str, str], KlineRingBuffer] = {}
+
+    def get(self, symbol: str, interval: str) -> Optional[KlineRingBuffer]:
+        return self.buffers.get((symbol, interval))
+
+    async def refresh(self, session: aiohttp.ClientSession, symbol: str, interval: str,
+                      capacity: int) -> KlineRingBuffer:
+        """增量更新缓冲区并返回"""
+        buf = self.buffers.get((symbol, interval))
+        if buf is None or buf.capacity != capacity:
+            buf = KlineRingBuffer(capacity)
+            params = {'symbol': symbol, 'interval': interval, 'limit': capacity}
+        else:
+            # 从最后一根（可能未收盘）开始，按经过的周期数计算需要的根数；
+            # 多取一根，本地时钟略慢于服务器时也能拿到刚开出的新K线
+            last = buf.last_open_time
+            elapsed = (int(time.time() * 1000) - last) // INTERVAL_MS[interval]
+            params = {
+                'symbol': symbol,
+                'interval': interval,
+                'startTime': last,
+                'limit': int(min(max(elapsed + 2, 2), capacity)),
+            }
+            if elapsed + 1 > capacity:
+                # 缺口超过容量，直接重新初始化
+                buf = KlineRingBuffer(capacity)
+                params = {'symbol': symbol, 'interval': interval, 'limit': capacity}
+
+        if self.limiter is not None:
+            data = await self.limiter.get_json(session, self.url, params,
+                                               weight=kline_weight_binance(params['limit']), proxy=self.proxy)
+        else:
+            async with session.get(self.url, params=params, proxy=self.proxy) as response:
+                data = await response.json()
+        for kline in data:
+            buf.append(kline)
+        self.buffers[(symbol, interval)] = buf
+        return buf
+
+    def discard(self, symbol: str) -> None:
+        """交易对下架后释放缓冲区"""
+        for key in [k for k in self.buffers if k[0] == symbol]:
+            del self.buffers[key]
+
+# endregion
@@ -0,0 +1,218 @@
+import os
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+
+from bar import Bar
+from kline_buffer import INTERVAL_MS
+from timeframes import BASE_INTERVAL, bucket_start
+
+STORE_ROOT = "market_data"
+
+# 定长列（小端），每根K线在每个列文件中占一个元素；按open_time递增只追加
+COLUMNS = (
+    ('open_time', np.dtype('<i8')),
+    ('open', np.dtype('<f8')),
+    ('high', np.dtype('<f8')),
+    ('low', np.dtype('<f8')),
+    ('close', np.dtype('<f8')),
+    ('volume', np.dtype('<f8')),
+)
+
+SeriesKey = Tuple[str, str, str]  # (exchange, symbol, interval)
+
+
+def resample(cols: Dict[str, np.ndarray], interval_ms: int, base_ms: int) -> Dict[str, np.ndarray]:
+    """把基础周期K线列合成为大周期（按 timeframes.bucket_start 对齐），只保留基础K线齐全的周期"""
+    open_time = cols['open_time']
+    if not len(open_time):
+        return {column: np.empty(0, dtype=dtype) for column, dtype in COLUMNS}
+    starts = bucket_start(np.asarray(open_time), interval_ms)
+    first = np.flatnonzero(np.concatenate(([True], starts[1:] != starts[:-1])))
+    last = np.append(first[1:], len(starts)) - 1
+    full = (last - first + 1) == interval_ms // base_ms
+    return {
+        'open_time': starts[first][full],
+        'open': np.asarray(cols['open'])[first][full],
+        'high': np.maximum.reduceat(cols['high'], first)[full],
+        'low': np.minimum.reduceat(cols['low'], first)[full],
+        'close': np.asarray(cols['close'])[last][full],
+        'volume': np.add.reduceat(cols['volume'], first)[full],
+    }
+
+
+@contextmanager
+def _file_lock(path: str):
+    """跨进程排他锁（阻塞等待）：多个扫描脚本共用同一个库目录时串行化同一序列的追加"""
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# region 列式K线存储
+class KlineStore:
+    """本地只追加的列式K线库：<root>/<exchange>/<interval>/<symbol>/<列>.bin
+
+    写入先进入内存缓冲，flush()时批量追加到各列文件（可放到线程中执行）；
+    读取用np.memmap零拷贝映射，open_time列本身有序，即为时间索引（二分查找定位区间）。
+    """
+
+    def __init__(self, root: str = STORE_ROOT):
+        self.root = root
+        self._pending: Dict[SeriesKey, List[Bar]] = defaultdict(list)
+        self._last_open: Dict[SeriesKey, int] = {}
+        self._lock = threading.Lock()  # 保护缓冲区与最后开盘时间
+        self._write_lock = threading.Lock()  # 串行化文件写入
+
+    def _dir(self, key: SeriesKey) -> str:
+        exchange, symbol, interval = key
+        return os.path.join(self.root, exchange, interval, symbol)
+
+    def _path(self, key: SeriesKey, column: str) -> str:
+        return os.path.join(self._dir(key), f"{column}.bin")
+
+    def _stored_count(self, key: SeriesKey, repair: bool = False) -> int:
+        """各列中完整写入的K线数量；repair时把长度不一致或末尾有不完整元素的列（写入中途崩溃）截断到最短"""
+        sizes, partial = [], False
+        for column, dtype in COLUMNS:
+            path = self._path(key, column)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            sizes.append(size // dtype.itemsize)
+            partial = partial or size % dtype.itemsize != 0
+        count = min(sizes)
+        if repair and (partial or any(size != count for size in sizes)):
+            for column, dtype in COLUMNS:
+                path = self._path(key, column)
+                if os.path.exists(path):
+                    with open(path, 'r+b') as f:
+                        f.truncate(count * dtype.itemsize)
+        return count
+
+    def last_open_time(self, exchange: str, symbol: str, interval: str) -> Optional[int]:
+        """已写入（含缓冲中）的最后一根K线的开盘时间"""
+        key = (exchange, symbol, interval)
+        with self._lock:
+            return self._last_open_time(key)
+
+    def _last_open_time(self, key: SeriesKey) -> Optional[int]:
+        if key not in self._last_open:
+            stored = self._stored_last_open(key)
+            if stored is None:
+                return None
+            self._last_open[key] = stored
+        return self._last_open[key]
+
+    def _stored_last_open(self, key: SeriesKey) -> Optional[int]:
+        """列文件中最后一根K线的开盘时间（直接读盘，不经缓存）"""
+        count = self._stored_count(key)
+        if not count:
+            return None
+        with open(self._path(key, 'open_time'), 'rb') as f:
+            f.seek((count - 1) * 8)
+            return int(np.frombuffer(f.read(8), dtype='<i8')[0])
+
+    # --- 写入 ---
+    def append(self, exchange: str, symbol: str, interval: str, bars: Iterable[Bar]) -> int:
+        """缓冲已收盘的K线，只接受比已有数据更新的，返回接受的根数"""
+        key = (exchange, symbol, interval)
+        accepted = 0
+        with self._lock:
+            last = self._last_open_time(key)
+            for bar in sorted(bars, key=lambda b: b.open_time):
+                if last is not None and bar.open_time <= last:
+                    continue
+                self._pending[key].append(bar)
+                last = self._last_open[key] = bar.open_time
+                accepted += 1
+        return accepted
+
+    def flush(self) -> int:
+        """把缓冲中的K线追加到列文件，返回写入根数（可在线程中调用）
+
+        其他进程可能同时写同一序列（如两个扫描脚本共用market_data），因此持有序列文件锁后
+        重新读取盘上最后的开盘时间，只追加比它更新的K线，保证open_time严格递增。
+        """
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, defaultdict(list)
+            written = 0
+            for key, bars in pending.items():
+                os.makedirs(self._dir(key), exist_ok=True)
+                with _file_lock(os.path.join(self._dir(key), '.lock')):
+                    self._stored_count(key, repair=True)  # 先修复可能的不完整写入
+                    stored = self._stored_last_open(key)
+                    if stored is not None:
+                        bars = [bar for bar in bars if bar.open_time > stored]
+                    if bars:
+                        for column, dtype in COLUMNS:
+                            values = np.fromiter((getattr(bar, column) for bar in bars), dtype=dtype, count=len(bars))
+                            with open(self._path(key, column), 'ab') as f:
+                                values.tofile(f)
+                        stored = bars[-1].open_time
+                written += len(bars)
+                if stored is not None:
+                    with self._lock:
+                        if stored > self._last_open.get(key, -1):
+                            self._last_open[key] = stored  # 其他进程已写到更新的K线
+            return written
+
+    def flush_quietly(self) -> None:
+        """后台线程用：写入失败只打印，不影响扫描"""
+        try:
+            self.flush()
+        except OSError as e:
+            print(f"K线本地库写入失败: {str(e)}")
+
+    # --- 读取 ---
+    def read(self, exchange: str, symbol: str, interval: str,
+             start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """按开盘时间区间 [start_ms, end_ms) 读取，返回各列的只读内存映射视图（不复制数据）；
+        本地没有该周期但有基础周期（5m）时，由基础K线合成（返回新数组）"""
+        key = (exchange, symbol, interval)
+        count = self._stored_count(key)
+        if not count and self._derived(exchange, interval):
+            base_ms, interval_ms = INTERVAL_MS[BASE_INTERVAL], INTERVAL_MS[interval]
+            base_end = bucket_start(end_ms - 1, interval_ms) + interval_ms if end_ms is not None else None
+            return resample(self.read(exchange, symbol, BASE_INTERVAL, start_ms, base_end), interval_ms, base_ms)
+        if not count:
+            return {column: np.empty(0, dtype=dtype) for column, dtype in COLUMNS}
+        columns = {column: np.memmap(self._path(key, column), dtype=dtype, mode='r', shape=(count,))
+                   for column, dtype in COLUMNS}
+        open_time = columns['open_time']
+        lo = int(np.searchsorted(open_time, start_ms, 'left')) if start_ms is not None else 0
+        hi = int(np.searchsorted(open_time, end_ms, 'left')) if end_ms is not None else count
+        return {column: values[lo:hi] for column, values in columns.items()}
+
+    def _derived(self, exchange: str, interval: str) -> bool:
+        """该周期没有单独存储，需要由基础周期合成"""
+        return (interval != BASE_INTERVAL and INTERVAL_MS.get(interval, 0) > INTERVAL_MS[BASE_INTERVAL]
+                and not os.path.isdir(os.path.join(self.root, exchange, interval)))
+
+    def symbols(self, exchange: str, interval: str) -> List[str]:
+        if self._derived(exchange, interval):
+            interval = BASE_INTERVAL
+        path = os.path.join(self.root, exchange, interval)
+        return sorted(os.listdir(path)) if os.path.isdir(path) else []
+
+
+# endregion
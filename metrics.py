@@ -0,0 +1,336 @@
+import bisect
+import logging
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from typing import Deque, Dict, Optional
+
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9108
+SUMMARY_LOG = "scan_metrics.log"
+SUMMARY_EVERY = 12  # 每N轮输出一次滚动汇总（5分钟周期即每小时）
+HISTORY_SIZE = 288  # 保留最近N轮明细（一天）
+
+# 延迟直方图桶（毫秒）
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+
+
+def now_ms() -> float:
+    return time.time() * 1000
+
+
+# region 直方图
+class Histogram:
+    """固定桶的延迟直方图，分位数按桶上界估算"""
+
+    __slots__ = ('counts', 'count', 'sum', 'max')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value_ms: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS_MS, value_ms)] += 1
+        self.count += 1
+        self.sum += value_ms
+        self.max = max(self.max, value_ms)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS_MS, self.counts):
+            seen += n
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def state(self) -> tuple:
+        return list(self.counts), self.count, self.sum, self.max
+
+    def merge(self, state: tuple) -> None:
+        """合并另一个直方图的state()（如分片进程回传的本轮请求延迟）"""
+        counts, count, total, peak = state
+        self.counts = [a + b for a, b in zip(self.counts, counts)]
+        self.count += count
+        self.sum += total
+        self.max = max(self.max, peak)
+
+
+# endregion
+
+# region 单轮指标
+class CycleMetrics:
+    """一轮扫描的各阶段耗时（毫秒）"""
+
+    def __init__(self, name: str, bar_close_ms: float):
+        self.name = name
+        self.bar_close_ms = bar_close_ms
+        self.started_ms = now_ms()
+        self.first_request_ms: Optional[float] = None
+        self.first_alert_ms: Optional[float] = None
+        self.finished_ms: Optional[float] = None
+        self.requests = 0
+        self.parse_ms = 0.0
+        self.eval_ms = 0.0
+        self.notify_ms = 0.0  # 本轮告警入队→首次送达的最长耗时
+        self.pending_alerts = 0  # 已入队、尚未送达或放弃的告警数
+        self.errors = 0
+        self.timeouts = 0
+        self.errors_by_exchange: Dict[str, int] = defaultdict(int)
+        self.fetch = Histogram()
+
+    def counters(self) -> dict:
+        """可在进程间传递并合并的计数（见 ScanMetrics.merge_cycle）"""
+        return {
+            'requests': self.requests,
+            'first_request_ms': self.first_request_ms,
+            'parse_ms': self.parse_ms,
+            'eval_ms': self.eval_ms,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'errors_by_exchange': dict(self.errors_by_exchange),
+            'fetch': self.fetch.state(),
+        }
+
+    def summary(self) -> dict:
+        def _since_close(ts):
+            return round(ts - self.bar_close_ms, 1) if ts is not None else None
+
+        return {
+            'name': self.name,
+            'close_to_first_request_ms': _since_close(self.first_request_ms),
+            'close_to_alert_ms': _since_close(self.first_alert_ms),
+            'cycle_ms': round((self.finished_ms or now_ms()) - self.started_ms, 1),
+            'requests': self.requests,
+            'fetch_p50_ms': round(self.fetch.quantile(0.5), 1),
+            'fetch_p95_ms': round(self.fetch.quantile(0.95), 1),
+            'parse_ms': round(self.parse_ms, 2),
+            'eval_ms': round(self.eval_ms, 3),
+            'notify_ms': round(self.notify_ms, 1),
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+        }
+
+
+# endregion
+
+# region 指标汇总
+class ScanMetrics:
+    """扫描链路指标：收盘→首个请求、请求延迟直方图、解析/筛选/推送耗时、错误数"""
+
+    def __init__(self, summary_log: Optional[str] = SUMMARY_LOG):
+        self.current: Optional[CycleMetrics] = None
+        self.history: Deque[dict] = deque(maxlen=HISTORY_SIZE)
+        self.fetch_by_exchange: Dict[str, Histogram] = defaultdict(Histogram)
+        self.fetch_by_symbol: Dict[tuple, Histogram] = defaultdict(Histogram)
+        self.errors_by_exchange: Dict[str, int] = defaultdict(int)
+        self.cycles = 0
+        self.merged_requests = 0  # 从分片进程合并来的请求数（本进程的请求由连接池统计）
+        self._runner = None  # aiohttp.web.AppRunner，启动端点时才导入aiohttp.web
+        self._logger = logging.getLogger('scan_metrics')
+        if summary_log and not self._logger.handlers:
+            handler = RotatingFileHandler(summary_log, maxBytes=5 * 1024 * 1024, backupCount=3,
+                                          encoding='utf-8', delay=True)
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self._logger.addHandler(handler)
+            self._logger.setLevel(logging.INFO)
+            self._logger.propagate = False
+
+    # --- 埋点接口 ---
+    def begin_cycle(self, name: str, bar_close_ms: Optional[float] = None, interval_ms: int = 300_000) -> CycleMetrics:
+        """在收盘后开始一轮扫描；bar_close_ms缺省按当前时间向下取整到周期边界"""
+        if bar_close_ms is None:
+            bar_close_ms = now_ms() // interval_ms * interval_ms
+        self.current = CycleMetrics(name, bar_close_ms)
+        return self.current
+
+    def end_cycle(self) -> Optional[dict]:
+        """结束本轮扫描；仍有告警在发送中时，等其送达（或放弃）后再输出本轮汇总"""
+        cycle = self.current
+        if cycle is None:
+            return None
+        cycle.finished_ms = now_ms()
+        self.current = None
+        if cycle.pending_alerts:
+            return None
+        return self._publish(cycle)
+
+    def _publish(self, cycle: CycleMetrics) -> dict:
+        summary = cycle.summary()
+        self.history.append(summary)
+        self.cycles += 1
+        line = ' '.join(f"{k}={v}" for k, v in summary.items())
+        print(f"[指标] {line}")
+        self._logger.info(line)
+        if self.cycles % SUMMARY_EVERY == 0:
+            self._logger.info(f"[滚动汇总] {self.rolling_summary()}")
+        return summary
+
+    def take_cycle(self) -> Optional[dict]:
+        """分片进程用：结束本轮但不输出汇总，返回本轮计数交给父进程合并"""
+        cycle, self.current = self.current, None
+        return cycle.counters() if cycle is not None else None
+
+    def merge_cycle(self, counters: Optional[dict]) -> None:
+        """把分片进程回传的本轮计数合并到当前轮次与累计错误数"""
+        if not counters:
+            return
+        self.merged_requests += counters['requests']
+        for exchange, n in counters['errors_by_exchange'].items():
+            self.errors_by_exchange[exchange] += n
+        cycle = self.current
+        if cycle is None:
+            return
+        cycle.requests += counters['requests']
+        first = counters['first_request_ms']
+        if first is not None and (cycle.first_request_ms is None or first < cycle.first_request_ms):
+            cycle.first_request_ms = first
+        cycle.parse_ms += counters['parse_ms']
+        cycle.eval_ms += counters['eval_ms']
+        cycle.errors += counters['errors']
+        cycle.timeouts += counters['timeouts']
+        for exchange, n in counters['errors_by_exchange'].items():
+            cycle.errors_by_exchange[exchange] += n
+        cycle.fetch.merge(counters['fetch'])
+
+    def observe_request_start(self) -> None:
+        cycle = self.current
+        if cycle is not None:
+            cycle.requests += 1
+            if cycle.first_request_ms is None:
+                cycle.first_request_ms = now_ms()
+
+    def observe_fetch(self, exchange: str, symbol: Optional[str], elapsed_ms: float) -> None:
+        self.fetch_by_exchange[exchange].observe(elapsed_ms)
+        if symbol:
+            self.fetch_by_symbol[(exchange, symbol)].observe(elapsed_ms)
+        if self.current is not None:
+            self.current.fetch.observe(elapsed_ms)
+
+    def observe_error(self, exchange: str, timeout: bool = False) -> None:
+        self.errors_by_exchange[exchange] += 1
+        if self.current is not None:
+            self.current.errors_by_exchange[exchange] += 1
+            if timeout:
+                self.current.timeouts += 1
+            else:
+                self.current.errors += 1
+
+    def add_parse(self, elapsed_ms: float) -> None:
+        if self.current is not None:
+            self.current.parse_ms += elapsed_ms
+
+    def add_eval(self, elapsed_ms: float) -> None:
+        if self.current is not None:
+            self.current.eval_ms += elapsed_ms
+
+    def alert_queued(self) -> Optional[CycleMetrics]:
+        """告警入队时调用，返回所属的扫描轮次（送达后交给alert_settled）"""
+        cycle = self.current
+        if cycle is not None:
+            cycle.pending_alerts += 1
+        return cycle
+
+    def alert_settled(self, cycle: Optional[CycleMetrics], queued_ms: float, delivered_ms: Optional[float]) -> None:
+        """告警首次送达任一后端（delivered_ms）或所有后端均已放弃（None）：记录推送耗时与收盘→告警延迟"""
+        if cycle is None:
+            return
+        if delivered_ms is not None:
+            cycle.notify_ms = max(cycle.notify_ms, delivered_ms - queued_ms)
+            if cycle.first_alert_ms is None or delivered_ms < cycle.first_alert_ms:
+                cycle.first_alert_ms = delivered_ms
+        cycle.pending_alerts -= 1
+        if cycle.pending_alerts == 0 and cycle.finished_ms is not None:
+            self._publish(cycle)
+
+    # --- 输出 ---
+    def rolling_summary(self, last: int = SUMMARY_EVERY) -> str:
+        recent = list(self.history)[-last:]
+        if not recent:
+            return "无数据"
+
+        def _avg(key):
+            values = [c[key] for c in recent if c[key] is not None]
+            return round(sum(values) / len(values), 1) if values else None
+
+        def _max(key):
+            values = [c[key] for c in recent if c[key] is not None]
+            return max(values) if values else None
+
+        return (f"最近{len(recent)}轮 收盘→首请求 avg={_avg('close_to_first_request_ms')}ms "
+                f"收盘→告警 avg={_avg('close_to_alert_ms')}ms max={_max('close_to_alert_ms')}ms "
+                f"周期 avg={_avg('cycle_ms')}ms 请求p95 avg={_avg('fetch_p95_ms')}ms "
+                f"错误={sum(c['errors'] for c in recent)} 超时={sum(c['timeouts'] for c in recent)}")
+
+    def render_text(self, top_symbols: int = 20) -> str:
+        """Prometheus风格的文本指标"""
+        lines = [f"scan_cycles_total {self.cycles}"]
+        if self.history:
+            for key, value in self.history[-1].items():
+                if isinstance(value, (int, float)):
+                    lines.append(f'scan_last_cycle_{key}{{name="{self.history[-1]["name"]}"}} {value}')
+        for exchange, hist in sorted(self.fetch_by_exchange.items()):
+            cumulative = 0
+            for bound, n in zip(BUCKETS_MS, hist.counts):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else bound
+                lines.append(f'scan_fetch_ms_bucket{{exchange="{exchange}",le="{le}"}} {cumulative}')
+            lines.append(f'scan_fetch_ms_sum{{exchange="{exchange}"}} {hist.sum:.1f}')
+            lines.append(f'scan_fetch_ms_count{{exchange="{exchange}"}} {hist.count}')
+        for exchange, n in sorted(self.errors_by_exchange.items()):
+            lines.append(f'scan_errors_total{{exchange="{exchange}"}} {n}')
+        slowest = sorted(self.fetch_by_symbol.items(), key=lambda kv: kv[1].quantile(0.95), reverse=True)
+        for (exchange, symbol), hist in slowest[:top_symbols]:
+            lines.append(f'scan_symbol_fetch_p95_ms{{exchange="{exchange}",symbol="{symbol}"}} '
+                         f'{hist.quantile(0.95):.1f}')
+        return '\n'.join(lines) + '\n'
+
+    async def start_http(self, host: str = METRICS_HOST, port: int = METRICS_PORT) -> None:
+        """启动本地HTTP指标端点：/metrics 文本指标，/summary 滚动汇总"""
+        from aiohttp import web
+
+        async def _metrics(request):
+            return web.Response(text=self.render_text())
+
+        async def _summary(request):
+            return web.Response(text=self.rolling_summary(len(self.history)) + '\n')
+
+        app = web.Application()
+        app.router.add_get('/metrics', _metrics)
+        app.router.add_get('/summary', _summary)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, host, port).start()
+        except OSError as e:
+            print(f"[指标] 指标端点启动失败: {str(e)}")
+            return
+        print(f"[指标] 本地指标端点 http://{host}:{port}/metrics")
+
+    async def stop_http(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+# endregion
+
+METRICS = ScanMetrics()
+
+
+@contextmanager
+def timed(add):
+    """计时上下文：with timed(METRICS.add_eval): ..."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add((time.perf_counter() - start) * 1000)
@@ -0,0 +1,244 @@
+import asyncio
+import math
+import random
+import time
+import zlib
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from aiohttp import web
+
+from kline_buffer import INTERVAL_MS
+
+MOCK_HOST = '127.0.0.1'
+MOCK_PORT = 18080
+SPIKE_RATE = 0.02  # 每根K线出现大幅波动（约±10%）的概率，让筛选与推送路径也被覆盖
+
+
+# region 延迟分布
+def latency_sampler(dist: str = 'lognormal', mean_ms: float = 30.0, spread_ms: float = 10.0,
+                    rng: Optional[random.Random] = None) -> Callable[[], float]:
+    """返回每次调用给出一个响应延迟（秒）的函数：fixed / uniform / normal / lognormal"""
+    rng = rng or random.Random()
+    if dist == 'fixed' or mean_ms <= 0:
+        return lambda: max(mean_ms, 0) / 1000
+    if dist == 'uniform':
+        return lambda: max(rng.uniform(mean_ms - spread_ms, mean_ms + spread_ms), 0) / 1000
+    if dist == 'normal':
+        return lambda: max(rng.gauss(mean_ms, spread_ms), 0) / 1000
+    if dist == 'lognormal':
+        # 按给定均值与标准差换算对数正态参数，长尾更接近真实网络
+        sigma2 = math.log(1 + (spread_ms / mean_ms) ** 2)
+        mu = math.log(mean_ms) - sigma2 / 2
+        return lambda: rng.lognormvariate(mu, sigma2 ** 0.5) / 1000
+    raise ValueError(f"未知的延迟分布: {dist}")
+
+
+# endregion
+
+# region 模拟行情
+def mock_bar(symbol: str, open_time: int) -> tuple:
+    """(open, high, low, close)：由交易对与开盘时间确定，同一根K线多次请求结果一致"""
+    seed = zlib.crc32(f"{symbol}{open_time}".encode())
+    rng = random.Random(seed)
+    base = 1 + zlib.crc32(symbol.encode()) % 1000
+    change = rng.choice((-0.1, 0.1)) if rng.random() < SPIKE_RATE else rng.gauss(0, 0.005)
+    open_ = base * (1 + rng.gauss(0, 0.01))
+    close = open_ * (1 + change)
+    return open_, max(open_, close) * 1.002, min(open_, close) * 0.998, close
+
+
+def mock_open_times(interval_ms: int, limit: int, start_ms: Optional[int] = None,
+                    now_ms: Optional[int] = None) -> List[int]:
+    """最近limit根K线的开盘时间（含当前未收盘的一根）；给出start_ms时从该时间起"""
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    current = now_ms // interval_ms * interval_ms
+    if start_ms is not None:
+        first = start_ms // interval_ms * interval_ms
+        return list(range(first, min(first + limit * interval_ms, current + interval_ms), interval_ms))
+    return [current - i * interval_ms for i in range(limit - 1, -1, -1)]
+
+
+# endregion
+
+# region 模拟服务器
+class MockExchange:
+    """本地模拟的 Binance / Bybit / Gate.io 行情接口（K线、交易对列表、服务器时间），
+    可配置交易对数量、响应延迟分布、错误率与每秒请求上限（超过返回429）"""
+
+    def __init__(self, symbols: int = 300, latency: Optional[Callable[[], float]] = None,
+                 error_rate: float = 0.0, rate_limit: int = 0, seed: int = 0):
+        self.symbol_count = symbols
+        self.latency = latency or latency_sampler('fixed', 0)
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit  # 每个交易所每秒请求上限，0为不限
+        self.rng = random.Random(seed)
+        self.counters: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._window: Dict[str, List[int]] = defaultdict(lambda: [0, 0])  # 交易所 -> [当前秒, 本秒请求数]
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = ''
+
+    def symbols(self, exchange: str) -> List[str]:
+        sep = '_' if exchange == 'gateio' else ''
+        return [f"M{i:04d}{sep}USDT" for i in range(self.symbol_count)]
+
+    # --- 公共处理：延迟、限频、错误注入 ---
+    def _wrap(self, exchange: str, handler: Callable) -> Callable:
+        async def _handle(request: web.Request) -> web.Response:
+            counters = self.counters[exchange]
+            counters['requests'] += 1
+            second = int(time.monotonic())
+            window = self._window[exchange]
+            if window[0] != second:
+                window[:] = [second, 0]
+            window[1] += 1
+            await asyncio.sleep(self.latency())
+            if self.rate_limit and window[1] > self.rate_limit:
+                counters['throttled'] += 1
+                return web.json_response({'code': -1003, 'msg': 'Too many requests'}, status=429,
+                                         headers={'Retry-After': '1'})
+            if self.error_rate and self.rng.random() < self.error_rate:
+                counters['errors'] += 1
+                return web.json_response({'code': -1000, 'msg': 'mock error'}, status=500)
+            remaining = max(self.rate_limit - window[1], 0) if self.rate_limit else None
+            return web.json_response(handler(request), headers=self._limit_headers(exchange, window[1], remaining))
+        return _handle
+
+    @staticmethod
+    def _limit_headers(exchange: str, used: int, remaining: Optional[int]) -> Dict[str, str]:
+        if remaining is None:
+            return {}
+        if exchange == 'binance':
+            return {'X-MBX-USED-WEIGHT-1M': str(used)}
+        if exchange == 'bybit':
+            return {'X-Bapi-Limit-Status': str(remaining)}
+        return {'X-Gate-RateLimit-Requests-Remain': str(remaining)}
+
+    # --- Binance ---
+    def _binance_exchange_info(self, request: web.Request):
+        return {'serverTime': int(time.time() * 1000),
+                'symbols': [{'symbol': s, 'status': 'TRADING', 'contractType': 'PERPETUAL'}
+                            for s in self.symbols('binance')]}
+
+    def _binance_klines(self, request: web.Request):
+        q = request.query
+        interval_ms = INTERVAL_MS[q.get('interval', '5m')]
+        start = int(q['startTime']) if 'startTime' in q else None
+        rows = []
+        for t in mock_open_times(interval_ms, int(q.get('limit', 500)), start):
+            o, h, l, c = mock_bar(q['symbol'], t)
+            rows.append([t, f"{o:.6f}", f"{h:.6f}", f"{l:.6f}", f"{c:.6f}", "1000", t + interval_ms - 1,
+                         "0", 100, "0", "0", "0"])
+        return rows
+
+    # --- Bybit ---
+    def _bybit_instruments(self, request: web.Request):
+        return {'retCode': 0, 'result': {'list': [{'symbol': s, 'status': 'Trading'}
+                                                  for s in self.symbols('bybit')]}}
+
+    def _bybit_kline(self, request: web.Request):
+        q = request.query
+        interval_ms = int(q.get('interval', 5)) * 60_000
+        rows = []
+        for t in reversed(mock_open_times(interval_ms, int(q.get('limit', 200)))):  # 按时间倒序
+            o, h, l, c = mock_bar(q['symbol'], t)
+            rows.append([str(t), f"{o:.6f}", f"{h:.6f}", f"{l:.6f}", f"{c:.6f}", "1000", "0"])
+        return {'retCode': 0, 'result': {'symbol': q['symbol'], 'list': rows}}
+
+    # --- Gate.io ---
+    def _gateio_contracts(self, request: web.Request):
+        return [{'name': s, 'in_delisting': False} for s in self.symbols('gateio')]
+
+    def _gateio_candlesticks(self, request: web.Request):
+        q = request.query
+        interval_ms = INTERVAL_MS[q.get('interval', '5m')]
+        rows = []
+        for t in mock_open_times(interval_ms, int(q.get('limit', 100))):
+            o, h, l, c = mock_bar(q['contract'], t)
+            rows.append({'t': t // 1000, 'o': f"{o:.6f}", 'h': f"{h:.6f}", 'l': f"{l:.6f}", 'c': f"{c:.6f}",
+                         'v': 1000})
+        return rows
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        routes = {
+            'binance': [
+                ('/fapi/v1/exchangeInfo', self._binance_exchange_info),
+                ('/fapi/v1/klines', self._binance_klines),
+                ('/fapi/v1/time', lambda r: {'serverTime': int(time.time() * 1000)}),
+                ('/fapi/v1/ping', lambda r: {}),
+            ],
+            'bybit': [
+                ('/v5/market/instruments-info', self._bybit_instruments),
+                ('/v5/market/kline', self._bybit_kline),
+                ('/v5/market/time', lambda r: {'retCode': 0, 'time': int(time.time() * 1000)}),
+            ],
+            'gateio': [
+                ('/api/v4/futures/usdt/contracts', self._gateio_contracts),
+                ('/api/v4/futures/usdt/contracts/{contract}', lambda r: {'name': r.match_info['contract']}),
+                ('/api/v4/futures/usdt/candlesticks', self._gateio_candlesticks),
+                ('/api/v4/spot/time', lambda r: {'server_time': int(time.time() * 1000)}),
+            ],
+        }
+        for exchange, handlers in routes.items():
+            for path, handler in handlers:
+                app.router.add_get(path, self._wrap(exchange, handler))
+        app.router.add_get('/mock/stats', self._stats)
+        return app
+
+    async def _stats(self, request: web.Request) -> web.Response:
+        """各交易所收到的请求数、注入的错误数与429次数（基准测试结束时读取）"""
+        return web.json_response({exchange: dict(c) for exchange, c in self.counters.items()})
+
+    async def start(self, host: str = MOCK_HOST, port: int = MOCK_PORT) -> str:
+        """启动服务器，返回基础地址（port为0时自动分配端口）"""
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        port = self._runner.addresses[0][1]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+# endregion
+
+
+async def _serve_forever(mock: MockExchange, host: str, port: int) -> None:
+    print(f"模拟交易所已启动: {await mock.start(host, port)}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await mock.stop()
+
+
+def run_server(symbols: int = 300, dist: str = 'lognormal', mean_ms: float = 30.0, spread_ms: float = 10.0,
+               error_rate: float = 0.0, rate_limit: int = 0, host: str = MOCK_HOST, port: int = MOCK_PORT,
+               seed: int = 0) -> None:
+    """在当前进程中运行模拟服务器直到被终止（基准测试在独立进程中调用，避免与被测扫描争用事件循环）"""
+    rng = random.Random(seed)
+    mock = MockExchange(symbols, latency_sampler(dist, mean_ms, spread_ms, rng), error_rate, rate_limit, seed)
+    try:
+        asyncio.run(_serve_forever(mock, host, port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    # 单独运行: python mock_exchange.py --symbols 300 --latency lognormal --mean-ms 30 --error-rate 0.01
+    import argparse
+    parser = argparse.ArgumentParser(description="本地模拟交易所行情接口")
+    parser.add_argument('--symbols', type=int, default=300)
+    parser.add_argument('--latency', default='lognormal', choices=['fixed', 'uniform', 'normal', 'lognormal'])
+    parser.add_argument('--mean-ms', type=float, default=30.0)
+    parser.add_argument('--spread-ms', type=float, default=10.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=int, default=0, help="每个交易所每秒请求上限，0为不限")
+    parser.add_argument('--port', type=int, default=MOCK_PORT)
+    args = parser.parse_args()
+    run_server(args.symbols, args.latency, args.mean_ms, args.spread_ms, args.error_rate, args.rate_limit,
+               port=args.port)
@@ -0,0 +1,290 @@
+import asyncio
+import csv
+import importlib
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Iterable, List, Optional, Sequence, TextIO, Tuple
+
+from http_pool import get_session
+from metrics import METRICS, CycleMetrics, now_ms
+
+COALESCE_WINDOW = 1.0  # 合并窗口（秒）：窗口内同标题的告警合并为一条
+SEND_RETRIES = 3
+RETRY_BACKOFF = 1.0  # 首次重试等待秒数，之后每次翻倍
+PUSHPLUS_URL = "https://www.pushplus.plus/send"
+ALERT_JOURNAL = "alert_journal.csv"  # 告警日志，trading_analyse据此把交易与之前的告警关联
+
+
+def preload(*modules: str) -> threading.Thread:
+    """在后台线程导入可选的重量级模块（桌面通知、剪贴板），首次告警时不再付出导入开销"""
+    def _import():
+        for name in modules:
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                pass
+
+    thread = threading.Thread(target=_import, name='preload', daemon=True)
+    thread.start()
+    return thread
+
+
+# region 推送后端
+class PushPlusBackend:
+    """PushPlus微信推送，复用共享长连接"""
+
+    name = 'wechat'
+
+    def __init__(self, token: str, session_name: str = 'pushplus'):
+        self.token = token
+        self.session_name = session_name
+
+    async def send(self, title: str, content: str) -> None:
+        params = {'token': self.token, 'title': title, 'content': content}
+        async with get_session(self.session_name).get(PUSHPLUS_URL, params=params) as resp:
+            resp.raise_for_status()
+            data = await resp.json(content_type=None)
+        if data.get('code') != 200:
+            raise RuntimeError(f"PushPlus返回错误: {data.get('msg')}")
+
+
+class ToastBackend:
+    """Windows桌面通知：复用同一个ToastNotifier，在专用的单线程中依次显示（每条占用线程整个显示时长，
+    不占默认线程池，以免阻塞告警日志写入与剪贴板）"""
+
+    name = 'toast'
+    modules = ('win10toast',)
+
+    def __init__(self, duration: int = 15):
+        self.duration = duration
+        self._toaster = None
+        self._available = True
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def send(self, title: str, content: str) -> None:
+        if not self._available:
+            return
+        if self._toaster is None:
+            try:
+                from win10toast import ToastNotifier
+            except ImportError:
+                self._available = False
+                print("未安装win10toast，桌面通知已禁用")
+                return
+            self._toaster = ToastNotifier()
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='toast')
+        await asyncio.get_running_loop().run_in_executor(
+            self._executor, partial(self._toaster.show_toast, title, content, duration=self.duration, threaded=False))
+
+
+class ClipboardBackend:
+    """把第一个交易对复制到剪贴板，方便直接粘贴到交易软件"""
+
+    name = 'clipboard'
+    modules = ('pyperclip',)
+
+    def __init__(self):
+        self._available = True
+
+    async def send(self, title: str, content: str) -> None:
+        if not self._available:
+            return
+        try:
+            import pyperclip
+        except ImportError:
+            self._available = False
+            print("未安装pyperclip，剪贴板复制已禁用")
+            return
+        await asyncio.to_thread(pyperclip.copy, content.split(',')[0].split(':')[0])
+
+
+class StreamBackend:
+    """输出到控制台（或任意文本流）"""
+
+    name = 'stdout'
+
+    def __init__(self, stream: TextIO = sys.stdout):
+        self.stream = stream
+
+    async def send(self, title: str, content: str) -> None:
+        print(f"{title}:{content}", file=self.stream, flush=True)
+
+
+class FileBackend:
+    """按行追加到告警文件"""
+
+    name = 'file'
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _write(self, line: str) -> None:
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+    async def send(self, title: str, content: str) -> None:
+        line = f"{time.strftime('%Y-%m-%d %H:%M:%S')} {title}:{content}\n"
+        await asyncio.to_thread(self._write, line)
+
+
+class JournalBackend:
+    """告警日志：每个交易对一行追加到CSV（本地时间,来源,交易对,说明），内容格式为 "交易对: 说明,交易对: 说明" """
+
+    name = 'journal'
+    header = ('time', 'source', 'symbol', 'detail')
+
+    def __init__(self, path: str = ALERT_JOURNAL):
+        self.path = path
+
+    def _write(self, rows: List[Tuple[str, str, str, str]]) -> None:
+        new = not os.path.exists(self.path)
+        with open(self.path, 'a', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            if new:
+                writer.writerow(self.header)
+            writer.writerows(rows)
+
+    async def send(self, title: str, content: str) -> None:
+        now = time.strftime('%Y-%m-%d %H:%M:%S')
+        rows = []
+        for part in content.split(','):
+            symbol, _, detail = part.partition(':')
+            if symbol.strip():
+                rows.append((now, title, symbol.strip().upper(), detail.strip()))
+        if rows:
+            await asyncio.to_thread(self._write, rows)
+
+
+# endregion
+
+# region 调度器
+class _Delivery:
+    """一条（合并后的）告警在各后端的发送进度：首个后端成功即视为送达，全部放弃则记为未送达"""
+
+    def __init__(self, origins: List[Tuple[Optional[CycleMetrics], float]], backends: int):
+        self.origins = origins  # 合并前各条告警的 (所属扫描轮次, 入队时间ms)
+        self.remaining = backends
+        self.delivered = False
+
+    def _settle(self, delivered_ms: Optional[float]) -> None:
+        for cycle, queued_ms in self.origins:
+            METRICS.alert_settled(cycle, queued_ms, delivered_ms)
+
+    def done(self, ok: bool) -> None:
+        self.remaining -= 1
+        if ok and not self.delivered:
+            self.delivered = True
+            self._settle(now_ms())
+        elif self.remaining <= 0 and not self.delivered:
+            self.delivered = True
+            self._settle(None)
+
+
+class Notifier:
+    """异步告警队列：notify()只入队立即返回，后台任务按窗口合并同标题告警，各后端并行发送并退避重试"""
+
+    def __init__(self, backends: Sequence, window: float = COALESCE_WINDOW,
+                 retries: int = SEND_RETRIES, backoff: float = RETRY_BACKOFF):
+        self.backends = {backend.name: backend for backend in backends}
+        self.window = window
+        self.retries = retries
+        self.backoff = backoff
+        self.sent = 0
+        self.failed = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._sending: set = set()
+
+    def preload(self) -> threading.Thread:
+        """后台预先导入各后端依赖的模块"""
+        return preload(*(name for backend in self.backends.values() for name in getattr(backend, 'modules', ())))
+
+    def notify(self, title: str, content: str, via: Optional[Iterable[str]] = None) -> None:
+        """提交一条告警；via指定后端名称，缺省发往全部后端"""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        via = tuple(self.backends) if via is None else tuple(name for name in via if name in self.backends)
+        self._queue.put_nowait((title, content, via, METRICS.alert_queued(), now_ms()))
+
+    async def _collect(self) -> List[tuple]:
+        """取出首条告警后再等待一个合并窗口，收集期间到达的全部告警"""
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.window
+        while True:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    @staticmethod
+    def coalesce(batch: Iterable[tuple]) -> Dict[Tuple[str, tuple], str]:
+        """同标题、同后端的告警合并为一条，内容按出现顺序去重"""
+        merged: Dict[Tuple[str, tuple], Dict[str, None]] = {}
+        for title, content, via, *_ in batch:
+            parts = merged.setdefault((title, via), {})
+            for part in content.split(','):
+                parts[part] = None
+        return {key: ','.join(parts) for key, parts in merged.items()}
+
+    async def _send(self, backend, title: str, content: str, delivery: _Delivery) -> None:
+        for attempt in range(self.retries + 1):
+            try:
+                await backend.send(title, content)
+                self.sent += 1
+                delivery.done(True)
+                return
+            except Exception as e:
+                if attempt == self.retries:
+                    self.failed += 1
+                    delivery.done(False)
+                    print(f"[{backend.name}] 推送失败，已放弃: {str(e)}")
+                    return
+                delay = self.backoff * 2 ** attempt
+                print(f"[{backend.name}] 推送失败，{delay:.1f}秒后重试: {str(e)}")
+                await asyncio.sleep(delay)
+
+    def _dispatch(self, batch: List[tuple]) -> None:
+        origins: Dict[Tuple[str, tuple], list] = {}
+        for title, _, via, cycle, queued_ms in batch:
+            origins.setdefault((title, via), []).append((cycle, queued_ms))
+        for (title, via), content in self.coalesce(batch).items():
+            delivery = _Delivery(origins[(title, via)], len(via))
+            if not via:
+                delivery.done(False)
+            for name in via:
+                task = asyncio.create_task(self._send(self.backends[name], title, content, delivery))
+                self._sending.add(task)
+                task.add_done_callback(self._sending.discard)
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            self._dispatch(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    async def flush(self) -> None:
+        """等待队列中与发送中的告警全部处理完"""
+        if self._queue is not None and self._worker is not None and not self._worker.done():
+            await self._queue.join()
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
+
+    async def stop(self) -> None:
+        await self.flush()
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+
+# endregion
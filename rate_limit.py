@@ -0,0 +1,177 @@
+import asyncio
+import json
+import time
+from typing import Callable, Dict, Optional
+
+import aiohttp
+
+from metrics import METRICS, timed
+
+
+# region 响应头解析（返回服务端视角的剩余额度，None表示未知）
+def _remaining_binance(headers, limit: int) -> Optional[float]:
+    used = headers.get('X-MBX-USED-WEIGHT-1M')
+    return limit - int(used) if used is not None else None
+
+
+def _remaining_gateio(headers, limit: int) -> Optional[float]:
+    remain = headers.get('X-Gate-RateLimit-Requests-Remain')
+    return float(remain) if remain is not None else None
+
+
+def _remaining_bybit(headers, limit: int) -> Optional[float]:
+    remain = headers.get('X-Bapi-Limit-Status')
+    return float(remain) if remain is not None else None
+
+
+def kline_weight_binance(limit: int) -> int:
+    """Binance合约 /klines 的请求权重"""
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+# endregion
+
+# region 令牌桶调度器
+class RateLimiter:
+    """单个交易所共享的令牌桶：按响应头校准余量，按429/418退避，AIMD自适应并发"""
+
+    def __init__(self, name: str, limit: int, period: float,
+                 remaining_parser: Optional[Callable] = None, safety: float = 0.9,
+                 initial_concurrency: int = 50, max_concurrency: int = 300):
+        self.name = name
+        self.limit = limit  # 每个周期的额度（权重或请求数）
+        self.safety = safety
+        self.share = 1.0  # 本进程可用的额度比例（多进程分片扫描时各进程平分）
+        self.capacity = limit * safety  # 留出余量给其他进程/手动请求
+        self.period = period
+        self.refill_rate = self.capacity / period
+        self.remaining_parser = remaining_parser
+        self.tokens = self.capacity
+        self.concurrency = initial_concurrency
+        self.max_concurrency = max_concurrency
+        self.full_max_concurrency = max_concurrency  # share为1时的并发上限
+        self.in_flight = 0
+        self.backoff_until = 0.0
+        self.throttled = 0  # 收到429/418的次数
+        self._updated = time.monotonic()
+        self._successes = 0
+        self._cond: Optional[asyncio.Condition] = None
+
+    def set_share(self, share: float) -> None:
+        """多个进程共用同一IP额度时，本进程只使用其中share比例（令牌桶容量、补充速度与并发同比缩小）"""
+        self.share = share
+        self.capacity = self.limit * self.safety * share
+        self.refill_rate = self.capacity / self.period
+        self.tokens = min(self.tokens, self.capacity)
+        self.max_concurrency = max(1, int(self.full_max_concurrency * share))
+        self.concurrency = max(1, min(self.concurrency, self.max_concurrency))
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.refill_rate)
+        self._updated = now
+
+    def _delay(self, weight: float) -> float:
+        """距离可以发出请求还需等待的秒数"""
+        now = time.monotonic()
+        if now < self.backoff_until:
+            return self.backoff_until - now
+        self._refill()
+        if self.tokens >= weight:
+            return 0.0
+        return (weight - self.tokens) / self.refill_rate
+
+    async def acquire(self, weight: float = 1) -> None:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        async with self._cond:
+            while True:
+                if self.in_flight >= self.concurrency:
+                    await self._cond.wait()
+                    continue
+                delay = self._delay(weight)
+                if delay <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._cond.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+            self.tokens -= weight
+            self.in_flight += 1
+
+    async def release(self) -> None:
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def observe(self, resp: aiohttp.ClientResponse) -> None:
+        """根据响应状态与限频头调整余量、并发与退避"""
+        if resp.status in (418, 429):
+            self.throttled += 1
+            retry_after = float(resp.headers.get('Retry-After', 0) or 0)
+            self.backoff_until = time.monotonic() + max(retry_after, 1.0 if resp.status == 429 else 60.0)
+            self.tokens = 0
+            self.concurrency = max(1, self.concurrency // 2)
+            self._successes = 0
+            print(f"[{self.name}] 触发限频({resp.status})，退避{self.backoff_until - time.monotonic():.0f}秒，"
+                  f"并发降为{self.concurrency}")
+            return
+
+        if self.remaining_parser is not None:
+            remaining = self.remaining_parser(resp.headers, self.limit)
+            if remaining is not None:
+                self._refill()
+                # 以服务端余量为准（扣除安全余量，多进程时按比例分摊），只向下校准
+                self.tokens = min(self.tokens, (remaining - self.limit * (1 - self.safety)) * self.share)
+
+        self._successes += 1
+        if self._successes >= self.concurrency and self.concurrency < self.max_concurrency:
+            self.concurrency += 1  # 加性增
+            self._successes = 0
+
+    async def get_json(self, session: aiohttp.ClientSession, url: str, params: Optional[dict] = None,
+                       weight: float = 1, retries: int = 3, **kwargs):
+        """受限频调度的GET请求，被限频时退避后重试；同时记录请求延迟与解析耗时"""
+        symbol = (params or {}).get('symbol') or (params or {}).get('contract')
+        for attempt in range(retries + 1):
+            await self.acquire(weight)
+            METRICS.observe_request_start()
+            start = time.perf_counter()
+            try:
+                async with session.get(url, params=params, **kwargs) as resp:
+                    self.observe(resp)
+                    if resp.status in (418, 429) and attempt < retries:
+                        continue
+                    resp.raise_for_status()
+                    body = await resp.read()
+                METRICS.observe_fetch(self.name, symbol, (time.perf_counter() - start) * 1000)
+                with timed(METRICS.add_parse):
+                    return json.loads(body)
+            except asyncio.TimeoutError:
+                METRICS.observe_error(self.name, timeout=True)
+                raise
+            except aiohttp.ClientError:
+                METRICS.observe_error(self.name)
+                raise
+            finally:
+                await self.release()
+
+
+# endregion
+
+# 各交易所共享实例（官方公开行情限额）
+RATE_LIMITERS: Dict[str, RateLimiter] = {
+    'binance': RateLimiter('Binance', limit=2400, period=60, remaining_parser=_remaining_binance),
+    'bybit': RateLimiter('Bybit', limit=600, period=5, remaining_parser=_remaining_bybit),
+    'gateio': RateLimiter('Gate.io', limit=200, period=10, remaining_parser=_remaining_gateio),
+}
+
+
+def get_limiter(exchange: str) -> RateLimiter:
+    return RATE_LIMITERS[exchange]
@@ -0,0 +1,123 @@
+import math
+from collections import deque
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+BOLL_WINDOW = 20
+BOLL_STD_DEV = 2.0
+RESYNC_EVERY = 1000  # 每更新N次用窗口原值重算一次，消除浮点累计误差
+
+
+# region 滑动窗口统计
+class RollingStats:
+    """定长滑动窗口的均值/方差（Welford增量更新，每根K线O(1)）"""
+
+    __slots__ = ('window', 'values', 'mean', 'm2', '_updates')
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.mean = 0.0
+        self.m2 = 0.0  # 离差平方和
+        self._updates = 0
+
+    def push(self, x: float) -> None:
+        if len(self.values) < self.window:
+            # 窗口未满：标准Welford累加
+            self.values.append(x)
+            delta = x - self.mean
+            self.mean += delta / len(self.values)
+            self.m2 += delta * (x - self.mean)
+        else:
+            # 窗口已满：同时移出最旧值、加入新值
+            old = self.values[0]
+            self.values.append(x)
+            old_mean = self.mean
+            self.mean += (x - old) / self.window
+            self.m2 += (x - old) * (x - self.mean + old - old_mean)
+        self._updates += 1
+        if self._updates >= RESYNC_EVERY:
+            self._resync()
+
+    def _resync(self) -> None:
+        n = len(self.values)
+        self.mean = sum(self.values) / n
+        self.m2 = sum((v - self.mean) ** 2 for v in self.values)
+        self._updates = 0
+
+    @property
+    def ready(self) -> bool:
+        return len(self.values) == self.window
+
+    @property
+    def std(self) -> float:
+        """总体标准差（与np.std默认ddof=0一致）"""
+        if not self.values:
+            return 0.0
+        return math.sqrt(max(self.m2, 0.0) / len(self.values))
+
+
+# endregion
+
+# region 布林带引擎
+class BollingerEngine:
+    """按(交易对, 周期)维护多个窗口的滚动统计，支持多组窗口/标准差倍数同时计算"""
+
+    def __init__(self, windows: Sequence[int] = (BOLL_WINDOW,)):
+        self.windows = tuple(windows)
+        self._stats: Dict[Tuple[str, str], Dict[int, RollingStats]] = {}
+        self._last_close: Dict[Tuple[str, str], int] = {}
+
+    def ready(self, symbol: str, interval: str, window: int = BOLL_WINDOW) -> bool:
+        stats = self._stats.get((symbol, interval))
+        return bool(stats) and stats[window].ready
+
+    def last_close_time(self, symbol: str, interval: str) -> int:
+        return self._last_close.get((symbol, interval), -1)
+
+    def update(self, symbol: str, interval: str, close_time: int, close: float) -> bool:
+        """写入一根已收盘K线；收盘时间不新于上一根时忽略（可重复调用）"""
+        key = (symbol, interval)
+        if close_time <= self._last_close.get(key, -1):
+            return False
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = {w: RollingStats(w) for w in self.windows}
+        for s in stats.values():
+            s.push(close)
+        self._last_close[key] = close_time
+        return True
+
+    def update_many(self, symbol: str, interval: str, bars: Iterable[Tuple[int, float]]) -> None:
+        """批量写入 [(close_time, close), ...]，用于首次初始化或补齐"""
+        for close_time, close in bars:
+            self.update(symbol, interval, close_time, close)
+
+    def bands(self, symbol: str, interval: str, window: int = BOLL_WINDOW,
+              std_dev: float = BOLL_STD_DEV) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+        """返回 (中轨, 上轨, 下轨)，数据不足窗口长度时返回三个None"""
+        stats = self._stats.get((symbol, interval))
+        if not stats or not stats[window].ready:
+            return None, None, None
+        s = stats[window]
+        return s.mean, s.mean + std_dev * s.std, s.mean - std_dev * s.std
+
+    def all_bands(self, symbol: str, interval: str,
+                  std_devs: Sequence[float] = (BOLL_STD_DEV,)) -> Dict[Tuple[int, float], tuple]:
+        """所有窗口 × 标准差倍数组合的布林带"""
+        return {(w, k): self.bands(symbol, interval, w, k) for w in self.windows for k in std_devs}
+
+    def position(self, symbol: str, interval: str, price: float, window: int = BOLL_WINDOW,
+                 std_dev: float = BOLL_STD_DEV) -> Optional[float]:
+        """价格在布林带中的相对位置：>1 突破上轨，<0 跌破下轨"""
+        _, upper, lower = self.bands(symbol, interval, window, std_dev)
+        if upper is None or upper == lower:
+            return None
+        return (price - lower) / (upper - lower)
+
+    def discard(self, symbol: str, interval: Optional[str] = None) -> None:
+        """丢弃交易对（指定interval时只丢弃该周期）的滚动统计"""
+        for key in [k for k in self._stats if k[0] == symbol and interval in (None, k[1])]:
+            del self._stats[key]
+            self._last_close.pop(key, None)
+
+# endregion
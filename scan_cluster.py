@@ -0,0 +1,419 @@
+import asyncio
+import bisect
+import hashlib
+import importlib.util
+import json
+import multiprocessing
+import os
+import threading
+import uuid
+from typing import Awaitable, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+COORDINATOR_HOST = '127.0.0.1'
+COORDINATOR_PORT = 8765
+STREAM_LIMIT = 4 * 1024 * 1024  # 单条消息上限（分片/结果列表）
+SHARD_GRACE = 10.0  # 分片结果等待时间 = 单轮扫描截止时间 + 该余量（进程间传递与解析）
+
+# 扫描函数: {交易所: [交易对]} -> 命中结果列表（每条为dict，需可JSON序列化）
+ScanFunc = Callable[[Dict[str, List[str]]], Awaitable[List[dict]]]
+
+
+# region 一致性哈希
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+
+class ConsistentHashRing:
+    """一致性哈希环：节点增减时只迁移约 1/N 的交易对"""
+
+    def __init__(self, nodes: Optional[List[str]] = None, vnodes: int = 100):
+        self.vnodes = vnodes
+        self._keys: List[int] = []
+        self._owners: List[str] = []
+        self.nodes = set()
+        for node in nodes or []:
+            self.add(node)
+
+    def add(self, node: str) -> None:
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        for i in range(self.vnodes):
+            h = _hash(f"{node}#{i}")
+            idx = bisect.bisect(self._keys, h)
+            self._keys.insert(idx, h)
+            self._owners.insert(idx, node)
+
+    def remove(self, node: str) -> None:
+        if node not in self.nodes:
+            return
+        self.nodes.discard(node)
+        kept = [(k, o) for k, o in zip(self._keys, self._owners) if o != node]
+        self._keys = [k for k, _ in kept]
+        self._owners = [o for _, o in kept]
+
+    def node_for(self, key: str) -> Optional[str]:
+        if not self._keys:
+            return None
+        idx = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._owners[idx]
+
+    def partition(self, universe: Dict[str, List[str]]) -> Dict[str, Dict[str, List[str]]]:
+        """按节点切分 {交易所: [交易对]}，键为 "交易所:交易对" """
+        slices: Dict[str, Dict[str, List[str]]] = {node: {} for node in self.nodes}
+        for exchange, symbols in universe.items():
+            for symbol in symbols:
+                node = self.node_for(f"{exchange}:{symbol}")
+                slices[node].setdefault(exchange, []).append(symbol)
+        return slices
+
+
+# endregion
+
+# region 协调节点
+async def _send(writer: asyncio.StreamWriter, msg: dict) -> None:
+    writer.write(json.dumps(msg, ensure_ascii=False, default=str).encode() + b'\n')
+    await writer.drain()
+
+
+class ScanCoordinator:
+    """本机TCP协调节点：维护worker哈希环，每轮下发分片并合并结果"""
+
+    def __init__(self, host: str = COORDINATOR_HOST, port: int = COORDINATOR_PORT,
+                 local_scan: Optional[ScanFunc] = None):
+        self.host = host
+        self.port = port
+        self.local_scan = local_scan  # 没有worker在线时本机兜底扫描
+        self.ring = ConsistentHashRing()
+        self._writers: Dict[str, asyncio.StreamWriter] = {}
+        self._waiters: Dict[tuple, asyncio.Future] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._cycle = 0
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle_worker, self.host, self.port,
+                                                  limit=STREAM_LIMIT)
+        self.port = self._server.sockets[0].getsockname()[1]
+        print(f"[集群] 协调节点监听 {self.host}:{self.port}")
+
+    async def stop(self) -> None:
+        for writer in list(self._writers.values()):
+            writer.close()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        node = None
+        try:
+            while line := await reader.readline():
+                msg = json.loads(line)
+                if msg['type'] == 'join':
+                    node = msg['node']
+                    self._writers[node] = writer
+                    self.ring.add(node)
+                    print(f"[集群] 节点加入 {node}，当前{len(self.ring.nodes)}个节点")
+                elif msg['type'] == 'result':
+                    waiter = self._waiters.get((node, msg['cycle']))
+                    if waiter is not None and not waiter.done():
+                        waiter.set_result(msg['results'])
+        except (ConnectionError, json.JSONDecodeError) as e:
+            print(f"[集群] 节点{node}连接异常: {str(e)}")
+        finally:
+            if node is not None:
+                self._writers.pop(node, None)
+                self.ring.remove(node)
+                print(f"[集群] 节点离开 {node}，当前{len(self.ring.nodes)}个节点")
+                # 让等待该节点的本轮任务立即失败，触发重新分配
+                for (n, _), waiter in list(self._waiters.items()):
+                    if n == node and not waiter.done():
+                        waiter.set_exception(ConnectionError(f"节点{node}已离开"))
+            writer.close()
+
+    async def _dispatch(self, node: str, cycle: int, assignment: Dict[str, List[str]],
+                        timeout: float) -> List[dict]:
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[(node, cycle)] = waiter
+        try:
+            await _send(self._writers[node], {'type': 'scan', 'cycle': cycle, 'symbols': assignment})
+            return await asyncio.wait_for(waiter, timeout)
+        finally:
+            self._waiters.pop((node, cycle), None)
+
+    async def scan_cycle(self, universe: Dict[str, List[str]], timeout: float = 30.0,
+                         retry: bool = True, exclude: FrozenSet[str] = frozenset()) -> List[dict]:
+        """执行一轮分布式扫描，返回合并后的全部命中结果；exclude中的节点本轮不再分配"""
+        self._cycle += 1
+        cycle = self._cycle
+        ring = self.ring
+        if exclude:
+            ring = ConsistentHashRing([n for n in self.ring.nodes if n not in exclude], self.ring.vnodes)
+        if not ring.nodes:
+            return await self.local_scan(universe) if self.local_scan else []
+
+        slices = ring.partition(universe)
+        nodes = [n for n, s in slices.items() if s]
+        outcomes = await asyncio.gather(
+            *(self._dispatch(n, cycle, slices[n], timeout) for n in nodes), return_exceptions=True)
+
+        results: List[dict] = []
+        failed: Dict[str, List[str]] = {}
+        for node, outcome in zip(nodes, outcomes):
+            if isinstance(outcome, BaseException):
+                print(f"[集群] 节点{node}本轮失败: {outcome!r}")
+                for exchange, symbols in slices[node].items():
+                    failed.setdefault(exchange, []).extend(symbols)
+            else:
+                results.extend(outcome)
+
+        # 失败节点（断开或超时未回）的分片在去掉这些节点的哈希环上重新分配一次，没有其他节点时本地扫描
+        if failed and retry:
+            failed_nodes = frozenset(n for n, o in zip(nodes, outcomes) if isinstance(o, BaseException))
+            results.extend(await self.scan_cycle(failed, timeout, retry=False, exclude=exclude | failed_nodes))
+        return results
+
+
+# endregion
+
+# region 扫描节点
+class ScanWorker:
+    """扫描节点：连接协调节点，按分配的交易对切片执行扫描并回传结果"""
+
+    def __init__(self, scan: ScanFunc, host: str = COORDINATOR_HOST, port: int = COORDINATOR_PORT,
+                 node: Optional[str] = None):
+        self.scan = scan
+        self.host = host
+        self.port = port
+        self.node = node or f"worker-{uuid.uuid4().hex[:8]}"
+
+    async def run(self, retry_delay: float = 5.0) -> None:
+        """常驻运行，协调节点重启后自动重连"""
+        while True:
+            try:
+                await self._serve()
+            except (ConnectionError, OSError) as e:
+                print(f"[集群] {self.node} 连接协调节点失败: {str(e)}")
+            await asyncio.sleep(retry_delay)
+
+    async def _serve(self) -> None:
+        reader, writer = await asyncio.open_connection(self.host, self.port, limit=STREAM_LIMIT)
+        await _send(writer, {'type': 'join', 'node': self.node})
+        print(f"[集群] {self.node} 已加入 {self.host}:{self.port}")
+        try:
+            while line := await reader.readline():
+                msg = json.loads(line)
+                if msg['type'] != 'scan':
+                    continue
+                try:
+                    results = await self.scan(msg['symbols'])
+                except Exception as e:
+                    print(f"[集群] {self.node} 扫描错误: {str(e)}")
+                    results = []
+                await _send(writer, {'type': 'result', 'cycle': msg['cycle'], 'results': results})
+        finally:
+            writer.close()
+
+# endregion
+
+# region 本机多进程分片
+def load_script(path: str):
+    """按文件路径导入扫描脚本（文件名含连字符/中文，不能直接import），不执行其 __main__ 部分"""
+    name = f"shard_{os.path.splitext(os.path.basename(path))[0]}"
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def _shard_serve(scan: ScanFunc, conn) -> None:
+    """分片进程的事件循环：逐个接收 (轮次, 分片) 执行扫描，回传 (轮次, 命中结果, 本轮指标计数)，
+    收到None或父进程退出时结束"""
+    from http_pool import POOL
+    from metrics import METRICS
+
+    try:
+        while True:
+            try:
+                msg = await asyncio.to_thread(conn.recv)
+            except EOFError:
+                break
+            if msg is None:
+                break
+            cycle, assignment = msg
+            METRICS.begin_cycle('shard')
+            try:
+                results = await scan(assignment)
+            except Exception as e:
+                print(f"[分片{os.getpid()}] 扫描错误: {str(e)}")
+                results = []
+            conn.send((cycle, results, METRICS.take_cycle()))
+    finally:
+        await POOL.close()
+
+
+def _shard_main(script: str, func: str, conn, share: float, setup: Optional[Callable[[], None]]) -> None:
+    """分片进程入口：独立的事件循环、连接池与限频器（按进程数平分额度）"""
+    from rate_limit import RATE_LIMITERS
+
+    for limiter in RATE_LIMITERS.values():
+        limiter.set_share(share)
+    if setup is not None:
+        setup()
+    scan = getattr(load_script(script), func)
+    try:
+        asyncio.run(_shard_serve(scan, conn))
+    except KeyboardInterrupt:
+        pass
+
+
+class ShardPool:
+    """本机多进程分片扫描：交易对按一致性哈希固定分给各进程（滚动布林带等按交易对的状态留在同一进程），
+    每个进程各自的事件循环负责请求与JSON解析，父进程经管道收回命中结果，进入原有的告警流程"""
+
+    def __init__(self, script: str, func: str, processes: Optional[int] = None,
+                 local_scan: Optional[ScanFunc] = None, setup: Optional[Callable[[], None]] = None,
+                 timeout: Optional[float] = None):
+        if timeout is None:
+            from exchanges import SCAN_DEADLINE
+            timeout = SCAN_DEADLINE + SHARD_GRACE  # 分片内按SCAN_DEADLINE截止，健康但较慢的分片不应被判为失败
+        self.script = os.path.abspath(script)
+        self.func = func  # 脚本中的扫描函数名: {交易所: [交易对]} -> 命中结果列表
+        self.processes = processes or os.cpu_count() or 1
+        self.local_scan = local_scan  # 分片进程异常退出时，本轮该分片在父进程中补扫
+        self.setup = setup  # 分片进程启动时执行（须可pickle，如基准测试改写请求地址）
+        self.timeout = timeout
+        self.ring = ConsistentHashRing()
+        self._shards: Dict[str, Tuple[multiprocessing.Process, object]] = {}
+        self._waiters: Dict[Tuple[str, int], asyncio.Future] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._cycle = 0
+
+    def start(self) -> None:
+        """启动分片进程（spawn方式，Windows与Linux行为一致）"""
+        self._loop = asyncio.get_running_loop()
+        for i in range(self.processes):
+            name = f"shard-{i}"
+            self._spawn(name)
+            self.ring.add(name)
+        self._rebalance()
+        print(f"[分片] 已启动{self.processes}个扫描进程")
+
+    def _spawn(self, name: str) -> None:
+        ctx = multiprocessing.get_context('spawn')
+        parent, child = ctx.Pipe()
+        process = ctx.Process(target=_shard_main, name=name, daemon=True,
+                              args=(self.script, self.func, child, 1 / self.processes, self.setup))
+        process.start()
+        child.close()
+        self._shards[name] = (process, parent)
+        threading.Thread(target=self._reader, args=(name, parent), name=f"{name}-reader", daemon=True).start()
+
+    async def _restart(self, name: str) -> None:
+        """超时的分片仍在扫描本轮交易对：先终止再补扫，避免同一交易对被请求两次、重复占用限频额度"""
+        process, conn = self._shards[name]
+        if name in self.ring.nodes:
+            self._spawn(name)  # 先登记新进程，旧管道断开时_lost据此忽略
+        process.terminate()
+        await asyncio.to_thread(process.join, 5.0)
+        conn.close()
+        print(f"[分片] {name} 超时，已重启")
+    def _rebalance(self) -> None:
+        """父进程补扫时使用的限频额度：已退出分片的份额，至少一份（与仍在运行的分片合计不超过整体额度）"""
+        from rate_limit import RATE_LIMITERS
+
+        share = max(self.processes - len(self.ring.nodes), 1) / self.processes
+        for limiter in RATE_LIMITERS.values():
+            limiter.set_share(share)
+
+    def _reader(self, name: str, conn) -> None:
+        """每个分片一个读线程：收到结果后交回事件循环；管道断开视为进程退出"""
+        while True:
+            try:
+                cycle, results, counters = conn.recv()
+            except (EOFError, OSError):
+                break
+            self._call_soon(self._resolve, name, cycle, (results, counters))
+        self._call_soon(self._lost, name, conn)
+
+    def _call_soon(self, callback, *args) -> None:
+        try:
+            self._loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:  # 事件循环已关闭（程序退出中）
+            pass
+
+    def _resolve(self, name: str, cycle: int, outcome: Tuple[List[dict], Optional[dict]]) -> None:
+        waiter = self._waiters.get((name, cycle))
+        if waiter is not None and not waiter.done():
+            waiter.set_result(outcome)
+
+    def _lost(self, name: str, conn) -> None:
+        if name not in self.ring.nodes or self._shards[name][1] is not conn:  # 已重启的分片，旧管道断开不算退出
+            return
+        self.ring.remove(name)
+        self._rebalance()
+        print(f"[分片] {name} 已退出，剩余{len(self.ring.nodes)}个扫描进程")
+        for (n, _), waiter in list(self._waiters.items()):
+            if n == name and not waiter.done():
+                waiter.set_exception(ConnectionError(f"{name}已退出"))
+
+    async def _dispatch(self, name: str, cycle: int, assignment: Dict[str, List[str]],
+                        timeout: float) -> Tuple[List[dict], Optional[dict]]:
+        waiter = self._loop.create_future()
+        self._waiters[(name, cycle)] = waiter
+        try:
+            await asyncio.to_thread(self._shards[name][1].send, (cycle, assignment))  # 任务较大时会填满管道，不阻塞事件循环
+            return await asyncio.wait_for(waiter, timeout)
+        finally:
+            self._waiters.pop((name, cycle), None)
+
+    async def scan_cycle(self, universe: Dict[str, List[str]], timeout: Optional[float] = None) -> List[dict]:
+        """执行一轮分片扫描，返回合并后的全部命中结果（每条带exchange字段）；各分片的本轮指标并入父进程"""
+        from metrics import METRICS
+
+        timeout = self.timeout if timeout is None else timeout
+        self._cycle += 1
+        cycle = self._cycle
+        if not self.ring.nodes:
+            return await self.local_scan(universe) if self.local_scan else []
+        slices = self.ring.partition(universe)
+        names = [n for n, s in slices.items() if s]
+        outcomes = await asyncio.gather(
+            *(self._dispatch(n, cycle, slices[n], timeout) for n in names), return_exceptions=True)
+
+        results: List[dict] = []
+        failed: Dict[str, List[str]] = {}
+        for name, outcome in zip(names, outcomes):
+            if isinstance(outcome, BaseException):
+                print(f"[分片] {name}本轮失败: {outcome!r}")
+                if isinstance(outcome, asyncio.TimeoutError):
+                    await self._restart(name)
+                for exchange, symbols in slices[name].items():
+                    failed.setdefault(exchange, []).extend(symbols)
+            else:
+                shard_results, counters = outcome
+                results.extend(shard_results)
+                METRICS.merge_cycle(counters)
+        if failed and self.local_scan is not None:
+            results.extend(await self.local_scan(failed))
+        return results
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        self.ring = ConsistentHashRing()  # 正常退出，不再当作异常退出处理
+        for process, conn in self._shards.values():
+            try:
+                conn.send(None)
+            except (OSError, BrokenPipeError):
+                pass
+        for process, conn in self._shards.values():
+            await asyncio.to_thread(process.join, timeout)
+            if process.is_alive():
+                process.terminate()
+            conn.close()
+        self._shards.clear()
+        from rate_limit import RATE_LIMITERS
+
+        for limiter in RATE_LIMITERS.values():
+            limiter.set_share(1.0)  # 父进程恢复独占额度
+
+
+# endregion
@@ -1,12 +1,23 @@
 import asyncio
 from datetime import datetime
+from functools import partial
+from typing import Optional
 
 import aiohttp
-import requests
-from win10toast import ToastNotifier
 
-symbols_list_binance = []
-symbols_list_gateio = []
+from bar import bar_from_binance
+from bar_clock import BarCloseScheduler, collect_closed, get_clock
+from binance_ws import KlineStreamManager
+from exchanges import BinanceAdapter
+from http_pool import POOL, get_session
+from kline_store import KlineStore
+from metrics import METRICS
+from notify import ClipboardBackend, JournalBackend, Notifier, PushPlusBackend, ToastBackend
+from symbol_universe import (BINANCE_EXCHANGE_INFO_URL, BINANCE_VOLATILE, SymbolUniverse, gateio_universe,
+                             parse_symbols_binance)
+
+KLINE_SOURCE = 'rest'  # K线来源：'rest' 每轮REST轮询，'ws' 订阅组合流收盘事件
+FAST_START = True  # 快速启动：先用本地交易对快照，后台刷新；推送相关模块在后台线程预先导入
 
 
 # region 通用工具函数
@@ -15,151 +26,145 @@ def parse_timestamp(ts: int) -> datetime:
     return datetime.utcfromtimestamp(ts / 1000)
 
 
-async def push_wechat(title: str, pairs: str) -> None:
-    """推送微信通知（改用aiohttp异步请求）"""
-    url = "https://www.pushplus.plus/send"
-    params = {
-        "token": "2fb9c4804bd8400684d60e4905365978",
-        "title": title,
-        "content": pairs
-    }
-    try:
-        async with aiohttp.ClientSession() as session:
-            await session.get(url, params=params)
-    except Exception as e:
-        print(f"微信推送失败: {e}")
+# 告警入队后由后台任务合并发送（微信 + 桌面通知 + 复制首个交易对），扫描不等待推送
+notifier = Notifier([PushPlusBackend("2fb9c4804bd8400684d60e4905365978"), ToastBackend(), ClipboardBackend(),
+                     JournalBackend()])
 
 
-async def push_windows(title: str, pairs: str) -> None:
-    """Windows桌面通知（保持原逻辑）"""
-    try:
-        ToastNotifier().show_toast(title, pairs, duration=15, threaded=True)
-    except Exception as e:
-        print(f"Windows通知失败: {e}")
+async def push_new_symbols(universe: SymbolUniverse, added: frozenset, removed: frozenset) -> None:
+    """后台刷新发现新增合约时推送"""
+    if not added:
+        return
+    if universe.name == 'Gate.io':
+        notifier.notify("Gate.io新增", ','.join(added), via=('wechat',))
+    notifier.notify(f"{universe.name}新增", ','.join(added), via=('toast',))
 
 
 # endregion
 
 # region Binance API
-def get_all_futures_symbols_binance() -> list:
-    """获取Binance合约交易对（同步请求，改用列表推导式简化）"""
-    try:
-        data = requests.get("https://fapi.binance.com/fapi/v1/exchangeInfo").json()
-        symbols = [s['symbol'] for s in data['symbols'] if 'USDT' in s['symbol'] and s['symbol'] != "BTCSTUSDT"]
-        return symbols
-    except Exception as e:
-        print(f"获取Binance合约交易对时发生错误: {str(e)}")
-        return []
+def parse_symbols_binance_usdt(data: dict) -> list:
+    """解析Binance合约交易对（排除BTCSTUSDT）"""
+    return [s for s in parse_symbols_binance(data) if s != "BTCSTUSDT"]
+
+
+kline_store = KlineStore()  # 请求到的已收盘K线顺带写入本地列式库，供分析/回测离线读取
+binance_adapter = BinanceAdapter(threshold=7, store=kline_store)
 
+# 交易对列表由后台任务刷新，扫描时直接读取快照
+binance_universe = SymbolUniverse('Binance', BINANCE_EXCHANGE_INFO_URL, parse_symbols_binance_usdt, 'binance',
+                                  volatile=BINANCE_VOLATILE, on_change=push_new_symbols)
 
-async def get_closed_kline_binance(session: aiohttp.ClientSession, symbol: str) -> dict:
-    """获取K线数据（完全移除pandas依赖）"""
-    params = {'symbol': symbol, 'interval': '5m', 'limit': 2}
+
+async def fetch_closed_kline_binance(session: aiohttp.ClientSession, symbol: str,
+                                     close_ms: Optional[int] = None) -> tuple:
+    """获取在close_ms（服务器时间）收盘的K线，返回 (symbol, Bar)，Bar为None表示尚未定稿或失败"""
+    if close_ms is None:
+        close_ms = get_clock('binance').last_close_ms()
     try:
-        async with session.get("https://fapi.binance.com/fapi/v1/klines", params=params) as resp:
-            data = await resp.json()
-            if len(data) < 2:
-                return None
-
-            # 确定使用哪根K线（改用原生时间比较）
-            current_time = datetime.utcnow()
-            latest_close_time = parse_timestamp(data[-1][6])
-            res_kline = data[-1] if current_time >= latest_close_time else data[-2]
-
-            # 解析K线数据
-            open_p, high_p, low_p, close_p = map(float, res_kline[1:5])
-            is_bearish = close_p < open_p
-            change = (
-                (high_p - close_p) / high_p * 100 if is_bearish
-                else (close_p - low_p) / low_p * 100
-            )
-
-            return {
-                'symbol': symbol,
-                'open_time': parse_timestamp(res_kline[0]),
-                'close_time': parse_timestamp(res_kline[6]),
-                'price_change': abs(change),
-                'is_bearish': is_bearish
-            }
+        # 交易所已开出下一根K线时目标K线才算定稿，否则留给调度器重新请求，不再退回上一根
+        return await binance_adapter.fetch_closed(session, symbol, close_ms)
     except Exception as e:
         print(f"请求{symbol}时发生错误: {str(e)}")
+        return symbol, None
 
 
 # endregion
 
 # region 核心扫描逻辑
-async def scan_binance() -> None:
-    """Binance扫描逻辑（合并函数简化流程）"""
-    async with aiohttp.ClientSession() as session:
-        # 检测新增合约
-        global symbols_list_binance
-        current_symbols = set(get_all_futures_symbols_binance())
-        if new_symbols := current_symbols - set(symbols_list_binance):
-            await push_windows("Binance新增", ','.join(new_symbols))
-            symbols_list_binance = list(current_symbols)
-
-        # 扫描价格波动
-        results = []
-        tasks = [
-            get_closed_kline_binance(session, sym)
-            for sym in symbols_list_binance
-        ]
-        for future in asyncio.as_completed(tasks):
-            if (kline := await future) and kline['price_change'] >= 7:
-                results.append(
-                    f"{kline['symbol']}: {'跌' if kline['is_bearish'] else '涨'}{kline['price_change']:.1f}%"
-                )
-
-        if results:
-            import pyperclip
-            pyperclip.copy(results[0].split(':')[0])
-            await push_wechat("Binance波动", ','.join(results))
-            await push_windows("Binance波动", ','.join(results))
-        else:
-            print("Binance无波动")
+async def report_binance(pairs: list) -> None:
+    """对 [(symbol, Bar), ...] 做一次向量化筛选，波动超过阈值的推送"""
+    results = [
+        f"{kline['symbol']}: {'跌' if kline['is_bearish'] else '涨'}{kline['price_change']:.1f}%"
+        for kline in binance_adapter.screen(pairs)
+    ]
+
+    if results:
+        notifier.notify("Binance波动", ','.join(results))
+    else:
+        print("Binance无波动")
+
+
+async def scan_binance(close_ms: Optional[int] = None) -> None:
+    """Binance扫描逻辑：请求在close_ms收盘的K线，未定稿的交易对单独重新请求"""
+    session = get_session('binance')
+    if close_ms is None:
+        close_ms = get_clock('binance').last_close_ms()
+    METRICS.begin_cycle('binance', bar_close_ms=close_ms)
+    # 扫描价格波动（交易对快照由后台刷新，收盘时无阻塞I/O）
+    pairs = await collect_closed(partial(fetch_closed_kline_binance, session), binance_universe.symbols, close_ms)
+    binance_adapter.flush_store()
+    await report_binance(pairs)
+    METRICS.end_cycle()
+
+
+async def on_bar_close_binance(close_time: int, bars: dict) -> None:
+    """WebSocket收盘事件回调：直接用内存中的收盘K线筛选，无REST请求"""
+    print(f"\n==== 收盘事件 {parse_timestamp(close_time)} | {len(bars)}个交易对 ====")
+    METRICS.begin_cycle('binance-ws', bar_close_ms=close_time + 1)
+    pairs = [(symbol, bar_from_binance(kline)) for symbol, kline in bars.items()]
+    for symbol, bar in pairs:
+        binance_adapter.record(symbol, [bar], close_time + 1)
+    binance_adapter.flush_store()
+    await report_binance(pairs)
+    METRICS.end_cycle()
 
 
 # endregion
 
 # region Gate.io API
-def get_all_futures_symbols_gateio() -> list:
-    """获取Gate.io合约交易对（保持原逻辑）"""
-    try:
-        data = requests.get("https://api.gateio.ws/api/v4/futures/usdt/contracts").json()
-        return [s["name"] for s in data if not s["in_delisting"]]
-    except Exception as e:
-        print(f"获取Gate.io合约交易对时发生错误: {str(e)}")
-        return []
-
-
-async def scan_gateio() -> None:
-    """Gate.io扫描逻辑"""
-    global symbols_list_gateio
-    current_symbols = set(get_all_futures_symbols_gateio())
-    if new_symbols := current_symbols - set(symbols_list_gateio):
-        await push_wechat("Gate.io新增", ','.join(new_symbols))
-        await push_windows("Gate.io新增", ','.join(new_symbols))
-        symbols_list_gateio = list(current_symbols)
+gateio_symbols = gateio_universe(on_change=push_new_symbols)
 
 
 # endregion
 
 # region 主循环
 async def main_loop() -> None:
-    """主循环（改用asyncio.sleep简化时间计算）"""
+    """主循环：按Binance服务器时间在每根5分钟K线收盘后立即扫描"""
+    scheduler = BarCloseScheduler(get_clock('binance'), warm_up=['binance'])
+    await scheduler.clock.sync()
+    close_ms = scheduler.clock.last_close_ms()
     while True:
         print(f"\n==== 扫描开始 {datetime.now()} ====")
-        await scan_binance()
-        # await asyncio.gather(scan_binance(), scan_gateio())
-        now = datetime.now()
-        current_seconds = now.minute * 60 + now.second
-        delay = (300 - current_seconds % 300) % 300  # 处理余数为0的情况
-        await asyncio.sleep(delay)
+        await scan_binance(close_ms)
+        print(f"连接复用: {POOL.stats('binance')}")
+        close_ms = await scheduler.wait_next_close()
+
+
+async def main_loop_ws() -> None:
+    """WebSocket模式主循环：收盘事件驱动扫描，本循环只负责每5分钟同步交易对变化"""
+    manager = KlineStreamManager(list(binance_universe.symbols), interval='5m', on_bar_close=on_bar_close_binance)
+    await manager.start()
+    try:
+        while True:
+            now = datetime.now()
+            current_seconds = now.minute * 60 + now.second
+            await asyncio.sleep((300 - current_seconds % 300) % 300 or 300)
+            await manager.update_symbols(list(binance_universe.symbols))
+    finally:
+        await manager.stop()
+
+
+async def main() -> None:
+    """初始化交易对快照后启动后台刷新与扫描循环"""
+    notifier.preload()
+    if FAST_START:
+        await binance_universe.warm_start()
+    else:
+        await binance_universe.refresh_once()
+    binance_universe.start()
+    # gateio_symbols.start()  # Gate.io新增合约提醒
+    await METRICS.start_http()
+    try:
+        await (main_loop_ws() if KLINE_SOURCE == 'ws' else main_loop())
+    finally:
+        binance_universe.stop()
+        await notifier.stop()
+        await METRICS.stop_http()
+        await POOL.close()
 
 
 # endregion
 
 if __name__ == "__main__":
-    symbols_list_binance = get_all_futures_symbols_binance()
-    symbols_list_gateio = get_all_futures_symbols_gateio()
-    asyncio.run(main_loop())
+    asyncio.run(main())
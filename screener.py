@@ -0,0 +1,119 @@
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from bar import Bar
+from metrics import METRICS, timed
+
+# 幅度计算方式：
+#   'body' 实体涨跌幅 (close-open)/open，带符号（Bybit/Gate.io/布林扫描）
+#   'wick' 影线到收盘幅度：阴线 (high-close)/high，阳线 (close-low)/low，非负（Binance扫描）
+BODY = 'body'
+WICK = 'wick'
+
+
+# region 列式快照
+def price_change(open_: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray,
+                 mode: str = BODY) -> np.ndarray:
+    """任意长度价格数组的涨跌幅（百分比），实时扫描与离线回测共用"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if mode == WICK:
+            change = np.where(close < open_, (high - close) / high, (close - low) / low)
+        else:
+            change = (close - open_) / open_
+    return np.nan_to_num(change * 100)
+
+
+class KlineSnapshot:
+    """全部交易对同一根K线的列式快照，按交易对下标对齐"""
+
+    def __init__(self, symbols: Sequence[str], bars: Sequence[Bar]):
+        self.symbols = np.asarray(symbols, dtype=object)
+        data = np.array([bar.as_tuple() for bar in bars], dtype=np.float64).reshape(len(self.symbols), 7)
+        self.open_time = data[:, 0].astype(np.int64)
+        self.open = data[:, 1]
+        self.high = data[:, 2]
+        self.low = data[:, 3]
+        self.close = data[:, 4]
+        self.volume = data[:, 5]
+        self.close_time = data[:, 6].astype(np.int64)
+
+    @classmethod
+    def from_pairs(cls, pairs: Sequence[tuple]) -> 'KlineSnapshot':
+        """由 [(symbol, Bar), ...] 构建，自动跳过空结果"""
+        pairs = [p for p in pairs if p and p[1] is not None]
+        return cls([p[0] for p in pairs], [p[1] for p in pairs])
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    @property
+    def is_bearish(self) -> np.ndarray:
+        return self.close < self.open
+
+    @property
+    def is_bullish(self) -> np.ndarray:
+        return self.close > self.open
+
+    def price_change(self, mode: str = BODY) -> np.ndarray:
+        """一次性计算所有交易对的涨跌幅（百分比）"""
+        return price_change(self.open, self.high, self.low, self.close, mode)
+
+    def screen(self, threshold: float, mode: str = BODY, change: Optional[np.ndarray] = None) -> np.ndarray:
+        """阈值筛选，返回命中掩码"""
+        change = self.price_change(mode) if change is None else change
+        return np.abs(change) >= threshold
+
+    def records(self, mask: np.ndarray, change: np.ndarray) -> List[dict]:
+        """只为命中的交易对构建结果字典（时间为毫秒整数），按幅度绝对值降序"""
+        idx = np.flatnonzero(mask)
+        idx = idx[np.argsort(-np.abs(change[idx]), kind='stable')]
+        return [{
+            'symbol': self.symbols[i],
+            'open_time': int(self.open_time[i]),
+            'close_time': int(self.close_time[i]),
+            'open': float(self.open[i]),
+            'high': float(self.high[i]),
+            'low': float(self.low[i]),
+            'close': float(self.close[i]),
+            'is_bearish': bool(self.close[i] < self.open[i]),
+            'price_change': float(change[i]),
+        } for i in idx]
+
+
+def screen_pairs(pairs: Sequence[tuple], threshold: float, mode: str = BODY) -> List[dict]:
+    """[(symbol, Bar), ...] -> 命中结果列表（单次向量化计算）"""
+    with timed(METRICS.add_eval):
+        snapshot = KlineSnapshot.from_pairs(pairs)
+        if not len(snapshot):
+            return []
+        change = snapshot.price_change(mode)
+        return snapshot.records(snapshot.screen(threshold, mode, change), change)
+
+
+# endregion
+
+# region 布林/极值条件
+def bollinger_position(close: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    """收盘价在布林带中的相对位置：>1 突破上轨，<0 跌破下轨"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (close - lower) / (upper - lower)
+
+
+def boll_screen_mask(change: np.ndarray, threshold: float,
+                     today_low: Optional[np.ndarray] = None, low_7d: Optional[np.ndarray] = None,
+                     today_high: Optional[np.ndarray] = None, high_7d: Optional[np.ndarray] = None,
+                     band_pos: Optional[np.ndarray] = None) -> np.ndarray:
+    """布林扫描条件的向量化版本：上涨超阈值 / 下跌超阈值且创7日新低，可叠加7日新高与布林突破"""
+    up = change >= threshold
+    down = change <= -threshold
+    if today_high is not None and high_7d is not None:
+        up &= today_high > high_7d
+    if today_low is not None and low_7d is not None:
+        down &= today_low < low_7d
+    if band_pos is not None:
+        up &= band_pos > 1
+        down &= band_pos < 0
+    return up | down
+
+# endregion
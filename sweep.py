@@ -0,0 +1,224 @@
+import argparse
+import csv
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backtest import _parse_date, forward_returns, intraday_low, prior_daily_close_low, rolling_bands
+from kline_buffer import INTERVAL_MS
+from kline_store import COLUMNS, KlineStore
+from screener import BODY, boll_screen_mask, bollinger_position, price_change
+
+# 默认网格（test-boll.py 的 get_closed_kline / screen_klines 参数）
+THRESHOLDS = (3, 4, 5, 6, 7, 8, 9, 10, 12)
+INTERVALS = ('5m', '15m')
+BOLL_WINDOWS = (0, 20, 30)  # 0 表示不加布林突破条件
+BOLL_STDS = (2.0, 2.5, 3.0)
+EXTREMES = (False, True)  # 下跌是否要求当日最低价低于前7日收盘最低
+HORIZON = 12  # 评估命中后第N根K线的收益
+MIN_HITS = 30  # 命中次数过少的组合不参与排名
+
+# 每个组合的累计量：命中数、有向后收益的命中数、顺势次数、顺势收益和
+STAT_FIELDS = 4
+
+
+# region 共享内存K线
+class SharedBars:
+    """一个周期全部交易对的K线拼接进一块共享内存：各列依次连续存放，offsets为每个交易对的起止下标；
+    子进程按名称映射同一块内存，不需要把K线序列化后发给每个进程"""
+
+    def __init__(self, shm: shared_memory.SharedMemory, symbols: List[str], offsets: np.ndarray):
+        self.shm = shm
+        self.symbols = symbols
+        self.offsets = offsets
+        total = int(offsets[-1])
+        self.columns = {column: np.ndarray(total, dtype=dtype, buffer=shm.buf, offset=i * total * 8)
+                        for i, (column, dtype) in enumerate(COLUMNS)}
+
+    @classmethod
+    def create(cls, store: KlineStore, exchange: str, interval: str, symbols: Optional[Sequence[str]] = None,
+               start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> Optional['SharedBars']:
+        """从本地K线库读取并复制进新建的共享内存，没有数据时返回None"""
+        names = list(symbols) if symbols is not None else store.symbols(exchange, interval)
+        series = [(name, store.read(exchange, name, interval, start_ms, end_ms)) for name in names]
+        series = [(name, cols) for name, cols in series if len(cols['open_time'])]
+        if not series:
+            return None
+        offsets = np.concatenate(([0], np.cumsum([len(cols['open_time']) for _, cols in series])))
+        shm = shared_memory.SharedMemory(create=True, size=int(offsets[-1]) * 8 * len(COLUMNS))
+        bars = cls(shm, [name for name, _ in series], offsets)
+        for i, (_, cols) in enumerate(series):
+            for column, _ in COLUMNS:
+                bars.columns[column][offsets[i]:offsets[i + 1]] = cols[column]
+        return bars
+
+    @property
+    def spec(self) -> tuple:
+        """传给子进程的描述（只有名称与下标，体积很小）"""
+        return self.shm.name, self.symbols, self.offsets
+
+    @classmethod
+    def attach(cls, spec: tuple) -> 'SharedBars':
+        name, symbols, offsets = spec
+        return cls(shared_memory.SharedMemory(name=name), symbols, offsets)
+
+    def series(self, index: int) -> Dict[str, np.ndarray]:
+        lo, hi = self.offsets[index], self.offsets[index + 1]
+        return {column: values[lo:hi] for column, values in self.columns.items()}
+
+    def release(self, unlink: bool = False) -> None:
+        self.columns = {}  # 先释放视图，否则共享内存无法关闭
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+_attached: Dict[str, SharedBars] = {}  # 子进程内已映射的共享内存，按名称复用
+
+
+def _get_bars(spec: tuple) -> SharedBars:
+    if spec[0] not in _attached:
+        _attached[spec[0]] = SharedBars.attach(spec)
+    return _attached[spec[0]]
+
+
+# endregion
+
+# region 子进程评估
+def evaluate_chunk(spec: tuple, interval: str, symbol_range: Tuple[int, int],
+                   bands: Sequence[Tuple[int, float]], thresholds: Sequence[float], extremes: Sequence[bool],
+                   horizon: int = HORIZON) -> Dict[tuple, np.ndarray]:
+    """在一段交易对上评估全部参数组合：涨跌幅、日内低点、7日低点与向后收益每个交易对只算一次，
+    每组布林参数算一次布林带；返回 {(布林窗口, 标准差倍数, 阈值, 极值条件): 累计量}"""
+    bars = _get_bars(spec)
+    interval_ms = INTERVAL_MS[interval]
+    stats = {key: np.zeros(STAT_FIELDS) for key in product(bands, thresholds, extremes)}
+    for index in range(*symbol_range):
+        cols = bars.series(index)
+        open_time, close = cols['open_time'], cols['close']
+        change = price_change(cols['open'], cols['high'], cols['low'], close, BODY)
+        # 只有幅度达到最小阈值的K线可能命中，后续计算都只在这些候选上进行
+        idx = np.flatnonzero(np.abs(change) >= min(thresholds))
+        if not len(idx):
+            continue
+        change = change[idx]
+        # 命中方向的后续收益：阳线看涨、阴线看跌
+        fwd = forward_returns(open_time, close, idx, interval_ms, (horizon,))[:, 0]
+        fwd *= np.where(close[idx] < cols['open'][idx], -1, 1)
+        valid = ~np.isnan(fwd)
+        today_low = low_7d = None
+        if any(extremes):
+            today_low = intraday_low(open_time, cols['low'])[idx]
+            low_7d = prior_daily_close_low(open_time, close)[idx]
+        for window, std_dev in bands:
+            band_pos = None
+            if window:
+                lower, upper = rolling_bands(close, window, std_dev)
+                band_pos = bollinger_position(close[idx], lower[idx], upper[idx])
+            with np.errstate(invalid='ignore'):
+                for threshold, extreme in product(thresholds, extremes):
+                    mask = boll_screen_mask(change, threshold, today_low=today_low if extreme else None,
+                                            low_7d=low_7d if extreme else None, band_pos=band_pos)
+                    hit_fwd = fwd[mask & valid]
+                    stats[(window, std_dev), threshold, extreme] += (
+                        np.count_nonzero(mask), len(hit_fwd), np.count_nonzero(hit_fwd > 0), hit_fwd.sum())
+    return stats
+
+
+# endregion
+
+# region 参数扫描
+def _chunks(count: int, parts: int) -> List[Tuple[int, int]]:
+    size = math.ceil(count / max(parts, 1))
+    return [(lo, min(lo + size, count)) for lo in range(0, count, size)]
+
+
+def run_sweep(store: KlineStore, exchange: str = 'binance', intervals: Sequence[str] = INTERVALS,
+              thresholds: Sequence[float] = THRESHOLDS, windows: Sequence[int] = BOLL_WINDOWS,
+              stds: Sequence[float] = BOLL_STDS, extremes: Sequence[bool] = EXTREMES, horizon: int = HORIZON,
+              start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+              workers: Optional[int] = None) -> List[dict]:
+    """网格搜索布林扫描参数，按交易对分片分发到进程池，K线经共享内存共享；返回每个组合的统计"""
+    workers = workers or os.cpu_count() or 1
+    # 不加布林条件时标准差无意义，只保留一组
+    bands = sorted({(w, s if w else 0.0) for w, s in product(windows, stds)})
+    blocks: Dict[str, SharedBars] = {}
+    totals: Dict[tuple, np.ndarray] = {}
+    try:
+        for interval in intervals:
+            bars = SharedBars.create(store, exchange, interval, start_ms=start_ms, end_ms=end_ms)
+            if bars is None:
+                print(f"[{exchange}] 本地库中没有{interval}K线，跳过")
+                continue
+            blocks[interval] = bars
+        if not blocks:
+            return []
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            for interval, bars in blocks.items():
+                # 每个核心约分到4个分片，慢分片不至于拖住整体
+                for symbol_range in _chunks(len(bars.symbols), 4 * workers):
+                    future = pool.submit(evaluate_chunk, bars.spec, interval, symbol_range, bands,
+                                         thresholds, extremes, horizon)
+                    futures[future] = interval
+            for future in as_completed(futures):
+                for ((window, std_dev), threshold, extreme), stat in future.result().items():
+                    key = (futures[future], window, std_dev, threshold, extreme)
+                    totals[key] = totals.get(key, 0) + stat
+    finally:
+        for bars in blocks.values():
+            bars.release(unlink=True)
+
+    rows = []
+    for (interval, window, std_dev, threshold, extreme), (hits, valid, wins, total) in totals.items():
+        rows.append({
+            'interval': interval, 'threshold': threshold, 'boll_window': window, 'boll_std': std_dev,
+            'extreme_7d': extreme, 'hits': int(hits),
+            'hit_rate': float(wins / valid * 100) if valid else 0.0,
+            'mean_return': float(total / valid) if valid else 0.0,
+        })
+    rows.sort(key=lambda r: (r['hits'] >= MIN_HITS, r['hit_rate'], r['mean_return']), reverse=True)
+    return rows
+
+
+# endregion
+
+
+if __name__ == "__main__":
+    # 用法: python sweep.py --exchange binance --intervals 5m 15m --start 2024-01-01 --top 20 --csv sweep.csv
+    parser = argparse.ArgumentParser(description="在本地K线库上并行网格搜索布林扫描参数")
+    parser.add_argument('--exchange', default='binance')
+    parser.add_argument('--intervals', nargs='+', default=list(INTERVALS))
+    parser.add_argument('--thresholds', nargs='+', type=float, default=list(THRESHOLDS))
+    parser.add_argument('--windows', nargs='+', type=int, default=list(BOLL_WINDOWS))
+    parser.add_argument('--stds', nargs='+', type=float, default=list(BOLL_STDS))
+    parser.add_argument('--horizon', type=int, default=HORIZON, help="评估命中后第N根K线的收益")
+    parser.add_argument('--start', help="YYYY-MM-DD (UTC)")
+    parser.add_argument('--end', help="YYYY-MM-DD (UTC)，不含")
+    parser.add_argument('--root', default=None, help="K线库目录")
+    parser.add_argument('--workers', type=int, help="进程数，缺省为CPU核数")
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--csv', help="全部组合结果输出文件")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    results = run_sweep(KlineStore(args.root) if args.root else KlineStore(), args.exchange, args.intervals,
+                        args.thresholds, args.windows, args.stds, EXTREMES, args.horizon,
+                        _parse_date(args.start), _parse_date(args.end), args.workers)
+    print(f"{len(results)}个参数组合，耗时 {time.perf_counter() - started:.1f}秒；按顺势率、平均收益排序：")
+    for row in results[:args.top]:
+        boll = f"布林{row['boll_window']}/{row['boll_std']:g}" if row['boll_window'] else "无布林"
+        print(f"  {row['interval']:>3} 阈值{row['threshold']:g}% {boll} 7日低点{'是' if row['extreme_7d'] else '否'}"
+              f" -> 命中{row['hits']}次 顺势率{row['hit_rate']:.1f}% +{args.horizon}根平均{row['mean_return']:+.2f}%")
+    if args.csv and results:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
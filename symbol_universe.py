@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Awaitable, Callable, FrozenSet, List, Optional, Pattern
+
+from http_pool import get_session
+
+REFRESH_INTERVAL = 300  # 刷新周期（秒），与5分钟K线对齐
+REFRESH_OFFSET = 150  # 在K线周期中间刷新，避开收盘时的K线请求高峰
+CACHE_DIR = ".cache"  # 交易对快照文件目录，重启时先加载上次的列表
+
+BINANCE_EXCHANGE_INFO_URL = "https://fapi.binance.com/fapi/v1/exchangeInfo"
+BYBIT_INSTRUMENTS_URL = "https://api.bybit.com/v5/market/instruments-info"
+GATEIO_CONTRACTS_URL = "https://api.gateio.ws/api/v4/futures/usdt/contracts"
+
+# 响应中每次都会变化、但与交易对列表无关的字段，计算内容哈希前先去掉
+BINANCE_VOLATILE = re.compile(rb'"serverTime":\d+,?')
+BYBIT_VOLATILE = re.compile(rb'"time":\d+,?')
+
+# 变化回调: (universe, 新增, 下架)
+ChangeCallback = Callable[['SymbolUniverse', FrozenSet[str], FrozenSet[str]], Awaitable[None]]
+
+
+# region 交易对解析
+def parse_symbols_binance(data: dict) -> List[str]:
+    return [s['symbol'] for s in data['symbols'] if 'USDT' in s['symbol']]
+
+
+def parse_symbols_bybit(data: dict) -> List[str]:
+    return [s["symbol"] for s in data["result"]["list"] if "USDT" in s["symbol"]]
+
+
+def parse_symbols_gateio(data: list) -> List[str]:
+    return [s["name"] for s in data if s["in_delisting"] is False]  # 排除已下架合约
+
+
+# endregion
+
+# region 后台刷新
+class SymbolUniverse:
+    """后台定时刷新交易对列表，内容哈希未变时跳过解析，变化时原子替换快照"""
+
+    def __init__(self, name: str, url: str, parser: Callable[[object], List[str]], session_name: str,
+                 params: Optional[dict] = None, volatile: Optional[Pattern] = None,
+                 on_change: Optional[ChangeCallback] = None,
+                 interval: float = REFRESH_INTERVAL, offset: float = REFRESH_OFFSET,
+                 cache_dir: Optional[str] = CACHE_DIR):
+        self.name = name
+        self.url = url
+        self.parser = parser
+        self.session_name = session_name
+        self.params = params
+        self.volatile = volatile
+        self.on_change = on_change
+        self.interval = interval
+        self.offset = offset
+        self.symbols: FrozenSet[str] = frozenset()  # 当前快照，只整体替换不原地修改
+        self.version = 0
+        self.content_hash: Optional[str] = None
+        self.skipped = 0  # 因内容未变跳过解析的次数
+        # 快照按解析函数区分：同一交易所不同脚本的筛选规则可能不同，不能共用快照与内容哈希
+        cache_name = f"universe_{session_name}_{getattr(parser, '__name__', 'custom')}.json"
+        self.cache_path = os.path.join(cache_dir, cache_name) if cache_dir else None
+        self._task: Optional[asyncio.Task] = None
+        self._warm_task: Optional[asyncio.Task] = None
+
+    def load_snapshot(self) -> bool:
+        """加载上次保存的交易对快照，文件不存在或损坏时返回False"""
+        if not self.cache_path:
+            return False
+        try:
+            with open(self.cache_path, encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if not snapshot.get('symbols'):
+            return False
+        self.symbols = frozenset(snapshot['symbols'])
+        self.content_hash = snapshot.get('content_hash')
+        self.version = 1  # 以快照为基准，停机期间新增的合约会在首次刷新时推送
+        return True
+
+    def save_snapshot(self) -> None:
+        """原子写入当前快照（先写临时文件再替换）"""
+        if not self.cache_path or not self.symbols:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp = self.cache_path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'symbols': sorted(self.symbols), 'content_hash': self.content_hash,
+                           'saved_at': int(time.time() * 1000)}, f)
+            os.replace(tmp, self.cache_path)
+        except OSError as e:
+            print(f"保存{self.name}交易对快照失败: {str(e)}")
+
+    async def refresh_once(self) -> bool:
+        """拉取一次，返回交易对列表是否发生变化"""
+        async with get_session(self.session_name).get(self.url, params=self.params) as resp:
+            resp.raise_for_status()
+            body = await resp.read()
+
+        stable = self.volatile.sub(b'', body) if self.volatile is not None else body
+        content_hash = hashlib.sha1(stable).hexdigest()
+        if content_hash == self.content_hash:
+            self.skipped += 1
+            return False
+
+        current = frozenset(self.parser(json.loads(body)))
+        self.content_hash = content_hash  # 解析成功后才记录，解析失败时下次相同内容仍会重新解析
+        added, removed = current - self.symbols, self.symbols - current
+        if not added and not removed:
+            self.save_snapshot()  # 列表未变但哈希变了，也要保存，否则重启后每次都要重新解析
+            return False
+        first = self.version == 0
+        self.symbols = current
+        self.version += 1
+        self.save_snapshot()
+        if not first and self.on_change is not None:
+            await self.on_change(self, frozenset(added), frozenset(removed))
+        return True
+
+    async def warm_start(self) -> None:
+        """快速启动：有本地快照时立即可用，并在后台刷新一次；没有快照时才阻塞拉取"""
+        if not self.load_snapshot():
+            try:
+                await self.refresh_once()
+            except Exception as e:
+                # 不让一个交易所的网络错误中断启动，交易对列表由后台刷新循环重试
+                print(f"获取{self.name}合约交易对时发生错误: {str(e)}")
+            return
+        print(f"已加载{self.name}交易对快照({len(self.symbols)}个)，后台刷新中")
+
+        async def _refresh():
+            try:
+                await self.refresh_once()
+            except Exception as e:
+                print(f"获取{self.name}合约交易对时发生错误: {str(e)}")
+
+        self._warm_task = asyncio.create_task(_refresh())
+
+    def _next_delay(self) -> float:
+        now = time.time()
+        return (self.offset - now) % self.interval or self.interval
+
+    async def run(self) -> None:
+        """常驻刷新循环（在K线周期中间执行）"""
+        while True:
+            await asyncio.sleep(self._next_delay())
+            try:
+                await self.refresh_once()
+            except Exception as e:
+                print(f"获取{self.name}合约交易对时发生错误: {str(e)}")
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+
+def binance_universe(on_change: Optional[ChangeCallback] = None) -> SymbolUniverse:
+    return SymbolUniverse('Binance', BINANCE_EXCHANGE_INFO_URL, parse_symbols_binance, 'binance',
+                          volatile=BINANCE_VOLATILE, on_change=on_change)
+
+
+def bybit_universe(on_change: Optional[ChangeCallback] = None) -> SymbolUniverse:
+    return SymbolUniverse('Bybit', BYBIT_INSTRUMENTS_URL, parse_symbols_bybit, 'bybit',
+                          params={"category": "linear", "status": "Trading"},
+                          volatile=BYBIT_VOLATILE, on_change=on_change)
+
+
+def gateio_universe(on_change: Optional[ChangeCallback] = None) -> SymbolUniverse:
+    # Gate.io合约列表带实时标记价格，内容哈希几乎每次都变，仍需解析后增量比对
+    return SymbolUniverse('Gate.io', GATEIO_CONTRACTS_URL, parse_symbols_gateio, 'gateio',
+                          on_change=on_change)
+
+# endregion
@@ -1,42 +1,30 @@
 import asyncio
+import sys
 from datetime import datetime, timedelta
 
-import aiohttp
-import numpy as np
-import pandas as pd
-import requests
-from win10toast import ToastNotifier
+from bar_clock import BarCloseScheduler, get_clock
+from exchanges import BinanceAdapter, BybitAdapter, GateioAdapter, scan_exchanges
+from kline_store import KlineStore
+from metrics import METRICS
+from notify import JournalBackend, Notifier, PushPlusBackend, StreamBackend, ToastBackend
+from rolling_boll import BollingerEngine
+from scan_cluster import COORDINATOR_HOST, COORDINATOR_PORT, ScanCoordinator, ScanWorker, ShardPool
 
-symbols_list_binance = []
-symbols_list_bybit = []
-symbols_list_gateio = []
 symbols_have_res = set()
+EXCHANGE_SCREENS = {'binance': 7, 'bybit': 8, 'gateio': 8}  # 各交易所涨跌幅阈值（%）
+boll_engine = BollingerEngine()  # Binance 5分钟滚动布林带，首次取21根初始化，之后每轮O(1)更新
+BOLL_FILTER = False  # 是否叠加布林带突破条件
+ENABLED_EXCHANGES = ['binance', 'gateio']  # 单机模式同时扫描的交易所（Bybit默认不启用）
 
 # region 通用
-async def push_wechat(title, pairs):
-    token = "2fb9c4804bd8400684d60e4905365978"  # 从PushPlus官网获取
-    token_iphone = "e91fc3d7210641908abc048ccaf6852a"  # 从PushPlus官网获取
-    url = f"https://www.pushplus.plus/send?token={token}&title={title}&content={pairs}"
-    print(f"{title}:{pairs}")
-    requests.get(url)
-
-
-async def push_windows(title, pairs):
-    """使用Windows通知"""
-    try:
-        # 初始化通知器
-        toaster = ToastNotifier()
-
-        # 显示通知（标题为交易所名称，内容为交易对信息）
-        toaster.show_toast(
-            title=title,
-            msg=pairs,
-            duration=15,  # 通知显示10秒
-            threaded=True  # 非阻塞模式
-        )
-        print(f"{title}:{pairs}")
-    except Exception as e:
-        print(f"Windows通知发送失败: {str(e)}")
+notifier = Notifier([
+    PushPlusBackend("2fb9c4804bd8400684d60e4905365978"),  # 从PushPlus官网获取，iPhone用: e91fc3d7210641908abc048ccaf6852a
+    ToastBackend(),
+    StreamBackend(),
+    JournalBackend(),
+])
+WECHAT_ONLY = ('wechat', 'stdout', 'journal')
+NEW_LISTING_VIA = ('wechat', 'toast', 'stdout')  # 新上线合约不是扫描告警，不写入告警日志
 
 
 async def reset_symbols_have_res():
@@ -55,25 +43,32 @@ async def reset_symbols_have_res():
         print(f"已重置symbols_have_res集合，时间: {datetime.now()}")
 
 
-def calculate_bollinger_bands(prices, window=20, std_dev=2):
-    """计算布林带中轨、上轨、下轨"""
-    if len(prices) < window:
-        return None, None, None
-    sma = np.mean(prices[-window:])
-    std = np.std(prices[-window:])
-    return sma, sma + std_dev * std, sma - std_dev * std
-# endregion
+async def push_new_symbols(universe, added, removed):
+    """后台刷新交易对列表时检测到新增合约"""
+    if added:
+        notifier.notify(universe.name, ','.join(added), via=NEW_LISTING_VIA)
 
-# region Binance
-def get_all_futures_symbols_binance():
-    """同步获取所有USDT合约交易对"""
-    url = "https://fapi.binance.com/fapi/v1/exchangeInfo"
-    response = requests.get(url)
-    data = response.json()
-    current_pairs = [s['symbol'] for s in data['symbols'] if 'USDT' in s['symbol']]
-    return current_pairs
 
+# 各交易所适配器：K线请求与幅度计算方式各自实现，扫描流程共用；已收盘K线顺带写入本地列式库
+kline_store = KlineStore()
+adapters = {
+    'binance': BinanceAdapter(EXCHANGE_SCREENS['binance'], boll_engine=boll_engine, boll_filter=BOLL_FILTER,
+                              store=kline_store),
+    'bybit': BybitAdapter(EXCHANGE_SCREENS['bybit'], store=kline_store),
+    'gateio': GateioAdapter(EXCHANGE_SCREENS['gateio'], store=kline_store),
+}
+ALERT_VIA = {'binance': None, 'bybit': WECHAT_ONLY, 'gateio': WECHAT_ONLY}  # 各交易所告警的推送后端
 
+# 交易对列表由后台任务在K线周期中间刷新，扫描时只读快照
+universes = {name: adapter.universe(on_change=push_new_symbols) for name, adapter in adapters.items()}
+
+
+def format_alert(kline):
+    direction = "下跌" if kline['is_bearish'] else "上涨"
+    return f"{kline['symbol']}: {direction}{abs(kline['price_change']):.2f}%"
+# endregion
+
+# region Binance
 async def get_7d_high_low_binance(session, symbol):
     """获取过去7天的最高价和最低价（基于日线）"""
     url = "https://fapi.binance.com/fapi/v1/klines"
@@ -88,368 +83,129 @@ async def get_7d_high_low_binance(session, symbol):
         lows = [float(kline[3]) for kline in data[:-1]]  # 最低价数组
         closes = [float(kline[4]) for kline in data[:-1]]  # 收盘价数组
         return max(closes), min(closes), float(data[-1][2]), float(data[-1][3])  # 返回过去7天最高价和最低价
-
-
-async def get_closed_kline_binance(session, symbol):
-    """异步获取最近一根已闭合的5分钟K线，并计算最高价/最低价到收盘价的幅度"""
-    url = "https://fapi.binance.com/fapi/v1/klines"
-    params = {
-        'symbol': symbol,
-        'interval': '5m',
-        'limit': 2  # 获取最近2根K线
-    }
-
-    async with session.get(url, params=params) as response:
-        data = await response.json()
-        if len(data) < 2:
-            return None
-
-        latest_kline = data[-1]
-        prev_kline = data[-2]
-
-        # 获取K线收盘时间的分钟数（UTC时间）
-        latest_close_time = pd.to_datetime(latest_kline[6], unit='ms')
-
-        # 获取当前时间的分钟数（UTC时间）
-        current_time = datetime.utcnow()
-
-        # 确定使用哪根K线
-        res_kline = latest_kline if current_time >= latest_close_time else prev_kline
-
-        # 解析K线数据
-        open_price = float(res_kline[1])
-        high_price = float(res_kline[2])
-        low_price = float(res_kline[3])
-        close_price = float(res_kline[4])
-        
-        # 计算涨跌状态
-        is_bearish = close_price < open_price  # 是否为阴线（下跌）
-        is_bullish = close_price > open_price  # 是否为阳线（上涨）
-        
-        # 计算幅度
-        if is_bearish:
-            high_to_close = (high_price - close_price) / high_price * 100
-            low_to_close = 0
-        else:
-            low_to_close = (close_price - low_price) / low_price * 100
-            high_to_close = 0
-        
-        
-        # 判断条件是否满足
-        # bearish_condition = is_bearish and (high_to_close >= 8)
-        # bullish_condition = is_bullish and (low_to_close >= 8)
-        price_change = max(high_to_close, low_to_close)
-
-        return {
-            'symbol': symbol,
-            'open_time': pd.to_datetime(res_kline[0], unit='ms'),
-            'close_time': pd.to_datetime(res_kline[6], unit='ms'),
-            'open': open_price,
-            'high': high_price,
-            'low': low_price,
-            'close': close_price,
-            'is_bearish': is_bearish,
-            'high_to_close_pct': high_to_close,  # 最高价到收盘价跌幅百分比
-            'low_to_close_pct': low_to_close,    # 最低价到收盘价涨幅百分比
-            'price_change': price_change,  # 价格变化幅度
-        }
-
-
-async def scan_symbol_binance(session, symbol, results):
-    """异步扫描单个交易对，基于最高价/最低价到收盘价的幅度条件"""
-    try:
-        kline = await get_closed_kline_binance(session, symbol)
-        if kline and (abs(kline['price_change']) >= 7):
-            results.append(kline)
-    except aiohttp.ClientError as e:
-        print(f"请求{symbol}时发生网络错误: {str(e)}")
-    except Exception as e:
-        print(f"处理{symbol}时发生错误: {str(e)}")
-
-
-async def scan_high_change_contracts_binance():
-    """并发扫描所有合约"""
-    async with aiohttp.ClientSession() as session:
-        global symbols_list_binance
-        results = []
-        tasks = [scan_symbol_binance(session, symbol, results) for symbol in symbols_list_binance]
-        await asyncio.gather(*tasks)  # 并发执行所有任务
-
-        if not results:
-            print("未找到符合条件的合约")
-            return None
-
-        # 直接返回结果列表，不进行排序
-        return sorted(results, key=lambda x: abs(x['price_change']), reverse=True)
 # endregion
 
-# region Bybit
-def get_all_futures_symbols_bybit():
-    """同步获取Bybit所有USDT永续合约交易对"""
-    url = "https://api.bybit.com/v5/market/instruments-info"
-    params = {
-        "category": "linear",  # USDT永续合约
-        "status": "Trading"  # 仅获取可交易的合约
-    }
-    response = requests.get(url, params=params)
-    data = response.json()
-    return [s["symbol"] for s in data["result"]["list"] if "USDT" in s["symbol"]]
-
+# region 扫描
+async def report_results(adapter, results):
+    """单个交易所扫描完成后立即推送（跨交易所去重，先完成的先推送）"""
+    fresh = [k for k in results if k['symbol'] not in symbols_have_res]
+    symbols_have_res.update(k['symbol'] for k in fresh)
+    if fresh:
+        notifier.notify(adapter.title, ','.join(format_alert(k) for k in fresh), via=ALERT_VIA[adapter.name])
+
+
+async def scan_cycle(close_ms):
+    """一轮全量扫描：所有启用的交易所同时扫描、共用一个截止时间，完成后重置去重集合"""
+    print(f"\n===== 开始全量扫描 {datetime.now()} | {','.join(ENABLED_EXCHANGES)} =====")
+
+    METRICS.begin_cycle('coordinated', bar_close_ms=close_ms)
+    if shard_pool is not None:
+        # 多进程分片：请求与解析在各分片进程中完成，这里按交易所合并后走同一告警流程
+        results = await shard_pool.scan_cycle({ex: list(universes[ex].symbols) for ex in ENABLED_EXCHANGES})
+        by_exchange = {}
+        for kline in results:
+            by_exchange.setdefault(kline['exchange'], []).append(kline)
+        for ex in ENABLED_EXCHANGES:
+            if by_exchange.get(ex):
+                await report_results(adapters[ex], by_exchange[ex])
+            else:
+                print(f"[{adapters[ex].title}] 未找到符合条件的合约")
+    else:
+        await scan_exchanges([adapters[ex] for ex in ENABLED_EXCHANGES],
+                             {ex: universes[ex].symbols for ex in ENABLED_EXCHANGES}, on_results=report_results)
+    METRICS.end_cycle()
+
+    # 扫描完成后立即重置集合
+    symbols_have_res.clear()
 
-async def get_closed_kline_bybit(session, symbol):
-    """异步获取最近一根已闭合的K线"""
-    url = "https://api.bybit.com/v5/market/kline"
-    params = {
-        "category": "linear",
-        "symbol": symbol,
-        "interval": 5,  # Bybit的间隔格式为"5"（5分钟）
-        "limit": 2
-    }
-    async with session.get(url, params=params) as response:
-        data = await response.json()
-        klines = data["result"]["list"]
-        if len(klines) < 2:
-            return None
-
-        latest_kline = klines[0]
-        prev_kline = klines[1]
-        latest_close_time = pd.to_datetime(latest_kline[0], unit="ms") + timedelta(minutes=5)
-        current_time = datetime.utcnow()
-
-        # 仅当当前时间超过K线闭合时间才返回数据
-        if current_time < latest_close_time:
-            res_kline = prev_kline
-        else:
-            res_kline = latest_kline
 
-        open_price = float(res_kline[1])
-        close_price = float(res_kline[4])
-        price_change = (close_price - open_price) / open_price * 100
+async def coordinated_scan():
+    """所有启用的交易所在收盘后同时扫描（按Binance服务器时间触发）"""
+    scheduler = BarCloseScheduler(get_clock('binance'), warm_up=ENABLED_EXCHANGES)
+    while True:
+        close_ms = await scheduler.wait_next_close()
+        await scan_cycle(close_ms)
+        print(f"已重置去重集合 | 下次扫描时间: {datetime.fromtimestamp(scheduler.next_close_ms() / 1000)}")
+# endregion
 
-        return {
-            "symbol": symbol,
-            "open_time": pd.to_datetime(res_kline[0], unit="ms"),
-            "close_time": pd.to_datetime(res_kline[0], unit="ms") + timedelta(minutes=5),
-            "close": close_price,
-            "price_change": price_change,
-        }
+# region 集群
+shard_pool = None  # 多进程分片模式下为ShardPool，scan_cycle把交易对分给各进程扫描
 
 
-async def scan_symbol_bybit(session, symbol, results):
-    """异步扫描单个交易对"""
-    try:
-        kline = await get_closed_kline_bybit(session, symbol)
-        if kline and (abs(kline['price_change']) >= 8):
-            results.append(kline)
-    except Exception as e:
-        pass
-
-
-async def scan_high_change_contracts_bybit():
-    """并发扫描所有合约"""
-    async with aiohttp.ClientSession() as session:
-        global symbols_list_bybit
-        results = []
-        tasks = [scan_symbol_bybit(session, symbol, results) for symbol in symbols_list_bybit]
-        await asyncio.gather(*tasks)  # 并发执行所有任务
-
-        if not results:
-            print("未找到符合条件的合约")
-            return None
-
-        # 直接返回结果列表，不进行排序
-        return results
-#  endregion
-
-# region Gate.io
-def get_all_futures_symbols_gateio():
-    """同步获取Gate.io所有USDT永续合约交易对"""
-    url = "https://api.gateio.ws/api/v4/futures/usdt/contracts"
-    response = requests.get(url)
-    data = response.json()
-    return [s["name"] for s in data if s["in_delisting"] is False]  # 排除已下架合约
-
-
-async def get_closed_kline_gateio(session, symbol):
-    """异步获取Gate.io最近一根已闭合的K线"""
-    url = "https://api.gateio.ws/api/v4/futures/usdt/candlesticks"
-    params = {
-        "contract": symbol,
-        "interval": "5m",  # 支持5m、1h等，需转为字符串格式
-        "limit": 2
-    }
+async def scan_slice(assignment):
+    """集群worker：只扫描分配到本节点的交易对切片，结果附带交易所标记"""
+    results = await scan_exchanges([adapters[ex] for ex in assignment], assignment)
+    return [kline for part in results.values() for kline in part]
 
-    async with session.get(url, params=params) as response:
-        data = await response.json()
-        if len(data) < 2:
-            return None
 
-        latest_kline = data[0]  # Gate.io返回的K线按时间倒序排列
-        prev_kline = data[1]
-        latest_close_time = pd.to_datetime(latest_kline["t"], unit="s") + timedelta(minutes=5)
-        current_time = datetime.utcnow()
+async def scan_shard(assignment):
+    """多进程分片（及父进程补扫）：同scan_slice，但无命中时不输出，由父进程的scan_cycle统一输出"""
+    results = await scan_exchanges([adapters[ex] for ex in assignment], assignment, report_empty=False)
+    return [kline for part in results.values() for kline in part]
 
-        # 仅当当前时间超过K线闭合时间才返回数据
-        if current_time < latest_close_time:
-            res_kline = prev_kline
-        else:
-            res_kline = latest_kline
-
-        open_price = float(res_kline["o"])
-        close_price = float(res_kline["c"])
-        price_change = (close_price - open_price) / open_price * 100
-        return {
-            "symbol": symbol.replace('_', ''),
-            "open_time": pd.to_datetime(res_kline["t"], unit="s"),
-            "close_time": pd.to_datetime(res_kline["t"], unit="s") + timedelta(minutes=5),
-            "close": close_price,
-            "price_change": price_change,
-        }
-
-
-async def scan_symbol_gateio(session, symbol, results):
-    """异步扫描单个交易对（Gate.io版）"""
-    try:
-        kline = await get_closed_kline_gateio(session, symbol)
-        if kline and (abs(kline['price_change']) >= 8):
-            results.append(kline)
-    except aiohttp.ClientError as e:
-        print(f"请求{symbol}时发生网络错误: {str(e)}")
-    except Exception as e:
-        print(f"处理{symbol}时发生错误: {str(e)}")
-
-
-async def scan_high_change_contracts_gateio():
-    """并发扫描所有Gate.io合约"""
-    async with aiohttp.ClientSession() as session:
-        global symbols_list_gateio
-        results = []
-        tasks = []
-
-        for symbol in symbols_list_gateio:
-            task = asyncio.create_task(scan_symbol_gateio(session, symbol, results))
-            tasks.append(task)
-            await asyncio.sleep(0.06)  # 添加请求间隔
-
-        await asyncio.gather(*tasks)
-
-        if not results:
-            print("未找到符合条件的合约")
-            return None
-
-        return sorted(results, key=lambda x: abs(x['price_change']), reverse=True)
-# endregion
 
-# region 扫描
-async def coordinated_scan():
-    """协调三个交易所的扫描任务，并在完成后重置集合"""
+async def coordinated_scan_cluster(host=COORDINATOR_HOST, port=COORDINATOR_PORT):
+    """集群协调节点：按一致性哈希把交易对分给各worker，合并结果后每轮只推送一条"""
+    coordinator = ScanCoordinator(host, port, local_scan=scan_slice)
+    await coordinator.start()
+    scheduler = BarCloseScheduler(get_clock('binance'), warm_up=['binance', 'gateio'])
     while True:
-        now = datetime.now()
-        next_scan = now.replace(second=0, microsecond=0) + timedelta(minutes=(5 - now.minute % 5))
-        delay = (next_scan - now).total_seconds()
-        if delay > 0:
-            await asyncio.sleep(delay)
-
-        print(f"\n===== 开始全量扫描 {datetime.now()} =====")
-        
-        global symbols_list_gateio
-        current_symbols = set(get_all_futures_symbols_gateio())
-        new_symbols = current_symbols - set(symbols_list_gateio)
-        if new_symbols:
-            await push_windows("Gate.io", ','.join(new_symbols))
-            await push_wechat("Gate.io", ','.join(new_symbols))
-            symbols_list_gateio = list(current_symbols)
-
-        await periodic_scan_binance()
-        # await periodic_scan_gateio()
-
-        # 扫描完成后立即重置集合
-        symbols_have_res.clear()
-        print(f"已重置去重集合 | 下次扫描时间: {next_scan + timedelta(minutes=5)}")
-
-
-async def periodic_scan_binance():
-    """Binance扫描（不再包含循环，单次执行）"""
-    try:
-        print(f"[Binance] 扫描启动 {datetime.now()}")
-        high_change_klines = await scan_high_change_contracts_binance()
-        if high_change_klines:
-            pairs = []
+        close_ms = await scheduler.wait_next_close()
+
+        print(f"\n===== 开始集群扫描 {datetime.now()} | {len(coordinator.ring.nodes)}个节点 =====")
+        try:
+            METRICS.begin_cycle('cluster', bar_close_ms=close_ms)
+            universe = {exchange: list(u.symbols) for exchange, u in universes.items()}
+            high_change_klines = await coordinator.scan_cycle(universe)
+            high_change_klines.sort(key=lambda x: abs(x['price_change']), reverse=True)
+            by_exchange = {}
             for kline in high_change_klines:
-                direction = "下跌" if kline['is_bearish'] else "上涨"
-                pairs.append(f"{kline['symbol']}: {direction}{kline['price_change']:.2f}%")
-            await push_windows("Binance", ','.join(pairs))
-            await push_wechat("Binance", ','.join(pairs))
-            symbols_have_res.update(kline['symbol'] for kline in high_change_klines)
-
-        # 检测新增合约（独立于涨跌幅扫描）
-        global symbols_list_binance
-        current_symbols = set(get_all_futures_symbols_binance())
-        new_symbols = current_symbols - set(symbols_list_binance)
-        if new_symbols:
-            await push_windows("Binance", ','.join(new_symbols))
-            await push_wechat("Binance", ','.join(new_symbols))
-            symbols_list_binance = list(current_symbols)
-    except Exception as e:
-        print(f"[Binance] 扫描错误: {str(e)}")
-
-
-async def periodic_scan_bybit():
-    """Bybit扫描（单次执行版）"""
+                by_exchange.setdefault(kline['exchange'], []).append(kline)
+            # 每个交易所一条，内容为 "交易对: 说明"，与协同扫描一致，告警日志才能按交易对关联交易
+            for ex, klines in by_exchange.items():
+                notifier.notify(adapters[ex].title, ','.join(format_alert(k) for k in klines), via=ALERT_VIA[ex])
+        except Exception as e:
+            print(f"[集群] 扫描错误: {str(e)}")
+        METRICS.end_cycle()
+
+
+async def coordinated_scan_sharded(processes=None):
+    """单机多进程分片：每个进程一个事件循环与连接池，适合交易对多、JSON解析占满单核的情况"""
+    global shard_pool
+    shard_pool = ShardPool(__file__, 'scan_shard', processes, local_scan=scan_shard)
+    shard_pool.start()
     try:
-        print(f"[Bybit] 扫描启动 {datetime.now()}")
-        high_change_klines = await scan_high_change_contracts_bybit()
-        if high_change_klines:
-            filtered = [
-                f"{k['symbol']}: {k['price_change']:.2f}%"
-                for k in high_change_klines
-                if k['symbol'] not in symbols_have_res
-            ]
-            if filtered:
-                await push_wechat('Bybit', ','.join(filtered))
-            symbols_have_res.update(k['symbol'] for k in high_change_klines if k['symbol'] not in symbols_have_res)
-
-        # 检测新增合约
-        global symbols_list_bybit
-        current_symbols = set(get_all_futures_symbols_bybit())
-        new_symbols = current_symbols - set(symbols_list_bybit)
-        if new_symbols:
-            await push_wechat("Bybit", ','.join(new_symbols))
-            symbols_list_bybit = list(current_symbols)
-    except Exception as e:
-        print(f"[Bybit] 扫描错误: {str(e)}")
-
-
-async def periodic_scan_gateio():
-    """Gate.io扫描（单次执行版）"""
+        await coordinated_scan()
+    finally:
+        await shard_pool.stop()
+
+
+async def run_with_universes(main, exchanges):
+    """加载交易对快照（本地有快照时不阻塞，否则首次拉取）后启动后台刷新，再进入扫描主循环"""
+    notifier.preload()
+    await asyncio.gather(*(universes[ex].warm_start() for ex in exchanges))
+    for ex in exchanges:
+        universes[ex].start()
+    await METRICS.start_http()
     try:
-        print(f"[Gate.io] 扫描启动 {datetime.now()}")
-        high_change_klines = await scan_high_change_contracts_gateio()
-        if high_change_klines:
-            filtered = [
-                f"{k['symbol']}: {k['price_change']:.2f}%"
-                for k in high_change_klines
-                if k['symbol'] not in symbols_have_res
-            ]
-            if filtered:
-                await push_wechat('Gate.io', ','.join(filtered))
-            symbols_have_res.update(k['symbol'] for k in high_change_klines if k['symbol'] not in symbols_have_res)
-
-        # 检测新增合约
-        global symbols_list_gateio
-        current_symbols = set(get_all_futures_symbols_gateio())
-        new_symbols = current_symbols - set(symbols_list_gateio)
-        if new_symbols:
-            await push_wechat("Gate.io", ','.join(new_symbols))
-            symbols_list_gateio = list(current_symbols)
-    except Exception as e:
-        print(f"[Gate.io] 扫描错误: {str(e)}")
+        await main()
+    finally:
+        await notifier.stop()
 # endregion
 
 # 运行事件循环
 if __name__ == "__main__":
-    symbols_list_binance = get_all_futures_symbols_binance()
-    # symbols_list_bybit = get_all_futures_symbols_bybit()
-    symbols_list_gateio = get_all_futures_symbols_gateio()
-    # 启动主循环
-    asyncio.run(coordinated_scan())
+    # 用法: python 脚本.py [coordinator | worker [host:port] | sharded [进程数]]，不带参数为单机模式
+    mode = sys.argv[1] if len(sys.argv) > 1 else 'standalone'
+    if mode == 'sharded':
+        processes = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        asyncio.run(run_with_universes(lambda: coordinated_scan_sharded(processes), ENABLED_EXCHANGES))
+    elif mode == 'coordinator':
+        # 新增合约检测由协调节点统一负责，下一轮按新列表分片
+        asyncio.run(run_with_universes(coordinated_scan_cluster, ['binance', 'bybit', 'gateio']))
+    elif mode == 'worker':
+        address = sys.argv[2] if len(sys.argv) > 2 else f"{COORDINATOR_HOST}:{COORDINATOR_PORT}"
+        host, port = address.rsplit(':', 1)
+        asyncio.run(ScanWorker(scan_slice, host, int(port)).run())
+    else:
+        asyncio.run(run_with_universes(coordinated_scan, ENABLED_EXCHANGES))
@@ -1,141 +1,144 @@
 import asyncio
 from datetime import datetime, timedelta
+from functools import partial
 
-import aiohttp
-import pandas as pd
-import requests
 import numpy as np
 
-symbols_list = []
+from bar import Bar, bar_from_binance
+from bar_clock import BarCloseScheduler, collect_closed, get_clock
+from http_pool import get_session
+from kline_buffer import BINANCE_KLINES_URL, INTERVAL_MS, KlineBufferPool
+from notify import JournalBackend, Notifier, PushPlusBackend
+from rate_limit import get_limiter, kline_weight_binance
+from rolling_boll import BollingerEngine
+from screener import boll_screen_mask, bollinger_position
+from symbol_universe import binance_universe
+from timeframes import BASE_INTERVAL, MultiTimeframe
+
+SCAN_INTERVALS = ['15m']  # 扫描的周期，可加 '5m'；均由基础周期K线本地合成，每轮每个交易对只请求一次
+# 基础周期缓冲区：覆盖相邻两次扫描之间的全部基础K线，合成不缺段
+BASE_CAPACITY = max(INTERVAL_MS[interval] for interval in SCAN_INTERVALS) // INTERVAL_MS[BASE_INTERVAL] + 2
+
+symbols_universe = binance_universe()  # USDT合约交易对快照，后台定时刷新
 symbols_have_res = set()
-
-
-async def push_wechat(msg):
-    token = "2fb9c4804bd8400684d60e4905365978"  # 从PushPlus官网获取
-    url = f"https://www.pushplus.plus/send?token={token}&title=涨跌幅提醒&content={msg}"
-    requests.get(url)
-
-
-def get_all_futures_symbols_sync():
-    """同步获取所有USDT合约交易对"""
-    url = "https://fapi.binance.com/fapi/v1/exchangeInfo"
-    response = requests.get(url)
-    data = response.json()
-    global symbols_list
-    symbols_list = [s['symbol'] for s in data['symbols'] if 'USDT' in s['symbol']]
-
-
-def calculate_bollinger_bands(prices, window=20, std_dev=2):
-    """计算布林带中轨、上轨、下轨"""
-    if len(prices) < window:
-        return None, None, None
-    sma = np.mean(prices[-window:])
-    std = np.std(prices[-window:])
-    return sma, sma + std_dev * std, sma - std_dev * std
-
-
-async def get_7d_high_low(session, symbol):
-    """获取过去7天的最高价和最低价（基于日线）"""
-    url = "https://fapi.binance.com/fapi/v1/klines"
-    params = {
-        'symbol': symbol,
-        'interval': '1d',  # 日线级别
-        'limit': 8  # 最近7天
-    }
-    async with session.get(url, params=params) as response:
-        data = await response.json()
-        highs = [float(kline[2]) for kline in data[:-1]]  # 最高价数组
-        lows = [float(kline[3]) for kline in data[:-1]]  # 最低价数组
-        closes = [float(kline[4]) for kline in data[:-1]]  # 收盘价数组
-        return max(closes), min(closes), float(data[-1][2]), float(data[-1][3])  # 返回过去7天最高价和最低价
-
-
-async def get_closed_kline(session, symbol, interval):
-    """异步获取最近一根已闭合的5分钟K线"""
-    url = "https://fapi.binance.com/fapi/v1/klines"
-    params = {
-        'symbol': symbol,
-        'interval': interval,
-        'limit': 21  # 获取最近21根K线
-    }
-    async with session.get(url, params=params) as response:
-        data = await response.json()
-        if len(data) < 2:
-            return None
-
-        latest_kline = data[-1]
-        prev_kline = data[-2]
-
-        # 获取K线收盘时间的分钟数（UTC时间）
-        latest_close_time = pd.to_datetime(latest_kline[6], unit='ms')
-        prev_close_time = pd.to_datetime(prev_kline[6], unit='ms')
-        closes = [float(kline[4]) for kline in data]
-
-        # 获取当前时间的分钟数（UTC时间）
-        current_time = datetime.utcnow()
-
-        # 仅当当前分钟等于收盘时间的分钟时才返回数据
-        if current_time < latest_close_time:
-            res_kline = prev_kline
-            # _, high_band, lower_band = calculate_bollinger_bands(closes[0:-1])
-        else:
-            res_kline = latest_kline
-            # _, high_band, lower_band = calculate_bollinger_bands(closes[1:])
-
-        open_price = float(res_kline[1])
-        close_price = float(res_kline[4])
-
-        # 计算涨跌幅
-        price_change = (close_price - open_price) / open_price * 100
-        seven_day_high, seven_day_low, today_high, today_low = await get_7d_high_low(session, symbol)
-
-        return {
-            'symbol': symbol,
-            'open_time': pd.to_datetime(res_kline[0], unit='ms'),
-            'close_time': pd.to_datetime(res_kline[6], unit='ms'),
-            'close': close_price,
-            # 'lower_band': lower_band,
-            # 'high_band': high_band,
-            '7d_high': seven_day_high,
-            '7d_low': seven_day_low,
-            'today_high': today_high,
-            'today_low': today_low,
-            'price_change': price_change,  # 涨跌幅百分比
-        }
-
-
-async def scan_symbol(session, symbol, results, interval):
-    """异步扫描单个交易对"""
-    try:
-        kline = await get_closed_kline(session, symbol, interval)
-        change = 5 if interval == '5m' else 9
-        if (kline and
-                (kline['price_change'] >= change
-                 # and kline['close'] > kline['high_band']
-                #  and kline['today_high'] > kline['7d_high']
-                 ) or
-                (kline['price_change'] <= 0 - change
-                #  and kline['close'] < kline['lower_band'] 
-                 and kline['today_low'] < kline['7d_low'])):
-            results.append(kline)
-    except Exception as e:
-        pass
-
-
-async def scan_high_change_contracts(interval):
-    """并发扫描所有合约"""
-    async with aiohttp.ClientSession() as session:
-        global symbols_list
-        results = []
-        tasks = [scan_symbol(session, symbol, results, interval) for symbol in symbols_list]
-        await asyncio.gather(*tasks)  # 并发执行所有任务
-
-        if not results:
-            print("未找到符合条件的合约")
-            return None
-
-        # 直接返回结果列表，不进行排序
-        return results
+kline_buffers = KlineBufferPool(limiter=get_limiter('binance'))  # 每个交易对的基础周期K线缓冲区，跨扫描周期复用
+# 扫描周期 + 日线（7日高低点），只在启动时按周期初始化一次
+timeframes = MultiTimeframe(list(dict.fromkeys(SCAN_INTERVALS + ['1d'])), capacity={'1d': 8})
+boll_engine = BollingerEngine()  # 每个(交易对, 周期)的滚动布林带，每根新K线O(1)更新
+BOLL_FILTER = False  # 是否叠加布林带突破条件（上涨需收于上轨之上，下跌需收于下轨之下）
+
+
+class BollKline(Bar):
+    """布林扫描用的K线记录：在Bar基础上附带交易对、布林带与7日高低点"""
+
+    __slots__ = ('symbol', 'lower_band', 'high_band', 'high_7d', 'low_7d', 'today_high', 'today_low')
+
+
+notifier = Notifier([PushPlusBackend("2fb9c4804bd8400684d60e4905365978"),  # token从PushPlus官网获取
+                     JournalBackend()])
+
+
+def due_intervals(close_ms):
+    """在close_ms收盘的扫描周期"""
+    return [interval for interval in SCAN_INTERVALS if close_ms % INTERVAL_MS[interval] == 0]
+
+
+def push_wechat(msg):
+    """入队后由后台合并发送，失败自动重试"""
+    notifier.notify('涨跌幅提醒', msg)
+
+
+async def seed_timeframes(session, symbol):
+    """首次遇到交易对时每个周期请求一次历史K线，初始化本地合成与布林带（之后只请求基础周期）"""
+    now_ms = get_clock('binance').now_ms()
+    for interval in timeframes.intervals:
+        params = {'symbol': symbol, 'interval': interval, 'limit': timeframes.capacity[interval] + 1}
+        data = await get_limiter('binance').get_json(session, BINANCE_KLINES_URL, params,
+                                                     weight=kline_weight_binance(params['limit']))
+        timeframes.seed(symbol, interval, [bar_from_binance(k) for k in data], now_ms)
+        boll_engine.update_many(symbol, interval,
+                                ((bar.close_time, bar.close) for bar in timeframes.series(symbol, interval).closed))
+
+
+def get_7d_high_low(symbol, open_time):
+    """K线所在UTC日之前7天日线收盘价的最高/最低，以及当日截至该K线的最高/最低（本地合成的日线）"""
+    day = timeframes.series(symbol, '1d')
+    closes = [bar.close for bar in day.closed_before(open_time, 7)]
+    today = day.bar_at(open_time)
+    return (max(closes, default=float('nan')), min(closes, default=float('nan')),
+            today.high if today else float('nan'), today.low if today else float('nan'))
+
+
+async def get_closed_kline(session, symbol, close_ms):
+    """请求一次基础周期K线（增量，每轮只拉取最新几根）并合成各周期，返回 {周期: 在close_ms收盘的K线}；
+    尚未定稿时返回None"""
+    buf = await kline_buffers.refresh(session, symbol, BASE_INTERVAL, BASE_CAPACITY)
+    # 交易所已开出下一根K线时目标K线才算定稿，否则交给调度器重新请求
+    if len(buf) < 2 or buf.last_open_time < close_ms:
+        return None
+    if not timeframes.seeded(symbol):
+        await seed_timeframes(session, symbol)
+
+    # 合成后新收盘的K线推入各周期的滚动布林带
+    closed = timeframes.update(symbol, [buf.bar(i) for i in range(buf.closed_count(close_ms))])
+    for interval, bars in closed.items():
+        boll_engine.update_many(symbol, interval, ((bar.close_time, bar.close) for bar in bars))
+
+    klines = {}
+    for interval in due_intervals(close_ms):
+        series = timeframes.series(symbol, interval)
+        bar = series.bar_at(close_ms - INTERVAL_MS[interval])
+        if bar is None or bar is series.current:
+            continue
+        _, high_band, lower_band = boll_engine.bands(symbol, interval)
+        kline = BollKline(*bar.as_tuple())
+        kline.symbol = symbol
+        kline.lower_band = lower_band
+        kline.high_band = high_band
+        kline.high_7d, kline.low_7d, kline.today_high, kline.today_low = get_7d_high_low(symbol, bar.open_time)
+        klines[interval] = kline
+    return klines
+
+
+async def fetch_closed(session, symbol, close_ms):
+    """异步获取单个交易对数据，筛选统一在 scan_high_change_contracts 中向量化完成"""
+    return symbol, await get_closed_kline(session, symbol, close_ms)
+
+
+def screen_klines(klines, interval):
+    """对所有交易对的结果一次性计算筛选条件，返回命中的K线"""
+    if not klines:
+        return []
+    change = 5 if interval == '5m' else 9
+    mask = boll_screen_mask(
+        np.array([k.body_change for k in klines]), change,
+        today_low=np.array([k.today_low for k in klines]),
+        low_7d=np.array([k.low_7d for k in klines]),
+        # today_high=np.array([k.today_high for k in klines]),
+        # high_7d=np.array([k.high_7d for k in klines]),
+        band_pos=bollinger_position(
+            np.array([k.close for k in klines]),
+            np.array([np.nan if k.lower_band is None else k.lower_band for k in klines]),
+            np.array([np.nan if k.high_band is None else k.high_band for k in klines]),
+        ) if BOLL_FILTER else None,
+    )
+    return [klines[i] for i in np.flatnonzero(mask)]
+
+
+async def scan_high_change_contracts(close_ms):
+    """并发请求所有合约（每个交易对一次），未定稿的交易对单独重新请求；按本轮收盘的各周期分别筛选，返回 {周期: 命中K线}"""
+    session = get_session('binance')
+    pairs = await collect_closed(partial(fetch_closed, session), symbols_universe.symbols, close_ms)
+
+    results = {}
+    for interval in due_intervals(close_ms):
+        hits = screen_klines([klines[interval] for _, klines in pairs if interval in klines], interval)
+        if hits:
+            # 直接返回结果列表，不进行排序
+            results[interval] = hits
+    if not results:
+        print("未找到符合条件的合约")
+    return results
 
 
 async def reset_symbols_have_res():
@@ -154,45 +157,38 @@ async def reset_symbols_have_res():
         print(f"已重置symbols_have_res集合，时间: {datetime.now()}")
 
 
-async def periodic_scan(interval):
-    """每隔interval分钟执行一次扫描"""
+async def periodic_scan():
+    """按Binance服务器时间，在最小扫描周期的每根K线收盘后立即扫描本轮收盘的全部周期"""
+    scan_ms = min(INTERVAL_MS[interval] for interval in SCAN_INTERVALS)
+    scheduler = BarCloseScheduler(get_clock('binance'), interval_ms=scan_ms, warm_up=['binance'])
     while True:
-        now = datetime.now()
-        gap = 5 if interval == '5m' else 15
-        next_scan = (
-                now.replace(second=0, microsecond=0)
-                + timedelta(minutes=(gap - now.minute % gap))
-        )
-
-        delay = (next_scan - now).total_seconds()
-        if delay > 0:
-            await asyncio.sleep(delay)
-        print(f"{interval}开始扫描，时间: {datetime.now()}")
+        close_ms = await scheduler.wait_next_close()
+        print(f"{','.join(due_intervals(close_ms))}开始扫描，时间: {datetime.now()}")
         try:
-            high_change_klines = await scan_high_change_contracts(interval)
-            if high_change_klines is not None:
+            for interval, high_change_klines in (await scan_high_change_contracts(close_ms)).items():
                 # 直接输出结果，不转换为DataFrame
-                msg = interval + ",".join([kline['symbol'] for kline in high_change_klines])
+                msg = ",".join(f"{kline.symbol}: {interval}" for kline in high_change_klines)
 
                 for kline in high_change_klines:
-                    print(' '.join([str(value) for value in kline.values()]))
-                # if kline['symbol'] not in symbols_have_res:
-                # direction = "上涨" if kline['price_change'] >= 0 else "下跌"
-                # msg += f"{kline['symbol']}: {direction} {abs(kline['price_change']):.2f}%"
-                # symbols_have_res.add(kline['symbol'])
+                    print(kline)
+                # if kline.symbol not in symbols_have_res:
+                # direction = "上涨" if kline.body_change >= 0 else "下跌"
+                # msg += f"{kline.symbol}: {direction} {abs(kline.body_change):.2f}%"
+                # symbols_have_res.add(kline.symbol)
 
                 print(msg)
-                await push_wechat(msg)
+                push_wechat(msg)
         except Exception as e:
             print(f"Error scan process: {str(e)}")
 
 
 # 运行事件循环
+async def main():
+    """拉取交易对快照并启动后台刷新，然后同时运行各周期扫描"""
+    await symbols_universe.warm_start()  # 有本地快照时不阻塞
+    symbols_universe.start()
+    await periodic_scan()
+
+
 if __name__ == "__main__":
-    get_all_futures_symbols_sync()
-    loop = asyncio.get_event_loop()
-    # 同时运行两个协程
-    loop.run_until_complete(asyncio.gather(
-        periodic_scan('15m'),
-        # periodic_scan('5m')
-    ))
+    asyncio.run(main())
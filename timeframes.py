@@ -0,0 +1,145 @@
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Mapping, Optional, Sequence, Union
+
+from bar import Bar
+from kline_buffer import INTERVAL_MS
+
+DAY_MS = 86_400_000
+BASE_INTERVAL = '5m'
+DEFAULT_CAPACITY = 21  # 每个周期保留的已收盘K线数（布林带20根+1）
+
+
+def bucket_start(open_time: int, interval_ms: int) -> int:
+    """所属大周期K线的开盘时间；毫秒时间戳以UTC零点为起点，1d及以下周期直接向下取整即与交易所对齐"""
+    return open_time // interval_ms * interval_ms
+
+
+# region 单周期序列
+class TimeframeSeries:
+    """单个交易对单个周期：已收盘K线（定长）+ 正在由基础K线合成的当前K线"""
+
+    def __init__(self, interval_ms: int, base_ms: int, capacity: int = DEFAULT_CAPACITY):
+        self.interval_ms = interval_ms
+        self.base_ms = base_ms
+        self.closed: Deque[Bar] = deque(maxlen=capacity)
+        self.current: Optional[Bar] = None
+        self.seeded_until = 0  # 初始化时交易所K线已包含的成交截止时间，之前收盘的基础K线不再合并
+
+    def seed(self, bars: Iterable[Bar], now_ms: int) -> None:
+        """用交易所返回的本周期K线初始化（仅启动或缺口过大时），未收盘的一根作为当前K线继续合成"""
+        self.closed.clear()
+        self.current = None
+        for bar in sorted(bars, key=lambda b: b.open_time):
+            if bar.close_time < now_ms:
+                self.closed.append(bar)
+            else:
+                self.current = Bar(*bar.as_tuple())
+        self.seeded_until = now_ms
+
+    def update(self, bar: Bar) -> Optional[Bar]:
+        """合并一根已收盘的基础K线，恰好补齐本周期最后一段时返回收盘的K线"""
+        if bar.close_time < self.seeded_until:
+            return None
+        start = bucket_start(bar.open_time, self.interval_ms)
+        closed = None
+        if self.current is not None and self.current.open_time != start:
+            # 中间缺了基础K线（停牌/断线），上一根按已有数据收盘
+            if self.current.open_time < start:
+                closed = self._close_current()
+            else:
+                return None
+        if self.current is None:
+            if self.closed and self.closed[-1].open_time >= start:
+                return closed  # 该周期已收盘（重复的基础K线）
+            self.current = Bar(start, bar.open, bar.high, bar.low, bar.close, bar.volume,
+                               start + self.interval_ms - 1)
+        else:
+            cur = self.current
+            cur.high = max(cur.high, bar.high)
+            cur.low = min(cur.low, bar.low)
+            cur.close = bar.close
+            cur.volume += bar.volume
+        if bar.open_time + self.base_ms >= start + self.interval_ms:
+            closed = self._close_current()
+        return closed
+
+    def _close_current(self) -> Bar:
+        bar, self.current = self.current, None
+        self.closed.append(bar)
+        return bar
+
+    def bar_at(self, open_time: int) -> Optional[Bar]:
+        """包含open_time的本周期K线（当前合成中的或已收盘的）"""
+        start = bucket_start(open_time, self.interval_ms)
+        if self.current is not None and self.current.open_time == start:
+            return self.current
+        for bar in reversed(self.closed):
+            if bar.open_time == start:
+                return bar
+            if bar.open_time < start:
+                break
+        return None
+
+    def closed_before(self, open_time: int, n: int) -> List[Bar]:
+        """包含open_time的那根K线之前最近n根已收盘K线（旧→新）"""
+        start = bucket_start(open_time, self.interval_ms)
+        bars = [bar for bar in self.closed if bar.open_time < start]
+        return bars[-n:]
+
+
+# endregion
+
+# region 多周期合成
+class MultiTimeframe:
+    """由单一基础周期（1m或5m）的已收盘K线在本地合成多个周期（如5m/15m/1h/1d），
+    每个交易对每轮只需请求一次基础周期；各周期只在启动时用交易所数据初始化一次"""
+
+    def __init__(self, intervals: Sequence[str], base_interval: str = BASE_INTERVAL,
+                 capacity: Union[int, Mapping[str, int]] = DEFAULT_CAPACITY):
+        self.base_interval = base_interval
+        self.base_ms = INTERVAL_MS[base_interval]
+        for interval in intervals:
+            interval_ms = INTERVAL_MS[interval]
+            if interval_ms % self.base_ms or DAY_MS % interval_ms:
+                raise ValueError(f"{interval}无法由{base_interval}按UTC对齐合成")
+        self.intervals = list(intervals)
+        self.capacity = {i: capacity if isinstance(capacity, int) else capacity.get(i, DEFAULT_CAPACITY)
+                         for i in self.intervals}
+        self._series: Dict[str, Dict[str, TimeframeSeries]] = {}
+        self._last_base: Dict[str, int] = {}  # 交易对 -> 已合并的最后一根基础K线开盘时间
+
+    def seeded(self, symbol: str) -> bool:
+        return symbol in self._series and len(self._series[symbol]) == len(self.intervals)
+
+    def seed(self, symbol: str, interval: str, bars: Iterable[Bar], now_ms: int) -> None:
+        series = self._series.setdefault(symbol, {})
+        if interval not in series:
+            series[interval] = TimeframeSeries(INTERVAL_MS[interval], self.base_ms, self.capacity[interval])
+        series[interval].seed(bars, now_ms)
+
+    def update(self, symbol: str, base_bars: Iterable[Bar]) -> Dict[str, List[Bar]]:
+        """合并已收盘的基础K线（可重复传入，已合并的自动跳过），返回各周期新收盘的K线"""
+        series = self._series.get(symbol, {})
+        closed: Dict[str, List[Bar]] = {interval: [] for interval in series}
+        last = self._last_base.get(symbol)
+        for bar in sorted(base_bars, key=lambda b: b.open_time):
+            if last is not None and bar.open_time <= last:
+                continue
+            last = bar.open_time
+            for interval, s in series.items():
+                done = s.update(bar)
+                if done is not None:
+                    closed[interval].append(done)
+        if last is not None:
+            self._last_base[symbol] = last
+        return closed
+
+    def series(self, symbol: str, interval: str) -> TimeframeSeries:
+        return self._series[symbol][interval]
+
+    def discard(self, symbol: str) -> None:
+        self._series.pop(symbol, None)
+        self._last_base.pop(symbol, None)
+
+
+# endregion
@@ -0,0 +1,129 @@
+import argparse
+import csv
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from trade_report import TradeArrays, group_stats, load_trades
+from trade_store import DB_FILE, TradeStore
+
+# 扫描脚本在仓库根目录运行，告警日志写在那里（见 notify.JournalBackend）
+ALERT_JOURNAL = os.path.join(os.pardir, "alert_journal.csv")
+MAX_LAG_MINUTES = 240  # 交易时间距告警超过该时长不算告警触发，0为不限
+ALERT, OTHER = "告警触发", "其他"
+
+AlertIndex = Dict[str, Tuple[np.ndarray, np.ndarray]]  # 交易对 -> (按时间排序的告警时间, 对应来源)
+
+
+def normalize_symbol(symbol: str) -> str:
+    """统一交易对写法：Gate.io的 BTC_USDT 与交易记录中的 BTCUSDT 视为同一个"""
+    return symbol.strip().upper().replace("_", "").replace("-", "")
+
+
+# region 告警索引
+def load_alerts(path: str = ALERT_JOURNAL) -> AlertIndex:
+    """读取告警日志，按交易对建立有序时间索引（日志基本按时间追加，稳定排序几乎不移动）"""
+    times: Dict[str, List[str]] = {}
+    sources: Dict[str, List[str]] = {}
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if len(row) < 3:
+                continue
+            symbol = normalize_symbol(row[2])
+            times.setdefault(symbol, []).append(row[0])
+            sources.setdefault(symbol, []).append(row[1])
+    index: AlertIndex = {}
+    for symbol, ts in times.items():
+        t = np.array(ts, dtype="datetime64[s]")
+        order = np.argsort(t, kind="stable")
+        index[symbol] = (t[order], np.array(sources[symbol])[order])
+    return index
+
+
+def match_alerts(trades: TradeArrays, alerts: AlertIndex,
+                 max_lag_minutes: int = MAX_LAG_MINUTES) -> Tuple[np.ndarray, np.ndarray]:
+    """为每笔交易找同一交易对在其之前（含同一秒）最近的一条告警：按交易对分组后二分查找，
+    返回 (告警到交易的间隔秒数，无匹配为NaN, 告警来源，无匹配为空串)"""
+    lag = np.full(len(trades), np.nan)
+    source = np.full(len(trades), "", dtype=object)
+    if not len(trades) or not alerts:
+        return lag, source
+    pairs, inverse = np.unique(trades.pair, return_inverse=True)
+    by_pair = np.argsort(inverse, kind="stable")
+    bounds = np.searchsorted(inverse[by_pair], np.arange(len(pairs) + 1))
+    for k, pair in enumerate(pairs):
+        entry = alerts.get(normalize_symbol(pair))
+        if entry is None:
+            continue
+        alert_times, alert_sources = entry
+        idx = by_pair[bounds[k]:bounds[k + 1]]
+        pos = np.searchsorted(alert_times, trades.time[idx], side="right") - 1
+        found = pos >= 0
+        idx, pos = idx[found], pos[found]
+        seconds = (trades.time[idx] - alert_times[pos]).astype(np.int64)
+        if max_lag_minutes:
+            keep = seconds <= max_lag_minutes * 60
+            idx, pos, seconds = idx[keep], pos[keep], seconds[keep]
+        lag[idx] = seconds
+        source[idx] = alert_sources[pos]
+    return lag, source
+
+
+# endregion
+
+def summarize_alerts(trades: TradeArrays, lag: np.ndarray, source: np.ndarray) -> dict:
+    matched = ~np.isnan(lag)
+    kind = np.where(matched, ALERT, OTHER)
+    return {
+        "count": len(trades),
+        "matched": int(matched.sum()),
+        "median_lag_min": float(np.median(lag[matched]) / 60) if matched.any() else None,
+        "by_kind": group_stats(kind, trades.profit, trades.win),
+        "by_source": group_stats(source[matched].astype(str), trades.profit[matched], trades.win[matched]),
+    }
+
+
+def print_alert_report(report: dict) -> None:
+    print("\n=== 告警关联 ===")
+    if not report["count"]:
+        print("没有交易记录")
+        return
+    lag = report["median_lag_min"]
+    print(f"共 {report['count']} 笔交易，其中 {report['matched']} 笔之前有同一交易对的告警"
+          + (f"（告警到交易中位 {lag:.0f} 分钟）" if lag is not None else ""))
+    for title, groups in (("告警触发 vs 其他", report["by_kind"]), ("按告警来源", report["by_source"])):
+        print(f"\n【{title}】")
+        for g in groups:
+            print(f"{g['key']:<12} {g['count']:>6}笔 | 胜率: {g['win_rate'] * 100:5.1f}% | "
+                  f"净收益: ${g['net']:+,.2f} | 平均: ${g['mean']:+,.2f}")
+
+
+def show_alert_report(store: TradeStore, journal: str = ALERT_JOURNAL, max_lag_minutes: int = MAX_LAG_MINUTES,
+                      start: Optional[str] = None, end: Optional[str] = None) -> dict:
+    trades = load_trades(store, start, end)
+    alerts = load_alerts(journal)
+    if not alerts:
+        print(f"未找到告警日志或日志为空: {journal}")
+    report = summarize_alerts(trades, *match_alerts(trades, alerts, max_lag_minutes))
+    print_alert_report(report)
+    return report
+
+
+if __name__ == "__main__":
+    # 用法: python alert_join.py --journal ../alert_journal.csv --max-lag 240
+    parser = argparse.ArgumentParser(description="把交易记录与扫描告警按时间关联，比较告警触发的交易与其他交易的盈亏")
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--journal", default=ALERT_JOURNAL)
+    parser.add_argument("--max-lag", type=int, default=MAX_LAG_MINUTES, help="告警后多少分钟内的交易算告警触发，0为不限")
+    parser.add_argument("--start", help="起始时间（含）")
+    parser.add_argument("--end", help="结束时间（不含）")
+    args = parser.parse_args()
+
+    store = TradeStore(args.db, legacy_json=None)
+    show_alert_report(store, args.journal, args.max_lag, args.start, args.end)
+    store.close()
@@ -0,0 +1,51 @@
+import unittest
+
+from trade_import import Fill, RoundTripBuilder
+
+
+def fill(trade_id: str, side: str, qty: float, realized: float = 0.0, symbol: str = "BTCUSDT",
+         position_side: str = "") -> Fill:
+    return Fill(f"2025-01-01 00:00:{int(trade_id):02d}", symbol, side, qty, realized, 0.0, trade_id, position_side)
+
+
+class RoundTripBuilderTest(unittest.TestCase):
+    def setUp(self):
+        self.builder = RoundTripBuilder(to_local=False)
+
+    def trips(self, fills):
+        return [r for r in map(self.builder.add, fills) if r is not None]
+
+    def test_round_trip(self):
+        trips = self.trips([fill("1", "BUY", 1), fill("2", "SELL", 1, 30.0)])
+        self.assertEqual([(t["direction"], t["result"], t["profit"]) for t in trips], [("long", "WIN", 30.0)])
+        self.assertEqual(self.builder.positions, {})
+
+    def test_close_without_open_is_skipped(self):
+        # 导出从持仓中途开始：第一笔是平仓（已实现+50），随后是一笔完整的多单往返（-20）
+        trips = self.trips([fill("1", "SELL", 1, 50.0), fill("2", "BUY", 1), fill("3", "SELL", 1, -20.0)])
+        self.assertEqual([(t["direction"], t["result"], t["profit"]) for t in trips], [("long", "LOSE", -20.0)])
+        self.assertEqual(self.builder.untracked_closes, 1)
+        self.assertEqual(self.builder.positions, {})
+
+    def test_partial_closes_without_open_are_skipped(self):
+        trips = self.trips([fill("1", "SELL", 1, 10.0), fill("2", "SELL", 1, 5.0),
+                            fill("3", "SELL", 2), fill("4", "BUY", 2, 8.0)])
+        self.assertEqual([(t["direction"], t["profit"]) for t in trips], [("short", 8.0)])
+        self.assertEqual(self.builder.untracked_closes, 2)
+
+    def test_break_even_close_without_open_is_skipped(self):
+        # 双向持仓：多仓卖出即为平仓，即使已实现盈亏恰好为0
+        trips = self.trips([fill("1", "SELL", 1, 0.0, position_side="LONG"),
+                            fill("2", "BUY", 1, position_side="LONG"), fill("3", "SELL", 1, 15.0, position_side="LONG"),
+                            fill("4", "BUY", 1, 0.0, position_side="SHORT")])
+        self.assertEqual([(t["direction"], t["profit"]) for t in trips], [("long", 15.0)])
+        self.assertEqual(self.builder.untracked_closes, 2)
+        self.assertEqual(self.builder.positions, {})
+
+    def test_flip(self):
+        trips = self.trips([fill("1", "BUY", 1), fill("2", "SELL", 3, 12.0), fill("3", "BUY", 2, -4.0)])
+        self.assertEqual([(t["direction"], t["profit"]) for t in trips], [("long", 12.0), ("short", -4.0)])
+
+
+if __name__ == "__main__":
+    unittest.main()
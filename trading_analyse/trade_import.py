@@ -0,0 +1,294 @@
+import argparse
+import csv
+import os
+import re
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from trade_store import DB_FILE, TradeRecord, TradeStore
+
+BATCH_SIZE = 5000  # 每批写入的往返交易数
+READ_BLOCK = 1 << 20  # 倒序读取时每次读入的字节数
+RECENT_IDS = 10_000  # 记住最近多少个成交ID用于文件内去重（内存恒定）
+QTY_EPS = 1e-9
+QUOTE_ASSETS = {"USDT", "USDC", "BUSD", "FDUSD"}  # 手续费以这些币计时直接从盈亏中扣除
+
+# 导出文件列名（去掉非字母并转小写后）-> 字段
+COLUMN_ALIASES = {
+    "time": ("dateutc", "time", "date", "datetime"),
+    "symbol": ("symbol", "pair"),
+    "side": ("side",),
+    "qty": ("quantity", "qty", "executedqty", "executed"),
+    "realized": ("realizedprofit", "realizedpnl"),
+    "fee": ("fee", "commission"),
+    "fee_coin": ("feecoin", "feeasset", "commissionasset"),
+    "trade_id": ("tradeid", "id"),
+    "position_side": ("positionside",),
+}
+REQUIRED = ("time", "symbol", "side", "qty", "realized")
+
+_NUMBER = re.compile(r"[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?")
+
+
+class Fill(NamedTuple):
+    time: str
+    symbol: str
+    side: str  # BUY / SELL
+    qty: float
+    realized: float
+    fee: float  # 已按手续费币种折算：非计价币的手续费记为0
+    trade_id: str
+    position_side: str  # 双向持仓模式为LONG/SHORT，单向为空或BOTH
+
+
+# region 读取
+def _number(text: str) -> float:
+    try:
+        return float(text)
+    except ValueError:  # 部分导出带单位，如 "0.010BTC"
+        match = _NUMBER.match(text.strip().replace(",", ""))
+        return float(match.group()) if match else 0.0
+
+
+def _parse_utc(text: str) -> datetime:
+    text = text.strip()
+    if text.isdigit():
+        return datetime.fromtimestamp(int(text) / (1000 if len(text) > 10 else 1), timezone.utc)
+    return datetime.fromisoformat(text).replace(tzinfo=timezone.utc)
+
+
+def _column_index(header: List[str]) -> Dict[str, int]:
+    normalized = [re.sub(r"[^a-z]", "", h.lower()) for h in header]
+    index = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in normalized:
+                index[field] = normalized.index(alias)
+                break
+    missing = [f for f in REQUIRED if f not in index]
+    if missing:
+        raise ValueError(f"无法识别的导出格式，缺少列: {missing}（表头: {header}）")
+    return index
+
+
+def _lines_reversed(path: str, block: int = READ_BLOCK) -> Iterator[str]:
+    """从文件末尾按块倒序逐行读取（不含表头之外的整文件载入）"""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos, tail = f.tell(), b""
+        while pos > 0:
+            size = min(block, pos)
+            pos -= size
+            f.seek(pos)
+            lines = (f.read(size) + tail).split(b"\n")
+            tail = lines.pop(0)  # 块首可能是半行，留到下一块拼接
+            for line in reversed(lines):
+                if line.strip():
+                    yield line.decode("utf-8")
+        if tail.strip():
+            yield tail.decode("utf-8-sig")
+
+
+def _edge_rows(path: str) -> Tuple[List[str], Optional[List[str]], Optional[List[str]]]:
+    """表头、第一行与最后一行数据（用于判断导出是正序还是倒序）"""
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        first = next(reader, None)
+    with closing(_lines_reversed(path)) as lines:
+        last = next(csv.reader(lines), None)
+    return header, first, (last if last != header else None)
+
+
+def iter_fills(path: str) -> Iterator[Fill]:
+    """按成交时间正序逐行产出成交（币安导出通常为倒序，此时从文件尾部倒读），内存占用与文件大小无关"""
+    header, first, last = _edge_rows(path)
+    if first is None:
+        return
+    col = _column_index(header)
+    descending = last is not None and _parse_utc(first[col["time"]]) > _parse_utc(last[col["time"]])
+    source = _lines_reversed(path) if descending else open(path, "r", encoding="utf-8-sig", newline="")
+    time_i, symbol_i, side_i, qty_i, realized_i = (col[f] for f in REQUIRED)
+    fee_i, coin_i, id_i, pos_i = (col.get(f, -1) for f in ("fee", "fee_coin", "trade_id", "position_side"))
+    width = max(col.values()) + 1
+    with closing(source):
+        rows = csv.reader(source)
+        if not descending:
+            next(rows)
+        for row in rows:
+            if len(row) < width or row == header:
+                continue
+            try:
+                qty, realized = float(row[qty_i]), float(row[realized_i])
+                fee = float(row[fee_i]) if fee_i >= 0 else 0.0
+            except ValueError:  # 带单位或千分位的数字走慢路径
+                qty, realized = _number(row[qty_i]), _number(row[realized_i])
+                fee = _number(row[fee_i]) if fee_i >= 0 else 0.0
+            if fee and coin_i >= 0 and row[coin_i] and row[coin_i].strip().upper() not in QUOTE_ASSETS:
+                fee = 0.0
+            yield Fill(row[time_i], row[symbol_i].strip().upper(), row[side_i].strip().upper(), abs(qty), realized,
+                       abs(fee), row[id_i].strip() if id_i >= 0 else "", row[pos_i].strip().upper() if pos_i >= 0 else "")
+
+
+# endregion
+
+# region 成交配对
+@dataclass
+class _Position:
+    net: float  # 带符号持仓数量，正为多
+    realized: float
+    fees: float
+    first_id: str
+
+
+class RoundTripBuilder:
+    """按交易对（双向持仓模式下再按持仓方向）累计成交，持仓归零时产出一笔往返交易；
+    一笔成交跨过零点（反手）时按数量拆分，平仓部分计入本笔，剩余部分开新仓"""
+
+    def __init__(self, exchange: str = "binance", to_local: bool = True):
+        self.exchange = exchange
+        self.to_local = to_local
+        self.positions: Dict[Tuple[str, str], _Position] = {}
+        self._recent: Set[str] = set()
+        self._previous: Set[str] = set()
+        self.duplicate_fills = 0
+        self.untracked_closes = 0  # 导出从持仓中途开始：找不到开仓记录的平仓成交
+        self._offsets: Dict[datetime, timedelta] = {}
+
+    def _seen(self, trade_id: str) -> bool:
+        """最近约RECENT_IDS~2*RECENT_IDS个成交ID内是否出现过（新旧两代集合轮换，内存恒定）"""
+        if trade_id in self._recent or trade_id in self._previous:
+            return True
+        self._recent.add(trade_id)
+        if len(self._recent) >= RECENT_IDS:
+            self._previous, self._recent = self._recent, set()
+        return False
+
+    def _local_time(self, utc_text: str) -> str:
+        """UTC成交时间转为 'YYYY-mm-dd HH:MM:SS'（默认本地时间，与手工记录一致）；时区偏移按小时缓存"""
+        if utc_text.isdigit():
+            utc = _parse_utc(utc_text).replace(tzinfo=None)
+        else:
+            utc = datetime.fromisoformat(utc_text.strip())
+        if not self.to_local:
+            return utc.isoformat(" ", "seconds")
+        hour = utc.replace(minute=0, second=0, microsecond=0)
+        offset = self._offsets.get(hour)
+        if offset is None:
+            if len(self._offsets) > RECENT_IDS:
+                self._offsets.clear()
+            offset = self._offsets[hour] = hour.replace(tzinfo=timezone.utc).astimezone().utcoffset()
+        return (utc + offset).isoformat(" ", "seconds")
+
+    def _record(self, symbol: str, pos: _Position, direction: str, close_time: str) -> TradeRecord:
+        profit = round(pos.realized - pos.fees, 2)
+        return {
+            "pair": symbol,
+            "direction": direction,
+            "result": "WIN" if profit > 0 else "LOSE",
+            "time": self._local_time(close_time),
+            "profit": profit,
+            "trade_id": f"{self.exchange}:{symbol}:{pos.first_id}",
+        }
+
+    @staticmethod
+    def _closing(fill: Fill) -> bool:
+        """没有持仓记录时判断成交是否为平仓：双向持仓模式按方向判断（多仓卖出、空仓买入即平仓，盈亏为0也算）；
+        单向持仓模式仅凭买卖方向无法区分开平，只能以有已实现盈亏为准"""
+        if fill.position_side == "LONG":
+            return fill.side == "SELL"
+        if fill.position_side == "SHORT":
+            return fill.side == "BUY"
+        return fill.realized != 0
+
+    def add(self, fill: Fill) -> Optional[TradeRecord]:
+        """加入一笔成交，若使某个持仓归零则返回该往返交易"""
+        if fill.qty <= 0:
+            return None
+        if fill.trade_id and self._seen(fill.trade_id):
+            self.duplicate_fills += 1
+            return None
+        qty = fill.qty if fill.side == "BUY" else -fill.qty
+        key = (fill.symbol, fill.position_side if fill.position_side in ("LONG", "SHORT") else "BOTH")
+        pos = self.positions.get(key)
+        if pos is None:
+            if self._closing(fill):
+                # 开仓在导出范围之前的平仓成交：无法还原完整往返交易，跳过，不能当作开仓
+                self.untracked_closes += 1
+                return None
+            self.positions[key] = _Position(qty, 0.0, fill.fee, fill.trade_id or fill.time)
+            return None
+        net = pos.net + qty
+        pos.realized += fill.realized
+        if abs(net) <= QTY_EPS or (net > 0) == (pos.net > 0):
+            pos.fees += fill.fee
+            if abs(net) > QTY_EPS:
+                pos.net = net
+                return None
+            del self.positions[key]
+            return self._record(fill.symbol, pos, "long" if pos.net > 0 else "short", fill.time)
+        # 反手：平掉原持仓，剩余数量按比例分摊手续费后开新仓（已实现盈亏只来自平仓部分）
+        closing = abs(pos.net) / abs(qty)
+        pos.fees += fill.fee * closing
+        record = self._record(fill.symbol, pos, "long" if pos.net > 0 else "short", fill.time)
+        self.positions[key] = _Position(net, 0.0, fill.fee * (1 - closing), fill.trade_id or fill.time)
+        return record
+
+
+# endregion
+
+def import_csv(store: TradeStore, path: str, batch_size: int = BATCH_SIZE, to_local: bool = True,
+               progress: Optional[Callable[[int, int], None]] = None) -> dict:
+    """流式导入币安合约成交历史CSV：成交配对为往返交易后分批写入，trade_id已存在的跳过"""
+    start = time.perf_counter()
+    builder = RoundTripBuilder(to_local=to_local)
+    batch: List[TradeRecord] = []
+    fills = trips = inserted = 0
+    with closing(iter_fills(path)) as stream:  # 中途出错时也立即关闭文件
+        for fill in stream:
+            fills += 1
+            record = builder.add(fill)
+            if record is None:
+                continue
+            trips += 1
+            batch.append(record)
+            if len(batch) >= batch_size:
+                inserted += store.add_many(batch)
+                batch.clear()
+                if progress:
+                    progress(fills, trips)
+    if batch:
+        inserted += store.add_many(batch)
+    return {
+        "fills": fills,
+        "duplicate_fills": builder.duplicate_fills,
+        "untracked_closes": builder.untracked_closes,  # 开仓在导出范围之前的平仓成交，不导入
+        "round_trips": trips,
+        "inserted": inserted,
+        "skipped": trips - inserted,  # 之前已导入过
+        "open_positions": len(builder.positions),  # 文件结束时仍未平仓，不导入
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+if __name__ == "__main__":
+    # 用法: python trade_import.py 导出文件1.csv [导出文件2.csv ...] --db trading_records.db
+    parser = argparse.ArgumentParser(description="导入币安合约成交历史CSV（按成交配对为往返交易，重复导入自动去重）")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--utc", action="store_true", help="保留UTC时间（默认转换为本地时间，与手工记录一致）")
+    args = parser.parse_args()
+
+    store = TradeStore(args.db)
+    for path in args.files:
+        summary = import_csv(store, path, args.batch_size, to_local=not args.utc,
+                             progress=lambda f, t: print(f"\r已处理 {f} 笔成交 / {t} 笔往返交易", end=""))
+        print(f"\n{path}: {summary['fills']}笔成交 → {summary['round_trips']}笔往返交易，"
+              f"新增 {summary['inserted']}，已存在 {summary['skipped']}，重复成交 {summary['duplicate_fills']}，"
+              f"无开仓记录的平仓 {summary['untracked_closes']}，"
+              f"未平仓 {summary['open_positions']}，耗时 {summary['seconds']}秒")
+    store.close()
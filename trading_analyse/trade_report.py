@@ -0,0 +1,175 @@
+import argparse
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from trade_store import DB_FILE, TradeStore
+
+WEEKDAYS = ("周一", "周二", "周三", "周四", "周五", "周六", "周日")
+
+
+# region 载入
+@dataclass
+class TradeArrays:
+    """按时间排序的交易记录列数组"""
+    pair: np.ndarray       # str
+    direction: np.ndarray  # str，LONG/SHORT
+    win: np.ndarray        # bool
+    time: np.ndarray       # datetime64[s]
+    profit: np.ndarray     # float64
+
+    def __len__(self) -> int:
+        return len(self.profit)
+
+
+def load_trades(store: TradeStore, start: Optional[str] = None, end: Optional[str] = None) -> TradeArrays:
+    cols = store.columns(start, end)
+    return TradeArrays(
+        pair=np.array(cols["pair"], dtype=str),
+        direction=np.char.upper(np.array(cols["direction"], dtype=str)),
+        win=np.array(cols["result"], dtype=str) == "WIN",
+        time=np.array(cols["time"], dtype="datetime64[s]"),
+        profit=np.array(cols["profit"], dtype=np.float64),
+    )
+
+
+# endregion
+
+# region 指标计算
+def equity_curve(profit: np.ndarray) -> np.ndarray:
+    return np.cumsum(profit)
+
+
+def max_drawdown(equity: np.ndarray) -> Tuple[float, int, int]:
+    """最大回撤金额及其起止位置（峰值所在交易序号, 谷底交易序号），起点权益按0计；无回撤时序号为-1"""
+    if len(equity) == 0:
+        return 0.0, -1, -1
+    curve = np.concatenate(([0.0], equity))
+    peak = np.maximum.accumulate(curve)
+    drawdown = peak - curve
+    trough = int(np.argmax(drawdown))
+    if drawdown[trough] <= 0:
+        return 0.0, -1, -1
+    top = int(np.flatnonzero(curve[:trough + 1] == peak[trough])[-1])
+    return float(drawdown[trough]), top - 1, trough - 1
+
+
+def streaks(win: np.ndarray) -> Dict[str, int]:
+    """最长连胜/连亏与当前连续（正数为连胜，负数为连亏）"""
+    if len(win) == 0:
+        return {"max_win": 0, "max_lose": 0, "current": 0}
+    starts = np.flatnonzero(np.concatenate(([True], win[1:] != win[:-1])))
+    lengths = np.diff(np.append(starts, len(win)))
+    run_win = win[starts]
+    return {
+        "max_win": int(lengths[run_win].max(initial=0)),
+        "max_lose": int(lengths[~run_win].max(initial=0)),
+        "current": int(lengths[-1] if run_win[-1] else -lengths[-1]),
+    }
+
+
+def group_stats(keys: np.ndarray, profit: np.ndarray, win: np.ndarray) -> List[dict]:
+    """按键分组的笔数、胜率、净收益与平均收益（np.unique + bincount，一次遍历）"""
+    if len(keys) == 0:
+        return []
+    labels, inverse = np.unique(keys, return_inverse=True)
+    count = np.bincount(inverse)
+    wins = np.bincount(inverse, weights=win)
+    net = np.bincount(inverse, weights=profit)
+    return [{"key": label.item(), "count": int(c), "win_rate": w / c, "net": n, "mean": n / c}
+            for label, c, w, n in zip(labels, count, wins, net)]
+
+
+def _fmt_time(t: np.datetime64) -> str:
+    return str(t).replace("T", " ")
+
+
+def summarize(trades: TradeArrays) -> dict:
+    profit, win = trades.profit, trades.win
+    equity = equity_curve(profit)
+    dd, dd_top, dd_bottom = max_drawdown(equity)
+    n = len(trades)
+    wins, losses = profit[win], profit[~win]
+    gross_loss = -losses.sum()
+    seconds = trades.time.astype(np.int64)
+    days = seconds // 86_400
+    return {
+        "count": n,
+        "win_rate": float(win.mean()) if n else 0.0,
+        "net": float(equity[-1]) if n else 0.0,
+        "avg_win": float(wins.mean()) if len(wins) else 0.0,
+        "avg_loss": float(losses.mean()) if len(losses) else 0.0,
+        "expectancy": float(profit.mean()) if n else 0.0,  # 胜率×平均盈利 + 败率×平均亏损
+        "profit_factor": float(wins.sum() / gross_loss) if gross_loss > 0 else float("inf"),
+        "max_drawdown": dd,
+        "drawdown_from": _fmt_time(trades.time[dd_top]) if dd_top >= 0 else None,  # None: 从起点开始回撤
+        "drawdown_to": _fmt_time(trades.time[dd_bottom]) if dd_bottom >= 0 else None,
+        "streaks": streaks(win),
+        "equity": equity,
+        "by_pair": group_stats(trades.pair, profit, win),
+        "by_direction": group_stats(trades.direction, profit, win),
+        "by_weekday": group_stats((days + 3) % 7, profit, win),  # 1970-01-01为周四
+        "by_hour": group_stats(seconds // 3600 % 24, profit, win),
+    }
+
+
+# endregion
+
+# region 输出
+def _print_groups(title: str, groups: List[dict], label=str) -> None:
+    print(f"\n=== {title} ===")
+    for g in groups:
+        print(f"{label(g['key']):<14} {g['count']:>6}笔 | 胜率: {g['win_rate'] * 100:5.1f}% | "
+              f"净收益: ${g['net']:+,.2f} | 平均: ${g['mean']:+,.2f}")
+
+
+def print_report(report: dict, top_pairs: int = 20) -> None:
+    if not report["count"]:
+        print("没有交易记录")
+        return
+    s = report["streaks"]
+    print("\n=== 绩效概览 ===")
+    print(f"总交易: {report['count']}笔 | 胜率: {report['win_rate'] * 100:.1f}% | 净收益: ${report['net']:+,.2f}")
+    print(f"平均盈利: ${report['avg_win']:+,.2f} | 平均亏损: ${report['avg_loss']:+,.2f} | "
+          f"期望值: ${report['expectancy']:+,.2f}/笔 | 盈亏比(总): {report['profit_factor']:.2f}")
+    print(f"最大回撤: ${report['max_drawdown']:,.2f}"
+          + (f"（{report['drawdown_from'] or '起点'} → {report['drawdown_to']}）" if report['drawdown_to'] else ""))
+    print(f"最长连胜: {s['max_win']}笔 | 最长连亏: {s['max_lose']}笔 | "
+          f"当前: {'连胜' if s['current'] > 0 else '连亏'}{abs(s['current'])}笔")
+    _print_groups("多空方向", report["by_direction"])
+    _print_groups(f"交易对（净收益前{top_pairs}）",
+                  sorted(report["by_pair"], key=lambda g: g["net"], reverse=True)[:top_pairs])
+    _print_groups("星期", report["by_weekday"], label=lambda k: WEEKDAYS[k])
+    _print_groups("小时", report["by_hour"], label=lambda k: f"{k:02d}:00")
+
+
+def show_report(store: TradeStore, start: Optional[str] = None, end: Optional[str] = None) -> dict:
+    report = summarize(load_trades(store, start, end))
+    print_report(report)
+    return report
+
+
+# endregion
+
+
+if __name__ == "__main__":
+    # 用法: python trade_report.py --start "2025-01-01" --end "2026-01-01"
+    parser = argparse.ArgumentParser(description="交易记录绩效分析（权益曲线、回撤、连胜连亏、分组统计）")
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--start", help="起始时间（含），如 2025-01-01")
+    parser.add_argument("--end", help="结束时间（不含）")
+    parser.add_argument("--equity-csv", help="把权益曲线写入CSV（时间, 收益, 累计）")
+    args = parser.parse_args()
+
+    store = TradeStore(args.db, legacy_json=None)
+    trades = load_trades(store, args.start, args.end)
+    report = summarize(trades)
+    print_report(report)
+    if args.equity_csv:
+        with open(args.equity_csv, "w", encoding="utf-8") as f:
+            f.write("time,profit,equity\n")
+            for t, p, e in zip(map(_fmt_time, trades.time), trades.profit, report["equity"]):
+                f.write(f"{t},{p:.2f},{e:.2f}\n")
+        print(f"权益曲线已写入 {args.equity_csv}")
+    store.close()
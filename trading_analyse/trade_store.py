@@ -0,0 +1,234 @@
+import json
+import os
+import sqlite3
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+# 类型别名
+TradeRecord = Dict[str, Union[str, float]]
+
+# 数据文件路径
+DB_FILE = "trading_records.db"
+LEGACY_JSON_FILE = "trading_records.json"  # 旧版整体JSON，首次打开时迁移一次
+
+RESULTS = ("WIN", "LOSE")
+DIRECTIONS = ("long", "short")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY,
+    pair TEXT NOT NULL,
+    direction TEXT NOT NULL,
+    result TEXT NOT NULL,
+    time TEXT NOT NULL,
+    profit REAL NOT NULL DEFAULT 0,
+    trade_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_trades_pair ON trades (pair, time);
+CREATE INDEX IF NOT EXISTS idx_trades_direction ON trades (direction, time);
+CREATE INDEX IF NOT EXISTS idx_trades_result ON trades (result, time);
+CREATE INDEX IF NOT EXISTS idx_trades_time ON trades (time);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS trade_stats (
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    result TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    profit REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, key, result)
+);
+"""
+
+INSERT_SQL = ("INSERT OR IGNORE INTO trades (pair, direction, result, time, profit, trade_id) "
+              "VALUES (?, ?, ?, ?, ?, ?)")  # trade_id重复（重复导入）时跳过
+
+# 累计统计：每插入一笔交易，在同一事务内更新 方向×结果 与 交易对×结果 两组计数和金额
+STATS_SCOPES = ("direction", "pair")
+STATS_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS trades_stats_insert AFTER INSERT ON trades BEGIN
+    INSERT INTO trade_stats (scope, key, result, count, profit) VALUES ('direction', NEW.direction, NEW.result, 1, NEW.profit)
+        ON CONFLICT (scope, key, result) DO UPDATE SET count = count + 1, profit = profit + excluded.profit;
+    INSERT INTO trade_stats (scope, key, result, count, profit) VALUES ('pair', NEW.pair, NEW.result, 1, NEW.profit)
+        ON CONFLICT (scope, key, result) DO UPDATE SET count = count + 1, profit = profit + excluded.profit;
+END;
+"""
+STATS_TOLERANCE = 1e-6  # 校验时金额允许的浮点累加误差
+
+
+class TradeStore:
+    """交易记录库（SQLite）：每笔交易一行，追加为O(1)，按交易对/方向/结果/时间建索引"""
+
+    def __init__(self, path: str = DB_FILE, legacy_json: Optional[str] = LEGACY_JSON_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")  # 追加只写日志，不重写整个文件
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        if "trade_id" not in {row[1] for row in self.conn.execute("PRAGMA table_info(trades)")}:
+            self.conn.execute("ALTER TABLE trades ADD COLUMN trade_id TEXT")  # 旧库补列
+        # 手工记录trade_id为空，不参与去重
+        self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_trades_trade_id ON trades (trade_id)")
+        if self._meta("stats_trigger") is None:
+            # 旧库没有累计统计：建触发器并按现有记录重建一次
+            with self.conn:
+                self.conn.executescript(STATS_TRIGGER)
+            self.rebuild_stats()
+            with self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('stats_trigger', '1')")
+        if legacy_json:
+            self.migrate_json(legacy_json)
+
+    # --- 写入 ---
+    @staticmethod
+    def _row(record: TradeRecord, result: Optional[str] = None) -> tuple:
+        result = (result or str(record["result"])).upper()
+        if result not in RESULTS:
+            raise ValueError(f"无效的交易结果: {result}")
+        direction = str(record["direction"]).lower()
+        if direction not in DIRECTIONS:
+            raise ValueError(f"无效的交易方向: {direction}")
+        trade_id = record.get("trade_id")
+        return (str(record["pair"]).upper(), direction, result, str(record["time"]),
+                round(float(record.get("profit", 0)), 2), str(trade_id) if trade_id else None)
+
+    def add(self, record: TradeRecord, result: Optional[str] = None) -> int:
+        """追加一笔交易（result缺省取record['result']），返回记录id"""
+        with self.conn:
+            cur = self.conn.execute(INSERT_SQL, self._row(record, result))
+        return cur.lastrowid
+
+    def add_many(self, records: Iterable[TradeRecord]) -> int:
+        """在一个事务中批量追加（每条需带result字段），返回实际写入条数（trade_id已存在的跳过）"""
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            return self._bulk_insert(records)
+
+    def _bulk_insert(self, records: Iterable[TradeRecord]) -> int:
+        """须在已开启的事务内调用：逐行触发器较慢，批量写入时暂停触发器，写完按新增行一次性汇总累计统计"""
+        last_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM trades").fetchone()[0]
+        self.conn.execute("DROP TRIGGER IF EXISTS trades_stats_insert")
+        inserted = self.conn.executemany(INSERT_SQL, (self._row(r) for r in records)).rowcount
+        for scope in STATS_SCOPES:
+            self.conn.execute(
+                f"INSERT INTO trade_stats (scope, key, result, count, profit) "
+                f"SELECT ?, {scope}, result, COUNT(*), SUM(profit) FROM trades WHERE id > ? GROUP BY {scope}, result "
+                f"ON CONFLICT (scope, key, result) DO UPDATE SET "
+                f"count = count + excluded.count, profit = profit + excluded.profit", (scope, last_id))
+        self.conn.execute(STATS_TRIGGER)
+        return inserted
+
+    # --- 查询 ---
+    def query(self, pair: Optional[str] = None, direction: Optional[str] = None, result: Optional[str] = None,
+              start: Optional[str] = None, end: Optional[str] = None, order: str = "time") -> Iterator[TradeRecord]:
+        """按条件查询（走索引），时间为 'YYYY-mm-dd HH:MM:SS' 字符串，区间 [start, end)"""
+        clauses, params = [], []
+        for column, value in (("pair", pair and pair.upper()), ("direction", direction and direction.lower()),
+                              ("result", result and result.upper())):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if start:
+            clauses.append("time >= ?")
+            params.append(start)
+        if end:
+            clauses.append("time < ?")
+            params.append(end)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        order_by = "pair, time" if order == "pair" else "time"
+        sql = f"SELECT id, pair, direction, result, time, profit FROM trades{where} ORDER BY {order_by}, id"
+        for row in self.conn.execute(sql, params):
+            yield dict(row)
+
+    def columns(self, start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, list]:
+        """按时间顺序取出 pair/direction/result/time/profit 各列（供批量分析，不逐条构造字典）"""
+        where, params = [], []
+        if start:
+            where.append("time >= ?")
+            params.append(start)
+        if end:
+            where.append("time < ?")
+            params.append(end)
+        sql = "SELECT pair, direction, result, time, profit FROM trades"
+        if where:
+            sql += f" WHERE {' AND '.join(where)}"
+        cur = self.conn.execute(sql + " ORDER BY time, id", params)
+        cur.row_factory = None  # 直接返回元组
+        rows = cur.fetchall()
+        names = ("pair", "direction", "result", "time", "profit")
+        return {name: list(col) for name, col in zip(names, zip(*rows))} if rows else {name: [] for name in names}
+
+    def totals(self, *columns: str) -> List[tuple]:
+        """按列分组的 (分组值..., 笔数, 金额合计)，如 totals('result', 'direction')"""
+        if not set(columns) <= {"pair", "direction", "result"}:
+            raise ValueError(f"不支持的分组列: {columns}")
+        group = ", ".join(columns)
+        return [tuple(row) for row in self.conn.execute(
+            f"SELECT {group}, COUNT(*), COALESCE(SUM(profit), 0) FROM trades GROUP BY {group}")]
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM trades").fetchone()[0]
+
+    # --- 累计统计 ---
+    def stats(self, scope: str = "direction") -> Dict[str, Dict[str, Dict[str, float]]]:
+        """读取累计统计 {key: {result: {"count", "profit"}}}，耗时与交易记录数量无关"""
+        if scope not in STATS_SCOPES:
+            raise ValueError(f"不支持的统计维度: {scope}")
+        stats: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for key, result, count, profit in self.conn.execute(
+                "SELECT key, result, count, profit FROM trade_stats WHERE scope = ?", (scope,)):
+            stats.setdefault(key, {})[result] = {"count": count, "profit": profit}
+        return stats
+
+    def rebuild_stats(self) -> None:
+        """按全部交易记录重新计算累计统计"""
+        with self.conn:
+            self.conn.execute("DELETE FROM trade_stats")
+            for scope in STATS_SCOPES:
+                self.conn.execute(
+                    f"INSERT INTO trade_stats (scope, key, result, count, profit) "
+                    f"SELECT ?, {scope}, result, COUNT(*), COALESCE(SUM(profit), 0) FROM trades "
+                    f"GROUP BY {scope}, result", (scope,))
+
+    def verify_stats(self) -> List[str]:
+        """对比累计统计与全量重算的结果，返回不一致项的说明（空列表表示一致）"""
+        problems = []
+        for scope in STATS_SCOPES:
+            expected = {(key, result): (count, profit) for key, result, count, profit in self.totals(scope, "result")}
+            stored = {(key, result): (v["count"], v["profit"])
+                      for key, by_result in self.stats(scope).items() for result, v in by_result.items()}
+            for k in sorted(set(expected) | set(stored)):
+                count, profit = expected.get(k, (0, 0.0))
+                s_count, s_profit = stored.get(k, (0, 0.0))
+                if count != s_count or abs(profit - s_profit) > STATS_TOLERANCE:
+                    problems.append(f"{scope} {k[0]} {k[1]}: 累计 {s_count}笔 ${s_profit:+,.2f}，"
+                                    f"重算 {count}笔 ${profit:+,.2f}")
+        return problems
+
+    # --- 迁移 ---
+    def _meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def migrate_json(self, json_path: str) -> int:
+        """把旧版 {"win": [...], "lose": {pair: [...]}} 一次性导入（原文件保留），返回导入条数"""
+        if self._meta("migrated_from") or not os.path.exists(json_path):
+            return 0
+        with open(json_path, "r") as f:
+            data = json.load(f)
+        records: List[TradeRecord] = [{**r, "result": "WIN"} for r in data.get("win", [])]
+        records += [{**r, "pair": r.get("pair", pair), "result": "LOSE"}
+                    for pair, rs in data.get("lose", {}).items() for r in rs]
+        records.sort(key=lambda r: r["time"])
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self._bulk_insert(records)
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from', ?)",
+                              (os.path.abspath(json_path),))
+        print(f"已从 {json_path} 迁移 {len(records)} 条交易记录到 {self.path}")
+        return len(records)
+
+    def close(self) -> None:
+        self.conn.close()
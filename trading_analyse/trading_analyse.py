@@ -1,55 +1,30 @@
-import json
-import os
 from datetime import datetime
-from typing import Dict, List, Union
+from typing import Dict
 
-# 类型别名
-TradeRecord = Dict[str, Union[str, float]]
-DataStructure = Dict[str, Union[List[TradeRecord], Dict[str, List[TradeRecord]]]]
+from alert_join import show_alert_report
+from trade_report import show_report
+from trade_store import TradeStore
 
-# 数据文件路径
-DATA_FILE = "trading_records.json"
+# 交易记录库（首次运行时自动迁移旧版 trading_records.json）
+store = TradeStore()
 
 
-def load_data() -> DataStructure:
-    """加载或初始化交易记录数据"""
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, "r") as f:
-            return json.load(f)
-    return {"win": [], "lose": {}}
-
-
-def save_data(data: DataStructure) -> None:
-    """保存数据到JSON文件"""
-    with open(DATA_FILE, "w") as f:
-        json.dump(data, f, indent=2)
-
-
-def show_statistics(data: DataStructure) -> None:
+def show_statistics(store: TradeStore) -> None:
     """展示增强版交易统计数据（含方向分类）"""
 
-    def _calc_stats(records: List[TradeRecord]) -> Dict[str, Dict[str, float]]:
-        """计算指定记录集的多空分类统计"""
-        stats = {
-            "LONG": {"count": 0, "profit": 0.0},
-            "SHORT": {"count": 0, "profit": 0.0}
-        }
-        for r in records:
-            direction = r["direction"].upper()
-            stats[direction]["count"] += 1
-            stats[direction]["profit"] += float(r.get("profit", 0))
-        return stats
-
-    # 盈利交易统计
-    win_stats = _calc_stats(data["win"])
-    total_win = len(data["win"])
-    total_win_profit = sum(float(r.get("profit", 0)) for r in data["win"])
-
-    # 亏损交易统计
-    lose_records = [r for pair in data["lose"].values() for r in pair]
-    lose_stats = _calc_stats(lose_records)
-    total_lose = len(lose_records)
-    total_lose_loss = sum(float(r.get("profit", 0)) for r in lose_records)
+    # 读取追加时同步维护的 方向 × 结果 累计值，不扫描交易记录
+    stats: Dict[str, Dict[str, Dict[str, float]]] = {
+        result: {"LONG": {"count": 0, "profit": 0.0}, "SHORT": {"count": 0, "profit": 0.0}}
+        for result in ("WIN", "LOSE")
+    }
+    for direction, by_result in store.stats("direction").items():
+        for result, value in by_result.items():
+            stats[result][direction.upper()] = value
+    win_stats, lose_stats = stats["WIN"], stats["LOSE"]
+    total_win = sum(s["count"] for s in win_stats.values())
+    total_win_profit = sum(s["profit"] for s in win_stats.values())
+    total_lose = sum(s["count"] for s in lose_stats.values())
+    total_lose_loss = sum(s["profit"] for s in lose_stats.values())
 
     # 打印基础统计
     print("\n=== 全局统计 ===")
@@ -71,6 +46,32 @@ def show_statistics(data: DataStructure) -> None:
         print(f"净收益: ${win_stats[direction]['profit'] + lose_stats[direction]['profit']:+,.2f}")
 
 
+def show_pair_statistics(store: TradeStore) -> None:
+    """按交易对展示累计统计（按净收益从高到低）"""
+    print("\n=== 交易对统计 ===")
+    empty = {"count": 0, "profit": 0.0}
+    rows = []
+    for pair, by_result in store.stats("pair").items():
+        win, lose = by_result.get("WIN", empty), by_result.get("LOSE", empty)
+        rows.append((win["profit"] + lose["profit"], pair, win, lose))
+    for net, pair, win, lose in sorted(rows, reverse=True):
+        total = win["count"] + lose["count"]
+        print(f"{pair}: {total}笔 | 胜率: {win['count'] / total * 100:.1f}% | 净收益: ${net:+,.2f}")
+
+
+def rebuild_statistics(store: TradeStore) -> None:
+    """校验累计统计，不一致时按全部记录重建"""
+    problems = store.verify_stats()
+    if not problems:
+        print(f"✅ 累计统计与 {store.count()} 笔记录一致")
+        return
+    print("⚠️ 累计统计与记录不一致:")
+    for line in problems:
+        print(f"  {line}")
+    store.rebuild_stats()
+    print("已按全部记录重建累计统计")
+
+
 def input_float(prompt: str) -> float:
     """安全获取浮点数输入"""
     while True:
@@ -81,9 +82,7 @@ def input_float(prompt: str) -> float:
 
 
 def add_record_interactive() -> None:
-    """交互式添加交易记录（含利润）"""
-    data = load_data()
-
+    """交互式添加交易记录（含利润），每笔直接追加到记录库"""
     while True:
         print("\n=== 新建交易记录 ===")
         pair = input("货币对（如EURUSD，留空返回）: ").strip().upper()
@@ -110,31 +109,24 @@ def add_record_interactive() -> None:
         }
 
         # 保存记录
-        if result == "WIN":
-            data["win"].append(record)
-        else:
-            if pair not in data["lose"]:
-                data["lose"][pair] = []
-            data["lose"][pair].append(record)
-
-        save_data(data)
+        store.add(record, result)
         print(f"✅ 已保存: {pair} {direction} | 金额: ${profit:+,.2f}")
 
 
 def query_records() -> None:
     """带方向分类的查询功能"""
-    data = load_data()
-
     print("\n=== 盈利交易 ===")
-    for i, r in enumerate(data["win"], 1):
+    for i, r in enumerate(store.query(result="WIN"), 1):
         print(f"{i}. {r['time']} {r['pair']} {r['direction'].upper()} | "
-              f"利润: ${float(r.get('profit', 0)):+,.2f}")
+              f"利润: ${float(r['profit']):+,.2f}")
 
     print("\n=== 亏损交易 ===")
-    for pair, records in data["lose"].items():
-        for i, r in enumerate(records, 1):
-            print(f"{i}. {r['time']} {pair} {r['direction'].upper()} | "
-                  f"亏损: ${float(r.get('profit', 0)):+,.2f}")
+    pair, i = None, 0
+    for r in store.query(result="LOSE", order="pair"):
+        i = i + 1 if r["pair"] == pair else 1  # 按交易对分组编号
+        pair = r["pair"]
+        print(f"{i}. {r['time']} {pair} {r['direction'].upper()} | "
+              f"亏损: ${float(r['profit']):+,.2f}")
 
 
 def main_menu() -> None:
@@ -144,7 +136,11 @@ def main_menu() -> None:
         print("1. 新建交易记录")
         print("2. 查看完整记录")
         print("3. 显示统计报告（含多空分类）")
-        print("4. 退出系统")
+        print("4. 交易对统计")
+        print("5. 校验/重建统计")
+        print("6. 绩效分析（权益曲线/回撤/连胜连亏/分时段）")
+        print("7. 告警关联分析（告警触发 vs 其他交易）")
+        print("8. 退出系统")
 
         choice = input("请选择操作: ").strip()
 
@@ -153,8 +149,16 @@ def main_menu() -> None:
         elif choice == "2":
             query_records()
         elif choice == "3":
-            show_statistics(load_data())
+            show_statistics(store)
         elif choice == "4":
+            show_pair_statistics(store)
+        elif choice == "5":
+            rebuild_statistics(store)
+        elif choice == "6":
+            show_report(store)
+        elif choice == "7":
+            show_alert_report(store)
+        elif choice == "8":
             print("已退出系统")
             break
         else:
@@ -171,5 +175,5 @@ if __name__ == "__main__":
     ██║     ╚██████╔╝██║  ██║██║     ███████║
     ╚═╝      ╚═════╝ ╚═╝  ╚═╝╚═╝     ╚══════╝
     """)
-    show_statistics(load_data())
+    show_statistics(store)
     main_menu()
\ No newline at end of file